@@ -0,0 +1,132 @@
+"""
+catalog_cache.py
+
+以 sys.objects.modify_date 為依據的本機物件定義快取（SP、View）。
+每次執行只查詢輕量的 object_id / modify_date 清單，
+僅下載新增或修改過的定義，並移除已刪除的物件，再於本機組回完整結果。
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import re
+
+import pyodbc
+
+CACHE_VERSION = 2
+TYPE_CODES = {"sp": "P", "view": "V"}
+
+def cache_path(cache_dir: str, db: dict, object_type: str) -> str:
+    name = re.sub(r"[^\w.-]", "_", f"{db['server']}__{db['database']}__{object_type}")
+    return os.path.join(cache_dir, f"{name}.catalog.json.gz")
+
+def load_cache(path: str) -> dict:
+    """
+    讀取快取檔；檔案不存在或版本不符時回傳空快取
+
+    Returns:
+        dict: {object_id: {"schema", "name", "modify_date", "definition"}}
+    """
+    if not os.path.exists(path):
+        return {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != CACHE_VERSION:
+        return {}
+    return {int(object_id): entry for object_id, entry in data["objects"].items()}
+
+def save_cache(path: str, objects: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump({"version": CACHE_VERSION, "objects": objects}, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+def plan_refresh(cached: dict, server_objects: dict):
+    """
+    比對快取與 server 目前的物件清單，找出需要重新下載與已刪除的物件
+
+    Args:
+        cached (dict): 快取內容 {object_id: {"schema", "name", "modify_date", ...}}
+        server_objects (dict): server 現況 {object_id: (schema, name, modify_date)}
+
+    Returns:
+        tuple: (需要下載定義的 object_id 清單, 已刪除的 object_id 清單)
+    """
+    changed = [
+        object_id for object_id, (schema, name, modify_date) in server_objects.items()
+        if object_id not in cached
+        or cached[object_id]["schema"] != schema
+        or cached[object_id]["name"] != name
+        or cached[object_id]["modify_date"] != modify_date
+    ]
+    dropped = [object_id for object_id in cached if object_id not in server_objects]
+    return changed, dropped
+
+def apply_refresh(cached: dict, server_objects: dict, definitions: dict, dropped: list) -> dict:
+    """
+    將新下載的定義合併進快取並移除已刪除的物件（回傳新的快取內容）
+    """
+    dropped = set(dropped)
+    objects = {object_id: entry for object_id, entry in cached.items() if object_id not in dropped}
+    for object_id, definition in definitions.items():
+        schema, name, modify_date = server_objects[object_id]
+        objects[object_id] = {"schema": schema, "name": name, "modify_date": modify_date, "definition": definition}
+    return objects
+
+def _fetch_server_objects(cursor, type_code: str) -> dict:
+    cursor.execute("""
+        SELECT o.object_id, SCHEMA_NAME(o.schema_id), o.name, o.modify_date
+        FROM sys.objects o
+        WHERE o.type = ?
+    """, type_code)
+    return {row[0]: (row[1], row[2], row[3].isoformat()) for row in cursor}
+
+def _fetch_definitions(cursor, object_ids: list) -> dict:
+    if not object_ids:
+        return {}
+    cursor.execute("""
+        IF OBJECT_ID('tempdb..#changed') IS NOT NULL DROP TABLE #changed;
+        CREATE TABLE #changed (object_id int PRIMARY KEY)
+    """)
+    cursor.fast_executemany = True
+    cursor.executemany("INSERT INTO #changed (object_id) VALUES (?)", [(object_id,) for object_id in object_ids])
+    cursor.execute("""
+        SELECT m.object_id, m.definition
+        FROM sys.sql_modules m
+        JOIN #changed c ON c.object_id = m.object_id
+    """)
+    return {row[0]: row[1].strip() if row[1] else None for row in cursor}
+
+def get_definitions_cached(conn_str: str, db: dict, object_type: str, cache_dir: str) -> dict:
+    """
+    透過本機快取取得 SP / View 定義，只下載自上次更新後新增或修改的物件。
+
+    Args:
+        conn_str (str): 連線字串
+        db (dict): 連線資訊（用於決定快取檔名）
+        object_type (str): 'sp' 或 'view'
+        cache_dir (str): 快取資料夾
+
+    Returns:
+        dict: {schema.name: 定義}，與 get_sp_definitions / get_view_definitions 格式相同
+    """
+    path = cache_path(cache_dir, db, object_type)
+    cached = load_cache(path)
+
+    with pyodbc.connect(conn_str) as conn:
+        cursor = conn.cursor()
+        server_objects = _fetch_server_objects(cursor, TYPE_CODES[object_type])
+        changed, dropped = plan_refresh(cached, server_objects)
+        definitions = _fetch_definitions(cursor, changed)
+
+    objects = apply_refresh(cached, server_objects, definitions, dropped)
+    if changed or dropped or not os.path.exists(path):
+        save_cache(path, objects)
+    print(f"[INFO] {db['database']} {object_type} catalog: {len(changed)} refreshed, {len(dropped)} dropped, {len(objects)} cached")
+    return {f"{entry['schema']}.{entry['name']}": entry["definition"] for entry in objects.values()}
+
+def get_definitions_cached_async(conn_str: str, db: dict, object_type: str, cache_dir: str):
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(None, get_definitions_cached, conn_str, db, object_type, cache_dir)
@@ -0,0 +1,367 @@
+"""
+data_drift.py
+
+Detects data drift between each target database and its test-server counterpart.
+Views or tables are split into integer key ranges; each side computes a row count and a
+checksum aggregate per chunk on the server, and only mismatching chunks are split further.
+Differing key ranges are reported without pulling any rows to the client.
+
+The driver (connect) and SQL dialect are injectable, so the search can run against SQLite
+(SqliteDialect with sqlite_connect) or a fake driver as well as SQL Server.
+
+Views have no primary key, so comparing views requires --drift-key; tables default to their
+single-column integer primary key.
+"""
+
+import argparse
+import asyncio
+import os
+import queue
+import sqlite3
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+
+import pyodbc
+
+from utils.db_reader import read_db_info, read_list_from_excel
+from utils.result_writer import open_result_writer
+from checker.module_definitions import split_object_name
+from checker.schema_utils import build_conn_str
+from checker.view_checker import to_test_server
+from utils.config import DEFAULT_ACCOUNT_PATH, DEFAULT_VIEW_LIST, DEFAULT_TABLE_LIST
+
+DRIFT_SOURCES = ("view", "table")
+DEFAULT_CHUNKS = 16
+DEFAULT_MIN_CHUNK = 1000
+DEFAULT_PARALLELISM = 4
+INTEGER_TYPES = ("tinyint", "smallint", "int", "bigint", "integer")
+
+# SQL Server: SHA2_256 of each row's listed columns; per chunk the hashes are summed, not XORed,
+# so duplicated or swapped rows cannot cancel out. Values are converted with styles that keep
+# full precision (binary as hex, dates as ISO 8601, floats with 17 digits); NULL and empty
+# strings hash differently.
+BINARY_TYPES = ("binary", "varbinary", "image", "timestamp")
+DATE_TYPES = ("date", "time", "datetime", "datetime2", "smalldatetime", "datetimeoffset")
+FLOAT_TYPES = ("float", "real")
+
+class SqlServerDialect:
+    def prepare(self, conn):
+        pass
+
+    def quote(self, name):
+        schema, object_name = split_object_name(name)
+        parts = [schema, object_name] if schema else [object_name]
+        return ".".join("[" + part.replace("]", "]]") + "]" for part in parts)
+
+    def key_column(self, cursor, obj):
+        rows = cursor.execute("""
+            SELECT c.name, ty.name
+            FROM sys.indexes i
+            JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+            JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+            JOIN sys.types ty ON ty.user_type_id = c.user_type_id
+            WHERE i.object_id = OBJECT_ID(?) AND i.is_primary_key = 1
+        """, (obj,)).fetchall()
+        return rows[0][0] if len(rows) == 1 and rows[0][1].lower() in INTEGER_TYPES else None
+
+    def key_range_sql(self, obj, key):
+        return f"SELECT MIN({self.quote(key)}), MAX({self.quote(key)}) FROM {self.quote(obj)}"
+
+    def _columns(self, cursor, obj):
+        # (name, base type, is CLR type) in column order; alias types resolve to their base type
+        return cursor.execute("""
+            SELECT c.name, TYPE_NAME(c.system_type_id), ty.is_assembly_type
+            FROM sys.columns c
+            JOIN sys.types ty ON ty.user_type_id = c.user_type_id
+            WHERE c.object_id = OBJECT_ID(?)
+            ORDER BY c.column_id
+        """, (obj,)).fetchall()
+
+    def column_text(self, name, type_name, is_assembly_type=False):
+        col = self.quote(name)
+        type_name = (type_name or "").lower()
+        if is_assembly_type or type_name in BINARY_TYPES:
+            text = f"CONVERT(nvarchar(max), CONVERT(varbinary(max), {col}), 2)"
+        elif type_name in DATE_TYPES:
+            text = f"CONVERT(nvarchar(64), {col}, 126)"
+        elif type_name in FLOAT_TYPES:
+            text = f"CONVERT(nvarchar(64), {col}, 3)"
+        else:
+            text = f"CONVERT(nvarchar(max), {col})"
+        return f"COALESCE(N'v' + {text}, N'n')"
+
+    def chunk_sql(self, cursor, obj, key):
+        # Parameters: lo, width, lo, hi
+        k = self.quote(key)
+        values = [self.column_text(*column) for column in self._columns(cursor, obj)]
+        row_text = f"CONCAT({', NCHAR(30), '.join(values)}, N'')"
+        return f"""
+            SELECT bucket, COUNT_BIG(*), SUM(CONVERT(decimal(38, 0), CONVERT(bigint, SUBSTRING(row_hash, 1, 8))))
+            FROM (
+                SELECT ({k} - ?) / ? AS bucket, HASHBYTES('SHA2_256', {row_text}) AS row_hash
+                FROM {self.quote(obj)}
+                WHERE {k} >= ? AND {k} < ?
+            ) c
+            GROUP BY bucket
+        """
+
+# SQLite stand-in for local testing: CRC32 of each row's columns, summed per chunk
+class SqliteDialect:
+    def prepare(self, conn):
+        conn.create_function("row_hash", -1, lambda *values: zlib.crc32(repr(values).encode("utf-8")))
+
+    def quote(self, name):
+        return '"' + name.replace('"', '""') + '"'
+
+    def _columns(self, cursor, obj):
+        return cursor.execute(f"PRAGMA table_info({self.quote(obj)})").fetchall()
+
+    def key_column(self, cursor, obj):
+        pk = [col for col in self._columns(cursor, obj) if col[5]]
+        return pk[0][1] if len(pk) == 1 and pk[0][2].lower() in INTEGER_TYPES else None
+
+    def key_range_sql(self, obj, key):
+        return f"SELECT MIN({self.quote(key)}), MAX({self.quote(key)}) FROM {self.quote(obj)}"
+
+    def chunk_sql(self, cursor, obj, key):
+        k = self.quote(key)
+        columns = ", ".join(self.quote(col[1]) for col in self._columns(cursor, obj))
+        return f"""
+            SELECT bucket, COUNT(*), SUM(row_hash)
+            FROM (
+                SELECT ({k} - ?) / ? AS bucket, row_hash({columns}) AS row_hash
+                FROM {self.quote(obj)}
+                WHERE {k} >= ? AND {k} < ?
+            ) c
+            GROUP BY bucket
+        """
+
+def sqlite_connect(database_dir):
+    """
+    connect() for SqliteDialect: SERVER=s;DATABASE=d maps to <database_dir>/<s>/<d>.db.
+    ConnectionPool hands a connection to one executor thread at a time, but not always the
+    thread that opened it, so SQLite's same-thread check is disabled.
+    """
+    def connect(conn_str):
+        fields = dict(part.split("=", 1) for part in conn_str.split(";") if "=" in part)
+        path = os.path.join(database_dir, fields["SERVER"], fields["DATABASE"] + ".db")
+        return sqlite3.connect(path, check_same_thread=False)
+    return connect
+
+# Fixed-size pool of connections for one database, shared by the chunk queries
+class ConnectionPool:
+    def __init__(self, conn_str, size, connect=pyodbc.connect, dialect=None):
+        self.conn_str = conn_str
+        self.connect = connect
+        self.dialect = dialect or SqlServerDialect()
+        self._chunk_sql = {}
+        self._idle = queue.LifoQueue()
+        self._slots = queue.Queue()
+        for _ in range(size):
+            self._slots.put(None)
+        self._all = []
+
+    @contextmanager
+    def connection(self):
+        self._slots.get()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self.connect(self.conn_str)
+                self.dialect.prepare(conn)
+                self._all.append(conn)
+            try:
+                yield conn
+            finally:
+                self._idle.put(conn)
+        finally:
+            self._slots.put(None)
+
+    def chunk_sql(self, cursor, obj, key):
+        # Built once per object and database: the column lists of the two sides may differ
+        if (obj, key) not in self._chunk_sql:
+            self._chunk_sql[(obj, key)] = self.dialect.chunk_sql(cursor, obj, key)
+        return self._chunk_sql[(obj, key)]
+
+    def close(self):
+        for conn in self._all:
+            conn.close()
+        self._all = []
+
+def query_key_range(pool, obj, key):
+    with pool.connection() as conn:
+        return tuple(conn.cursor().execute(pool.dialect.key_range_sql(obj, key)).fetchone())
+
+def query_chunks(pool, obj, key, lo, hi, width):
+    """
+    Row count and checksum per bucket of `width` keys in [lo, hi): {bucket: (count, checksum)}
+    """
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        sql = pool.chunk_sql(cursor, obj, key)
+        return {row[0]: (row[1], row[2]) for row in cursor.execute(sql, (lo, width, lo, hi)).fetchall()}
+
+def detect_key_column(pool, obj):
+    with pool.connection() as conn:
+        return pool.dialect.key_column(conn.cursor(), obj)
+
+def merge_ranges(ranges):
+    """
+    Merge adjacent drifted ranges [(lo, hi, target_rows, test_rows)] into contiguous ranges
+    """
+    merged = []
+    for lo, hi, target_rows, test_rows in sorted(ranges):
+        if merged and merged[-1][1] == lo:
+            prev = merged[-1]
+            merged[-1] = (prev[0], hi, prev[2] + target_rows, prev[3] + test_rows)
+        else:
+            merged.append((lo, hi, target_rows, test_rows))
+    return merged
+
+async def find_drifted_ranges(target_pool, test_pool, obj, key, lo, hi, semaphore, chunks=DEFAULT_CHUNKS, min_chunk=DEFAULT_MIN_CHUNK):
+    """
+    Compare [lo, hi) in `chunks` buckets and recurse into mismatching buckets until they are
+    at most `min_chunk` keys wide. The semaphore bounds concurrent chunk queries; it is held
+    only while querying, so recursion cannot deadlock.
+
+    Returns:
+        list[tuple]: (lo, hi, target_rows, test_rows) for each drifted range
+    """
+    width = max(1, -(-(hi - lo) // chunks))
+    loop = asyncio.get_running_loop()
+    async with semaphore:
+        target_chunks, test_chunks = await asyncio.gather(
+            loop.run_in_executor(None, query_chunks, target_pool, obj, key, lo, hi, width),
+            loop.run_in_executor(None, query_chunks, test_pool, obj, key, lo, hi, width),
+        )
+
+    drifted = []
+    recursions = []
+    for bucket in sorted(set(target_chunks) | set(test_chunks)):
+        target_agg = target_chunks.get(bucket, (0, None))
+        test_agg = test_chunks.get(bucket, (0, None))
+        if target_agg == test_agg:
+            continue
+        chunk_lo = lo + bucket * width
+        chunk_hi = min(chunk_lo + width, hi)
+        if chunk_hi - chunk_lo <= min_chunk or width == 1:
+            drifted.append((chunk_lo, chunk_hi, target_agg[0], test_agg[0]))
+        else:
+            recursions.append(find_drifted_ranges(
+                target_pool, test_pool, obj, key, chunk_lo, chunk_hi, semaphore, chunks, min_chunk
+            ))
+
+    for ranges in await asyncio.gather(*recursions):
+        drifted.extend(ranges)
+    return drifted
+
+async def compare_object_drift(target_pool, test_pool, obj, key=None, semaphore=None,
+                               chunks=DEFAULT_CHUNKS, min_chunk=DEFAULT_MIN_CHUNK):
+    """
+    Compare one view or table between two databases and describe the drifted key ranges.
+
+    Returns:
+        list[str]: differences (empty when the data matches)
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = semaphore or asyncio.Semaphore(DEFAULT_PARALLELISM)
+    try:
+        if key is None:
+            key = await loop.run_in_executor(None, detect_key_column, target_pool, obj)
+            if key is None:
+                return ["Data drift skipped: no single-column integer primary key (use --drift-key)"]
+
+        (target_min, target_max), (test_min, test_max) = await asyncio.gather(
+            loop.run_in_executor(None, query_key_range, target_pool, obj, key),
+            loop.run_in_executor(None, query_key_range, test_pool, obj, key),
+        )
+        bounds = [v for v in (target_min, target_max, test_min, test_max) if v is not None]
+        if not bounds:
+            return []
+        if any(not isinstance(v, int) for v in bounds):
+            return [f"Data drift skipped: key column '{key}' is not an integer"]
+
+        ranges = await find_drifted_ranges(
+            target_pool, test_pool, obj, key, min(bounds), max(bounds) + 1, semaphore, chunks, min_chunk
+        )
+    except Exception as e:
+        return [f"Query error: {str(e)}"]
+
+    return [
+        f"Data drift in {key} range [{lo}, {hi}): Target rows={target_rows}, Test rows={test_rows}"
+        for lo, hi, target_rows, test_rows in merge_ranges(ranges)
+    ]
+
+# Compare every listed object for one target database and its test-server counterpart
+async def compare_target_drift(target_db, objects, args=None, connect=pyodbc.connect, dialect=None):
+    parallelism = getattr(args, "drift_parallelism", None) or DEFAULT_PARALLELISM
+    chunks = getattr(args, "drift_chunks", None) or DEFAULT_CHUNKS
+    min_chunk = getattr(args, "drift_min_chunk", None) or DEFAULT_MIN_CHUNK
+    key = getattr(args, "drift_key", None)
+
+    test_db = target_db.copy()
+    test_db["server"] = to_test_server(target_db["server"])
+    target_conn_str = build_conn_str(target_db)
+    test_conn_str = build_conn_str(test_db)
+
+    target_pool = ConnectionPool(target_conn_str, parallelism, connect, dialect)
+    test_pool = ConnectionPool(test_conn_str, parallelism, connect, dialect)
+    semaphore = asyncio.Semaphore(parallelism)
+    try:
+        results = await asyncio.gather(*[
+            compare_object_drift(target_pool, test_pool, obj, key, semaphore, chunks, min_chunk)
+            for obj in objects
+        ])
+    finally:
+        target_pool.close()
+        test_pool.close()
+
+    differences = {f"[{obj}]": diffs for obj, diffs in zip(objects, results) if diffs}
+    return target_db["server"], {target_db["database"]: differences} if differences else {}
+
+# Views have no primary key to chunk by, so view mode needs an explicit key column
+def check_drift_args(args):
+    if (getattr(args, "drift_source", None) or "view") == "view" and not getattr(args, "drift_key", None):
+        raise ValueError("--drift-source view requires --drift-key (views have no primary key to chunk by)")
+
+# Async main workflow
+async def main_async(args):
+    check_drift_args(args)
+    print(f"Start Time: {datetime.now():%Y-%m-%d %H:%M:%S}")
+
+    _, target_dbs = read_db_info(DEFAULT_ACCOUNT_PATH)
+    if getattr(args, "drift_source", None) == "table":
+        objects = read_list_from_excel(DEFAULT_TABLE_LIST, column_name="Table Name")
+    else:
+        objects = read_list_from_excel(DEFAULT_VIEW_LIST, column_name="View Name")
+    objects = list(dict.fromkeys(objects))
+
+    with open_result_writer(args) as writer:
+        for task in asyncio.as_completed([compare_target_drift(target_db, objects, args) for target_db in target_dbs]):
+            server, db_diffs = await task
+            writer.add_results(server, db_diffs, "drift")
+
+    print(f"End Time: {datetime.now():%Y-%m-%d %H:%M:%S}")
+
+# CLI entry point
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Detect data drift between target databases and their test servers")
+    parser.add_argument("--output", required=False, help="Output filename (optional)")
+    parser.add_argument("--format", choices=["json", "csv", "ndjson", "parquet"], default="json", help="Output format (ndjson streams findings as each target finishes; parquet requires pyarrow)")
+    parser.add_argument("--drift-source", choices=DRIFT_SOURCES, default="view", help="Compare views (ViewList.xlsx, requires --drift-key) or tables (TableList.xlsx)")
+    parser.add_argument("--drift-key", help="Integer key column used for chunking (required for views; tables default to their single-column integer primary key)")
+    parser.add_argument("--drift-chunks", type=int, default=DEFAULT_CHUNKS, help="Buckets per range at each level")
+    parser.add_argument("--drift-min-chunk", type=int, default=DEFAULT_MIN_CHUNK, help="Stop splitting ranges at this many keys")
+    parser.add_argument("--drift-parallelism", type=int, default=DEFAULT_PARALLELISM, help="Concurrent chunk queries per database pair")
+    if args is None:
+        args = parser.parse_args()
+    try:
+        check_drift_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+module_definitions.py
+
+以 sys.sql_modules 讀取 SP / View 定義的共用工具。
+名稱清單先載入 #names 暫存表，由 server 端以不分大小寫、可指定 schema 的方式過濾；
+結果以 fetchmany 分批產生，呼叫端可邊讀邊比對，記憶體用量只與批次大小有關。
+"""
+
+import asyncio
+import itertools
+from collections import defaultdict
+
+import pyodbc
+
+TYPE_CODES = {"sp": "P", "view": "V"}
+DEFAULT_BATCH_SIZE = 500
+
+def split_object_name(name: str):
+    """
+    拆解物件名稱（去除中括號）
+
+    Returns:
+        tuple: (schema 或 None, 物件名稱)；未指定 schema 時 schema 為 None，代表任何 schema 皆可
+    """
+    parts = [p.strip().strip("[]") for p in name.strip().split(".")]
+    if len(parts) == 1:
+        return None, parts[0]
+    return parts[-2], parts[-1]
+
+def build_name_index(names) -> dict:
+    """
+    建立名稱比對索引：{物件名稱小寫: [(清單中的原始名稱, schema 小寫或 None)]}
+    """
+    index = defaultdict(list)
+    for name in dict.fromkeys(names):
+        schema, object_name = split_object_name(name)
+        index[object_name.lower()].append((name, schema.lower() if schema else None))
+    return index
+
+def match_name(index: dict, row_name: str) -> list:
+    """
+    找出與查詢結果名稱相符的清單項目（不分大小寫；任一方未指定 schema 時只比對物件名稱）
+    """
+    schema, object_name = split_object_name(row_name)
+    schema = schema.lower() if schema else None
+    return [
+        name for name, name_schema in index.get(object_name.lower(), [])
+        if name_schema is None or schema is None or name_schema == schema
+    ]
+
+def name_case_differs(listed_name: str, row_name: str) -> bool:
+    """
+    查詢結果名稱與清單項目是否只在大小寫上相符（忽略中括號；任一方未指定 schema 時只比對物件名稱）
+    """
+    listed_schema, listed_object = split_object_name(listed_name)
+    row_schema, row_object = split_object_name(row_name)
+    if listed_object != row_object:
+        return True
+    return listed_schema is not None and row_schema is not None and listed_schema != row_schema
+
+def _schema_key(row_name: str):
+    schema = split_object_name(row_name)[0]
+    return schema.lower() if schema else None
+
+def pair_listed_rows(names, base_defs: dict, target_rows):
+    """
+    依清單項目配對基準與目標的定義，目標邊讀邊配對（每個清單項目只產生一次）。
+    未指定 schema 的項目在多個 schema 都有同名物件時，優先配對與基準相同 schema 的目標；
+    沒有相同 schema 的目標時，讀完後再以第一個相符的目標配對
+
+    Args:
+        names (list[str]): 清單項目（可含 schema）
+        base_defs (dict): {名稱: 定義}
+        target_rows (Iterable[tuple]): (名稱, 定義)
+
+    Yields:
+        tuple: (清單項目, (基準名稱, 基準定義) 或 None, (目標名稱, 目標定義) 或 None)
+    """
+    index = build_name_index(names)
+    base_matches = defaultdict(dict)
+    for row_name, definition in base_defs.items():
+        for name in match_name(index, row_name):
+            base_matches[name].setdefault(_schema_key(row_name), (row_name, definition))
+
+    def base_for(name, row_name=None):
+        matches = base_matches.get(name, {})
+        return matches.get(row_name and _schema_key(row_name)) or next(iter(matches.values()), None)
+
+    paired = set()
+    fallback = {}
+    for row_name, definition in target_rows:
+        for name in match_name(index, row_name):
+            if name in paired:
+                continue
+            if base_matches.get(name) and _schema_key(row_name) not in base_matches[name]:
+                fallback.setdefault(name, (row_name, definition))
+                continue
+            paired.add(name)
+            yield name, base_for(name, row_name), (row_name, definition)
+
+    for name in dict.fromkeys(names):
+        if name not in paired:
+            target = fallback.get(name)
+            yield name, base_for(name, target and target[0]), target
+
+def load_name_filter(cursor, names):
+    """
+    將名稱清單載入此連線的 #names 暫存表（schema 未指定時為 NULL）
+    """
+    rows = list(dict.fromkeys(split_object_name(name) for name in names))
+    cursor.execute("""
+        IF OBJECT_ID('tempdb..#names') IS NOT NULL DROP TABLE #names;
+        CREATE TABLE #names (
+            schema_name sysname COLLATE DATABASE_DEFAULT NULL,
+            object_name sysname COLLATE DATABASE_DEFAULT NOT NULL
+        )
+    """)
+    if rows:
+        cursor.fast_executemany = True
+        cursor.executemany("INSERT INTO #names (schema_name, object_name) VALUES (?, ?)", rows)
+
+def _definitions_sql(filtered: bool) -> str:
+    # 一律回傳 schema.name：不同 schema 的同名物件不會互相覆蓋，未指定 schema 的清單項目也能辨識實際所在的 schema
+    if not filtered:
+        return """
+            SELECT SCHEMA_NAME(o.schema_id) + '.' + o.name, m.definition
+            FROM sys.sql_modules m
+            JOIN sys.objects o ON m.object_id = o.object_id
+            WHERE o.type = ?
+        """
+    return """
+        SELECT SCHEMA_NAME(o.schema_id) + '.' + o.name, m.definition
+        FROM sys.sql_modules m
+        JOIN sys.objects o ON m.object_id = o.object_id
+        WHERE o.type = ?
+          AND EXISTS (
+              SELECT 1 FROM #names n
+              WHERE LOWER(n.object_name) = LOWER(o.name COLLATE DATABASE_DEFAULT)
+                AND (n.schema_name IS NULL OR LOWER(n.schema_name) = LOWER(SCHEMA_NAME(o.schema_id) COLLATE DATABASE_DEFAULT))
+          )
+    """
+
+def iter_module_definitions(conn_str: str, object_type: str, names=None, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    逐批讀取 SP / View 定義的 generator
+
+    Args:
+        conn_str (str): 連線字串
+        object_type (str): 'sp' 或 'view'
+        names (list[str] | None): 要讀取的物件清單（可含 schema）；None 代表全部
+        batch_size (int): 每次 fetchmany 的筆數
+
+    Yields:
+        tuple: (schema.name, 定義)
+    """
+    if names is not None and not names:
+        return
+    conn = pyodbc.connect(conn_str)
+    try:
+        cursor = conn.cursor()
+        if names is not None:
+            load_name_filter(cursor, names)
+        cursor.execute(_definitions_sql(names is not None), TYPE_CODES[object_type])
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for name, definition in rows:
+                yield name, definition.strip() if definition else None
+    finally:
+        conn.close()
+
+def open_module_stream(conn_str: str, object_type: str, names=None, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    開啟定義串流並先讀入第一批：連線、查詢與第一次 fetchmany 都在呼叫的執行緒中完成，
+    回傳的 iterator 只需繼續讀取其餘批次
+
+    Returns:
+        Iterator[tuple]: (名稱, 定義)，與 iter_module_definitions 相同
+    """
+    rows = iter_module_definitions(conn_str, object_type, names, batch_size)
+    first = list(itertools.islice(rows, batch_size))
+    return itertools.chain(first, rows)
+
+def open_module_stream_async(conn_str: str, object_type: str, names=None, batch_size: int = DEFAULT_BATCH_SIZE):
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(None, open_module_stream, conn_str, object_type, names, batch_size)
+
+def export_definitions(conn_str: str, objects, batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    """
+    以單一連線、單一查詢匯出多種物件的原始定義（不 strip，保留原始格式），供同步使用
+
+    Args:
+        conn_str (str): 連線字串
+        objects (list[tuple]): (物件名稱, 'sp' 或 'view')
+        batch_size (int): 每次 fetchmany 的筆數
+
+    Returns:
+        dict: {(物件名稱, 物件類型): 定義}，key 為 objects 中的原始項目；找不到的物件不會出現
+    """
+    objects = list(dict.fromkeys(objects))
+    if not objects:
+        return {}
+    conn = pyodbc.connect(conn_str)
+    try:
+        return export_definitions_with_cursor(conn.cursor(), objects, batch_size)
+    finally:
+        conn.close()
+
+def export_target_state(conn_str: str, objects, batch_size: int = DEFAULT_BATCH_SIZE) -> tuple:
+    """
+    以單一連線匯出清單物件的定義，並查詢其中已存在的物件。
+    加密物件的定義為 NULL，不會出現在定義中，但仍算已存在（部署時需要 ALTER 而不是 CREATE）
+
+    Returns:
+        tuple: (export_definitions 格式的定義, find_existing_objects 格式的已存在物件)
+    """
+    objects = list(dict.fromkeys(objects))
+    if not objects:
+        return {}, set()
+    conn = pyodbc.connect(conn_str)
+    try:
+        cursor = conn.cursor()
+        return export_definitions_with_cursor(cursor, objects, batch_size), find_existing_objects(cursor, objects)
+    finally:
+        conn.close()
+
+def export_definitions_with_cursor(cursor, objects, batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    """
+    同 export_definitions，但使用呼叫端既有的連線（例如部署 session）
+    """
+    objects = list(dict.fromkeys(objects))
+    if not objects:
+        return {}
+    index = build_name_index(name for name, _ in objects)
+    wanted = set(objects)
+    type_codes = sorted({TYPE_CODES[object_type] for _, object_type in objects})
+    types_by_code = {code: object_type for object_type, code in TYPE_CODES.items()}
+
+    load_name_filter(cursor, [name for name, _ in objects])
+    cursor.execute(f"""
+        SELECT SCHEMA_NAME(o.schema_id) + '.' + o.name, RTRIM(o.type), m.definition
+        FROM sys.sql_modules m
+        JOIN sys.objects o ON m.object_id = o.object_id
+        WHERE o.type IN ({", ".join("?" for _ in type_codes)})
+          AND EXISTS (
+              SELECT 1 FROM #names n
+              WHERE LOWER(n.object_name) = LOWER(o.name COLLATE DATABASE_DEFAULT)
+                AND (n.schema_name IS NULL OR LOWER(n.schema_name) = LOWER(SCHEMA_NAME(o.schema_id) COLLATE DATABASE_DEFAULT))
+          )
+    """, *type_codes)
+
+    definitions = {}
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for qualified_name, type_code, definition in rows:
+            object_type = types_by_code.get(type_code)
+            for name in match_name(index, qualified_name):
+                key = (name, object_type)
+                if key in wanted and definition:
+                    definitions.setdefault(key, definition)
+    return definitions
+
+def find_existing_objects(cursor, objects) -> set:
+    """
+    查詢清單中已存在於資料庫的物件（使用呼叫端的連線，一次查詢）
+
+    Args:
+        cursor: pyodbc cursor
+        objects (list[tuple]): (物件名稱, 'sp' 或 'view')
+
+    Returns:
+        set: 已存在的 (物件名稱, 物件類型)
+    """
+    objects = list(dict.fromkeys(objects))
+    index = build_name_index(name for name, _ in objects)
+    types_by_code = {code: object_type for object_type, code in TYPE_CODES.items()}
+    load_name_filter(cursor, [name for name, _ in objects])
+    cursor.execute("""
+        SELECT SCHEMA_NAME(o.schema_id) + '.' + o.name, RTRIM(o.type)
+        FROM sys.objects o
+        WHERE o.type IN ('P', 'V')
+          AND EXISTS (
+              SELECT 1 FROM #names n
+              WHERE LOWER(n.object_name) = LOWER(o.name COLLATE DATABASE_DEFAULT)
+                AND (n.schema_name IS NULL OR LOWER(n.schema_name) = LOWER(SCHEMA_NAME(o.schema_id) COLLATE DATABASE_DEFAULT))
+          )
+    """)
+    wanted = set(objects)
+    existing = set()
+    for qualified_name, type_code in cursor.fetchall():
+        for name in match_name(index, qualified_name):
+            key = (name, types_by_code.get(type_code))
+            if key in wanted:
+                existing.add(key)
+    return existing
+
+def is_streaming(args) -> bool:
+    """
+    沒有使用 catalog 快取或快照時才直接串流讀取（快取與快照需要完整的定義清單）
+    """
+    return not any(getattr(args, option, None) for option in ("catalog_cache", "from_snapshot", "save_snapshot"))
@@ -11,67 +11,145 @@ from collections import defaultdict
 from datetime import datetime
 
 from utils.db_reader import read_db_info, read_list_from_excel
-from utils.result_writer import save_results
+from utils.result_writer import open_result_writer
+from utils.sql_cleaner import configure_normalization_cache, close_normalization_cache
+from utils.snapshot import fetch_with_snapshot
+from utils.diff_engine import DiffSettings
+from utils.compare_pipeline import CompareJob, run_compare_pipeline, DEFAULT_COMPARE_WORKERS, DEFAULT_QUEUE_SIZE
 from checker.schema_utils import (
     fetch_schema_info, 
-    compare_full_schema
+    fetch_table_fingerprints,
+    compare_full_schema,
+    qualify_table_name
 )
 from utils.config import DEFAULT_ACCOUNT_PATH, DEFAULT_TABLE_LIST
 
-# Compare the schema of a target database
-async def compare_target_schema(base_schema_data, target_db, tables_to_compare, base_db_name, show_trigger_content=False):
-    try:
-        target_schema_data = await fetch_schema_info(target_db, tables_to_compare)
-        differences = defaultdict(dict)
-
-        for table in tables_to_compare:
-            diff = compare_full_schema(
-                base_schema=base_schema_data,
-                target_schema=target_schema_data,
-                base_db=base_db_name,
-                target_db=target_db["database"],
-                table_name=table,
-                show_trigger_content=show_trigger_content
-            )
-            if diff:
-                differences[target_db["database"]][table] = diff
-
-        return target_db["server"], differences
-    except Exception as e:
-        return target_db["server"], {target_db["database"]: {"[ERROR]": str(e)}}
+# Compare the fetched schema of a target database against the base (runs on a comparer worker thread)
+def compare_schema_data(base_schema_data, target_schema_data, target_db, tables_to_compare, base_db_name, show_trigger_content=False, diff_settings=None):
+    differences = defaultdict(dict)
+
+    # 整庫模式：比對兩邊出現過的所有資料表
+    if tables_to_compare is None:
+        tables = sorted(set(base_schema_data[0]) | set(target_schema_data[0]))
+    else:
+        tables = tables_to_compare
+
+    for table in tables:
+        diff = compare_full_schema(
+            base_schema=base_schema_data,
+            target_schema=target_schema_data,
+            base_db=base_db_name,
+            target_db=target_db["database"],
+            table_name=table,
+            show_trigger_content=show_trigger_content,
+            diff_settings=diff_settings
+        )
+        if diff:
+            differences[target_db["database"]][table] = diff
+
+    return differences
+
+# Pipeline job for one target database: fetch its schema, then compare it against the base
+def schema_compare_job(base_schema_data, target_db, tables_to_compare, base_db_name, show_trigger_content=False, args=None):
+    diff_settings = DiffSettings.from_args(args)
+    return CompareJob(
+        db=target_db,
+        kind="schema",
+        fetch=lambda: fetch_with_snapshot(target_db, "schema", lambda: fetch_schema_info(target_db, tables_to_compare), args),
+        compare=lambda target_schema_data: compare_schema_data(
+            base_schema_data, target_schema_data, target_db, tables_to_compare, base_db_name, show_trigger_content, diff_settings
+        ),
+    )
+
+# Two-phase compare, phase one: per-table fingerprints of every database
+# Returns the error results of targets whose fingerprints failed and [(target_db, drifted tables)]
+async def find_drifted_tables(base_db, target_dbs, tables_to_compare):
+    base_fp, *target_fps = await asyncio.gather(
+        fetch_table_fingerprints(base_db, tables_to_compare),
+        *[fetch_table_fingerprints(target_db, tables_to_compare) for target_db in target_dbs],
+        return_exceptions=True
+    )
+    if isinstance(base_fp, Exception):
+        raise base_fp
+
+    errors = []
+    drifted_by_target = []
+    for target_db, target_fp in zip(target_dbs, target_fps):
+        if isinstance(target_fp, Exception):
+            errors.append((target_db["server"], {target_db["database"]: {"[ERROR]": str(target_fp)}}))
+            continue
+        tables = tables_to_compare if tables_to_compare is not None else sorted(set(base_fp) | set(target_fp))
+        drifted = [t for t in tables if base_fp.get(t) != target_fp.get(t)]
+        print(f"[INFO] {target_db['database']}: {len(drifted)} of {len(tables)} tables differ by fingerprint")
+        if drifted:
+            drifted_by_target.append((target_db, drifted))
+    return errors, drifted_by_target
 
 # Async main workflow
+# Targets go through the compare pipeline: each is diffed as soon as its schema arrives and written as soon as it is compared
 async def main_async(args):
     print(f"Start Time: {datetime.now():%Y-%m-%d %H:%M:%S}")
+    configure_normalization_cache(args)
 
-    base_db, target_dbs = read_db_info(DEFAULT_ACCOUNT_PATH)
-    tables_to_compare = read_list_from_excel(DEFAULT_TABLE_LIST, column_name="Table Name")
-
-    base_schema_data = await fetch_schema_info(base_db, tables_to_compare)
-
-    tasks = [
-        compare_target_schema(base_schema_data, target_db, tables_to_compare, base_db["database"], args.show_content)
-        for target_db in target_dbs
-    ]
-    results = await asyncio.gather(*tasks)
+    try:
+        base_db, target_dbs = read_db_info(DEFAULT_ACCOUNT_PATH)
+        if getattr(args, "all_tables", False):
+            tables_to_compare = None
+        else:
+            table_list = read_list_from_excel(DEFAULT_TABLE_LIST, column_name="Table Name")
+            tables_to_compare = list(dict.fromkeys(qualify_table_name(t) for t in table_list))
 
-    all_differences = defaultdict(lambda: defaultdict(dict))
-    for server, db_diffs in results:
-        all_differences[server].update(db_diffs)
+        use_fingerprint = getattr(args, "fingerprint", False)
+        if use_fingerprint and (getattr(args, "from_snapshot", None) or getattr(args, "save_snapshot", None)):
+            print("[INFO] --fingerprint is ignored with snapshot options; fetching full schemas")
+            use_fingerprint = False
 
-    if args.output:
-        save_results(all_differences, args.format, args.output)
-    else:
-        save_results(all_differences, "console", None)
+        with open_result_writer(args) as writer:
+            if use_fingerprint:
+                errors, drifted_by_target = await find_drifted_tables(base_db, target_dbs, tables_to_compare)
+                for server, db_diffs in errors:
+                    writer.add_results(server, db_diffs, "schema")
 
+                # Base details are fetched once, only for tables that drifted on some target
+                all_drifted = list(dict.fromkeys(t for _, drifted in drifted_by_target for t in drifted))
+                base_schema_data = await fetch_schema_info(base_db, all_drifted) if all_drifted else None
+                jobs = [
+                    schema_compare_job(base_schema_data, target_db, drifted, base_db["database"], args.show_content, args)
+                    for target_db, drifted in drifted_by_target
+                ]
+            else:
+                base_schema_data = await fetch_with_snapshot(
+                    base_db, "schema", lambda: fetch_schema_info(base_db, tables_to_compare), args
+                )
+                jobs = [
+                    schema_compare_job(base_schema_data, target_db, tables_to_compare, base_db["database"], args.show_content, args)
+                    for target_db in target_dbs
+                ]
+            stats = await run_compare_pipeline(jobs, writer, args)
+        print(stats.report())
+    finally:
+        # Report and save the cache even when a fetch or the writer fails
+        close_normalization_cache()
     print(f"End Time: {datetime.now():%Y-%m-%d %H:%M:%S}")
 
 # CLI entry point
 def main(args=None):
     parser = argparse.ArgumentParser(description="Compare SQL Server schema (columns, PK, FK, index, trigger)")
     parser.add_argument("--output", required=False, help="Output filename (optional)")
-    parser.add_argument("--format", choices=["json", "csv"], default="json", help="Output format")
+    parser.add_argument("--format", choices=["json", "csv", "ndjson", "parquet"], default="json", help="Output format (ndjson streams findings as each target finishes; parquet requires pyarrow)")
     parser.add_argument("--show-content", action="store_true", help="Show detailed trigger content diff")
+    parser.add_argument("--all-tables", action="store_true", help="Compare every table in the database instead of TableList.xlsx")
+    parser.add_argument("--fingerprint", action="store_true", help="Compare server-side table fingerprints first and fetch details only for drifted tables")
+    parser.add_argument("--diff-engine", choices=["myers", "ndiff"], default="myers", help="Diff engine for trigger --show-content")
+    parser.add_argument("--diff-context", type=int, default=3, help="Context lines around each diff hunk (myers engine)")
+    parser.add_argument("--diff-max-lines", type=int, default=2000, help="Summarize instead of listing diffs longer than this (0 = no limit)")
+    parser.add_argument("--diff-timeout", type=float, default=2.0, help="Per-object diff time limit in seconds (0 = no limit)")
+    parser.add_argument("--save-snapshot", metavar="DIR", help="Save fetched schema snapshots to DIR")
+    parser.add_argument("--from-snapshot", metavar="DIR", help="Compare from snapshots in DIR instead of connecting")
+    parser.add_argument("--compare-workers", type=int, default=DEFAULT_COMPARE_WORKERS, help="Targets compared concurrently as their schemas arrive")
+    parser.add_argument("--pipeline-queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="Fetched schemas allowed to wait for a comparer")
+    parser.add_argument("--norm-cache-size", type=float, default=64, help="Normalization cache memory bound in MB (0 = unbounded)")
+    parser.add_argument("--norm-cache-file", metavar="PATH", help="Persist the normalization cache to PATH between runs")
     if args is None:
         args = parser.parse_args()
     asyncio.run(main_async(args))
@@ -8,9 +8,9 @@ schema_utils.py
 import pyodbc
 import asyncio
 import re
-import difflib
 from collections import defaultdict
-from utils.sql_cleaner import clean_definition_lines
+from utils.sql_cleaner import clean_definition_lines, definitions_equal
+from utils.diff_engine import diff_lines
 
 
 # ---------- 資料查詢區 ----------
@@ -18,78 +18,178 @@ from utils.sql_cleaner import clean_definition_lines
 def build_conn_str(db: dict) -> str:
     return f"DRIVER={{SQL Server}};SERVER={db['server']};DATABASE={db['database']};UID={db['username']};PWD={db['password']}"
 
-def query_db(conn_str, query):
+def load_table_filter(cursor, tables):
+    """
+    將資料表清單載入此連線的 #tables 暫存表，並解析出 object_id。
+    之後的 catalog 查詢一律 JOIN #tables，SQL 文字長度固定、不隨清單變長，執行計畫可重複使用。
+
+    Args:
+        cursor: pyodbc cursor（暫存表存活於該連線期間）
+        tables (list[str] | None): schema.table 清單；None 代表整個資料庫，不建立暫存表
+    """
+    if tables is None:
+        return
+    # #tables 的 PK 依資料庫定序比對（通常不分大小寫），dbo.Orders 與 dbo.orders 只保留第一個寫法
+    unique = {}
+    for t in tables:
+        schema, table = qualify_table_name(t).split(".", 1)
+        unique.setdefault((schema.casefold(), table.casefold()), (schema, table))
+    rows = list(unique.values())
+    cursor.execute("""
+        IF OBJECT_ID('tempdb..#tables') IS NOT NULL DROP TABLE #tables;
+        CREATE TABLE #tables (
+            schema_name sysname COLLATE DATABASE_DEFAULT NOT NULL,
+            table_name sysname COLLATE DATABASE_DEFAULT NOT NULL,
+            object_id int NULL,
+            PRIMARY KEY (schema_name, table_name)
+        )
+    """)
+    if rows:
+        cursor.fast_executemany = True
+        cursor.executemany("INSERT INTO #tables (schema_name, table_name) VALUES (?, ?)", rows)
+    cursor.execute("""
+        UPDATE f SET object_id = t.object_id
+        FROM #tables f
+        JOIN sys.schemas s ON s.name = f.schema_name
+        JOIN sys.tables t ON t.schema_id = s.schema_id AND t.name = f.table_name
+    """)
+
+def query_db(conn_str, query, parse, tables=None):
+    """
+    執行單一查詢，並將 cursor 直接交給 parse 逐列處理（不經 fetchall 整批載入）。
+    """
+    with pyodbc.connect(conn_str, timeout=10) as conn:
+        cursor = conn.cursor()
+        load_table_filter(cursor, tables)
+        return parse(cursor.execute(query))
+
+def query_db_batch(conn_str, parts, tables=None):
+    """
+    以單一連線、單一 batch 送出多個查詢，並透過 cursor.nextset() 依序讀取每個結果集。
+    每個結果集直接以 cursor 逐列交給對應的 parse，不先整批載入記憶體。
+
+    Args:
+        conn_str (str): 連線字串
+        parts (list[tuple]): (SELECT 查詢, 結果解析函式)，每個查詢回傳一個結果集
+        tables (list[str] | None): 查詢前先載入 #tables 的資料表清單
+
+    Returns:
+        list: 與 parts 順序相同的解析結果
+    """
     with pyodbc.connect(conn_str, timeout=10) as conn:
-        return conn.cursor().execute(query).fetchall()
+        cursor = conn.cursor()
+        load_table_filter(cursor, tables)
+        # NOCOUNT 避免 "n rows affected" 訊息被當成額外的結果集
+        cursor.execute("SET NOCOUNT ON;\n" + ";\n".join(sql for sql, _ in parts))
+        results = []
+        for i, (_, parse) in enumerate(parts):
+            if i and not cursor.nextset():
+                raise RuntimeError(f"Expected {len(parts)} result sets, got {i}")
+            results.append(parse(cursor))
+    return results
 
-def get_schemas(conn_str):
+def qualify_table_name(name: str) -> str:
+    """
+    將資料表名稱轉為 schema.table 格式（去除中括號，未指定 schema 時預設為 dbo）。
+    """
+    parts = [p.strip().strip("[]") for p in name.strip().split(".")]
+    if len(parts) == 1:
+        parts.insert(0, "dbo")
+    return ".".join(parts[-2:])
+
+def _table_filter(column, tables):
+    """
+    tables 為 None 時代表整個資料庫，不加過濾條件；否則 JOIN 由 load_table_filter 建立的 #tables。
+    """
+    if tables is None:
+        return ""
+    return f"JOIN #tables f ON f.object_id = {column}"
+
+# 各項查詢拆成 SQL 與結果解析兩部分，單獨查詢與 batch 查詢共用。
+# 全部使用 sys.* catalog view 並以 object_id 關聯，資料表一律以 schema.table 為 key。
+
+def schemas_sql(tables):
+    # 型別與長度和 INFORMATION_SCHEMA.COLUMNS 相同：
+    #   DATA_TYPE 為系統型別名稱；CLR 型別（hierarchyid、geometry、geography）的 system_type_id 為 240，
+    #   沒有對應的系統型別，改用 user_type_id 的名稱
+    #   CHARACTER_MAXIMUM_LENGTH 即 COLUMNPROPERTY 'charmaxlen'（text / ntext / image / xml 亦同），非字元型別為 0
+    return f"""
+        SELECT s.name + '.' + t.name, c.name,
+               COALESCE(TYPE_NAME(c.system_type_id), TYPE_NAME(c.user_type_id)),
+               COALESCE(COLUMNPROPERTY(c.object_id, c.name, 'charmaxlen'), 0),
+               CASE WHEN c.is_nullable = 1 THEN 'YES' ELSE 'NO' END,
+               dc.definition
+        FROM sys.tables t
+        JOIN sys.schemas s ON s.schema_id = t.schema_id
+        JOIN sys.columns c ON c.object_id = t.object_id
+        LEFT JOIN sys.default_constraints dc ON dc.object_id = c.default_object_id
+        {_table_filter("t.object_id", tables)}
+    """
+
+def parse_schemas(rows):
     result = defaultdict(list)
-    rows = query_db(conn_str, """
-        SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE,
-               COALESCE(CHARACTER_MAXIMUM_LENGTH, 0), IS_NULLABLE, COLUMN_DEFAULT
-        FROM INFORMATION_SCHEMA.COLUMNS
-    """)
     for row in rows:
         result[row[0]].append(row[1:])
     return result
 
-def get_primary_keys(conn_str, tables):
+def primary_keys_sql(tables):
+    return f"""
+        SELECT s.name + '.' + t.name, c.name
+        FROM sys.key_constraints kc
+        JOIN sys.tables t ON t.object_id = kc.parent_object_id
+        JOIN sys.schemas s ON s.schema_id = t.schema_id
+        JOIN sys.index_columns ic ON ic.object_id = kc.parent_object_id AND ic.index_id = kc.unique_index_id
+        JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+        {_table_filter("t.object_id", tables)}
+        WHERE kc.type = 'PK'
+    """
+
+def parse_primary_keys(rows):
     result = defaultdict(set)
-    if not tables:
-        return result
-    table_str = ", ".join(f"'{t}'" for t in tables)
-    rows = query_db(conn_str, f"""
-        SELECT TABLE_NAME, COLUMN_NAME 
-        FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
-        WHERE OBJECTPROPERTY(OBJECT_ID(CONSTRAINT_SCHEMA + '.' + CONSTRAINT_NAME), 'IsPrimaryKey') = 1
-        AND TABLE_NAME IN ({table_str})
-    """)
     for row in rows:
         result[row[0]].add(row[1])
     return result
 
-def get_foreign_keys(conn_str, tables):
+def foreign_keys_sql(tables):
+    return f"""
+        SELECT ps.name + '.' + pt.name, pc.name, rs.name + '.' + rt.name, rc.name
+        FROM sys.foreign_key_columns fkc
+        JOIN sys.tables pt ON pt.object_id = fkc.parent_object_id
+        JOIN sys.schemas ps ON ps.schema_id = pt.schema_id
+        JOIN sys.columns pc ON pc.object_id = fkc.parent_object_id AND pc.column_id = fkc.parent_column_id
+        JOIN sys.tables rt ON rt.object_id = fkc.referenced_object_id
+        JOIN sys.schemas rs ON rs.schema_id = rt.schema_id
+        JOIN sys.columns rc ON rc.object_id = fkc.referenced_object_id AND rc.column_id = fkc.referenced_column_id
+        {_table_filter("pt.object_id", tables)}
+    """
+
+def parse_foreign_keys(rows):
     result = defaultdict(set)
-    if not tables:
-        return result
-    table_str = ", ".join(f"'{t}'" for t in tables)
-    rows = query_db(conn_str, f"""
-        SELECT tc.TABLE_NAME, kcu.COLUMN_NAME, ccu.TABLE_NAME, ccu.COLUMN_NAME
-        FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS AS tc
-        JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE AS kcu ON tc.CONSTRAINT_NAME = kcu.CONSTRAINT_NAME
-        JOIN INFORMATION_SCHEMA.CONSTRAINT_COLUMN_USAGE AS ccu ON tc.CONSTRAINT_NAME = ccu.CONSTRAINT_NAME
-        WHERE tc.CONSTRAINT_TYPE = 'FOREIGN KEY'
-        AND tc.TABLE_NAME IN ({table_str})
-    """)
     for row in rows:
         result[row[0]].add((row[1], row[2], row[3]))
     return result
 
-def get_indexes(conn_str, tables):
-    result = defaultdict(set)
-    if not tables:
-        return result
-    table_str = ", ".join(f"'{t}'" for t in tables)
-    rows = query_db(conn_str, f"""
-        SELECT t.name, ind.name, col.name
+def indexes_sql(tables):
+    return f"""
+        SELECT s.name + '.' + t.name, ind.name, col.name
         FROM sys.indexes ind
         JOIN sys.index_columns ic ON ind.object_id = ic.object_id AND ind.index_id = ic.index_id
         JOIN sys.columns col ON ic.object_id = col.object_id AND ic.column_id = col.column_id
         JOIN sys.tables t ON ind.object_id = t.object_id
-        WHERE t.name IN ({table_str})
-        AND ind.is_primary_key = 0 AND ind.is_unique_constraint = 0
-    """)
+        JOIN sys.schemas s ON s.schema_id = t.schema_id
+        {_table_filter("t.object_id", tables)}
+        WHERE ind.is_primary_key = 0 AND ind.is_unique_constraint = 0
+    """
+
+def parse_indexes(rows):
+    result = defaultdict(set)
     for row in rows:
         result[row[0]].add((row[1], row[2]))
     return result
 
-def get_triggers(conn_str, tables):
-    result = defaultdict(dict)
-    if not tables:
-        return result
-    table_str = ", ".join(f"'{t}'" for t in tables)
-    rows = query_db(conn_str, f"""
-        SELECT trg.name, tbl.name, m.definition,
+def triggers_sql(tables):
+    return f"""
+        SELECT trg.name, s.name + '.' + tbl.name, m.definition,
                CASE WHEN trg.is_instead_of_trigger = 1 THEN 'INSTEAD OF' ELSE 'AFTER' END,
                STUFF((SELECT '/' + TE.type_desc
                       FROM sys.trigger_events TE
@@ -97,9 +197,13 @@ def get_triggers(conn_str, tables):
                       FOR XML PATH('')), 1, 1, '')
         FROM sys.triggers trg
         JOIN sys.tables tbl ON trg.parent_id = tbl.object_id
+        JOIN sys.schemas s ON s.schema_id = tbl.schema_id
         JOIN sys.sql_modules m ON trg.object_id = m.object_id
-        WHERE tbl.name IN ({table_str})
-    """)
+        {_table_filter("tbl.object_id", tables)}
+    """
+
+def parse_triggers(rows):
+    result = defaultdict(dict)
     for name, table, definition, trig_type, event in rows:
         result[table][name] = {
             "definition": definition or "",
@@ -108,36 +212,173 @@ def get_triggers(conn_str, tables):
         }
     return result
 
-def get_unique_constraints(conn_str, tables):
+def unique_constraints_sql(tables):
+    return f"""
+        SELECT s.name + '.' + t.name, c.name, kc.name
+        FROM sys.key_constraints kc
+        JOIN sys.tables t ON t.object_id = kc.parent_object_id
+        JOIN sys.schemas s ON s.schema_id = t.schema_id
+        JOIN sys.index_columns ic ON ic.object_id = kc.parent_object_id AND ic.index_id = kc.unique_index_id
+        JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+        {_table_filter("t.object_id", tables)}
+        WHERE kc.type = 'UQ'
+    """
+
+def parse_unique_constraints(rows):
     result = defaultdict(set)
-    if not tables:
-        return result
-    table_str = ", ".join(f"'{t}'" for t in tables)
-    rows = query_db(conn_str, f"""
-        SELECT tc.TABLE_NAME, kcu.COLUMN_NAME, tc.CONSTRAINT_NAME
-        FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS tc
-        JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE kcu ON tc.CONSTRAINT_NAME = kcu.CONSTRAINT_NAME
-        WHERE tc.CONSTRAINT_TYPE = 'UNIQUE'
-        AND tc.TABLE_NAME IN ({table_str})
-    """)
     for row in rows:
         result[row[0]].add((row[2], row[1]))
     return result
 
+def fingerprints_sql(tables):
+    # 每列先組成標準化描述（與 compare_full_schema 比對的內容一致），
+    # 再依描述排序串接後以 SHA2_256 於 server 端彙總為每個資料表一個指紋（需 SQL Server 2017 以上）。
+    # 不用 CHECKSUM_AGG：它是 XOR，兩筆相同的描述會互相抵銷
+    return f"""
+        SELECT s.name + '.' + t.name,
+               CONVERT(varchar(64), HASHBYTES('SHA2_256',
+                   STRING_AGG(CONVERT(nvarchar(max), d.descr), NCHAR(30)) WITHIN GROUP (ORDER BY d.descr)), 2)
+        FROM (
+            SELECT c.object_id, CONCAT(N'C|', c.name, N'|', COALESCE(TYPE_NAME(c.system_type_id), TYPE_NAME(c.user_type_id)),
+                                       N'|', c.max_length, N'|', c.is_nullable, N'|', dc.definition) AS descr
+            FROM sys.columns c
+            LEFT JOIN sys.default_constraints dc ON dc.object_id = c.default_object_id
+            UNION ALL
+            SELECT kc.parent_object_id, CONCAT(N'PK|', c.name)
+            FROM sys.key_constraints kc
+            JOIN sys.index_columns ic ON ic.object_id = kc.parent_object_id AND ic.index_id = kc.unique_index_id
+            JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+            WHERE kc.type = 'PK'
+            UNION ALL
+            SELECT kc.parent_object_id, CONCAT(N'UQ|', kc.name, N'|', c.name)
+            FROM sys.key_constraints kc
+            JOIN sys.index_columns ic ON ic.object_id = kc.parent_object_id AND ic.index_id = kc.unique_index_id
+            JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+            WHERE kc.type = 'UQ'
+            UNION ALL
+            SELECT fkc.parent_object_id, CONCAT(N'FK|', pc.name, N'|', rs.name, N'.', rt.name, N'|', rc.name)
+            FROM sys.foreign_key_columns fkc
+            JOIN sys.columns pc ON pc.object_id = fkc.parent_object_id AND pc.column_id = fkc.parent_column_id
+            JOIN sys.tables rt ON rt.object_id = fkc.referenced_object_id
+            JOIN sys.schemas rs ON rs.schema_id = rt.schema_id
+            JOIN sys.columns rc ON rc.object_id = fkc.referenced_object_id AND rc.column_id = fkc.referenced_column_id
+            UNION ALL
+            SELECT ind.object_id, CONCAT(N'IX|', ind.name, N'|', col.name)
+            FROM sys.indexes ind
+            JOIN sys.index_columns ic ON ind.object_id = ic.object_id AND ind.index_id = ic.index_id
+            JOIN sys.columns col ON ic.object_id = col.object_id AND ic.column_id = col.column_id
+            WHERE ind.is_primary_key = 0 AND ind.is_unique_constraint = 0
+            UNION ALL
+            SELECT trg.parent_id, CONCAT(N'TR|', trg.name, N'|', trg.is_instead_of_trigger, N'|',
+                                         CONVERT(varchar(64), HASHBYTES('SHA2_256', m.definition), 2))
+            FROM sys.triggers trg
+            JOIN sys.sql_modules m ON trg.object_id = m.object_id
+            UNION ALL
+            SELECT trg.parent_id, CONCAT(N'TE|', trg.name, N'|', te.type_desc)
+            FROM sys.triggers trg
+            JOIN sys.trigger_events te ON te.object_id = trg.object_id
+        ) d
+        JOIN sys.tables t ON t.object_id = d.object_id
+        JOIN sys.schemas s ON s.schema_id = t.schema_id
+        {_table_filter("t.object_id", tables)}
+        GROUP BY s.name, t.name
+    """
+
+def parse_fingerprints(rows):
+    return {row[0]: row[1] for row in rows}
+
+# 依 fetch_schema_info 回傳順序排列：欄位、PK、FK、Index、Trigger、Unique
+CATALOG_PARTS = (
+    (schemas_sql, parse_schemas),
+    (primary_keys_sql, parse_primary_keys),
+    (foreign_keys_sql, parse_foreign_keys),
+    (indexes_sql, parse_indexes),
+    (triggers_sql, parse_triggers),
+    (unique_constraints_sql, parse_unique_constraints),
+)
+
+# tables 為 None 時取整個資料庫；為空清單時不查詢，直接回傳空結果
+
+def get_schemas(conn_str, tables=None):
+    if tables is not None and not tables:
+        return defaultdict(list)
+    return query_db(conn_str, schemas_sql(tables), parse_schemas, tables)
+
+def get_primary_keys(conn_str, tables):
+    if tables is not None and not tables:
+        return defaultdict(set)
+    return query_db(conn_str, primary_keys_sql(tables), parse_primary_keys, tables)
+
+def get_foreign_keys(conn_str, tables):
+    if tables is not None and not tables:
+        return defaultdict(set)
+    return query_db(conn_str, foreign_keys_sql(tables), parse_foreign_keys, tables)
+
+def get_indexes(conn_str, tables):
+    if tables is not None and not tables:
+        return defaultdict(set)
+    return query_db(conn_str, indexes_sql(tables), parse_indexes, tables)
+
+def get_triggers(conn_str, tables):
+    if tables is not None and not tables:
+        return defaultdict(dict)
+    return query_db(conn_str, triggers_sql(tables), parse_triggers, tables)
+
+def get_unique_constraints(conn_str, tables):
+    if tables is not None and not tables:
+        return defaultdict(set)
+    return query_db(conn_str, unique_constraints_sql(tables), parse_unique_constraints, tables)
+
+def get_table_fingerprints(conn_str, tables):
+    """
+    以一個查詢取得每個資料表的結構指紋（於 server 端計算，只回傳一個整數）。
+
+    Args:
+        conn_str (str): 連線字串
+        tables (list[str] | None): 要比對的資料表（schema.table）；None 代表整個資料庫
+
+    Returns:
+        dict: {schema.table: 指紋}；不存在的資料表不會出現在結果中
+    """
+    if tables is not None and not tables:
+        return {}
+    return query_db(conn_str, fingerprints_sql(tables), parse_fingerprints, tables)
+
+def get_catalog_snapshot(conn_str, tables):
+    """
+    以單一連線、單一 batch 取得 fetch_schema_info 所需的六項結構資料。
+
+    Args:
+        conn_str (str): 連線字串
+        tables (list[str] | None): 要比對的資料表（schema.table）；None 代表整個資料庫
+
+    Returns:
+        tuple: (欄位, PK, FK, Index, Trigger, Unique)，皆以 schema.table 為 key
+    """
+    if tables is not None and not tables:
+        return tuple(parse([]) for _, parse in CATALOG_PARTS)
+    parts = [(build_sql(tables), parse) for build_sql, parse in CATALOG_PARTS]
+    return tuple(query_db_batch(conn_str, parts, tables))
+
 
 # ---------- 非同步 fetch 全部結構 ----------
 
-async def fetch_schema_info(db: dict, tables: list[str]):
+async def fetch_schema_info(db: dict, tables: list[str] | None):
+    """
+    取得資料庫結構（欄位、PK、FK、Index、Trigger、Unique）。
+
+    Args:
+        db (dict): 連線資訊
+        tables (list[str] | None): 要比對的資料表（schema.table）；None 代表整個資料庫
+    """
+    conn_str = build_conn_str(db)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, get_catalog_snapshot, conn_str, tables)
+
+async def fetch_table_fingerprints(db: dict, tables: list[str] | None):
     conn_str = build_conn_str(db)
     loop = asyncio.get_running_loop()
-    return await asyncio.gather(
-        loop.run_in_executor(None, get_schemas, conn_str),
-        loop.run_in_executor(None, get_primary_keys, conn_str, tables),
-        loop.run_in_executor(None, get_foreign_keys, conn_str, tables),
-        loop.run_in_executor(None, get_indexes, conn_str, tables),
-        loop.run_in_executor(None, get_triggers, conn_str, tables),
-        loop.run_in_executor(None, get_unique_constraints, conn_str, tables)
-    )
+    return await loop.run_in_executor(None, get_table_fingerprints, conn_str, tables)
 
 
 # ---------- 比對邏輯 ----------
@@ -150,7 +391,7 @@ def normalize_default(value):
         value = value[1:-1]
     return value
 
-def compare_triggers(base_trigs, target_trigs, show_content):
+def compare_triggers(base_trigs, target_trigs, show_content, diff_settings=None):
     result = {}
     all_names = set(base_trigs.keys()).union(target_trigs.keys())
     for name in all_names:
@@ -163,19 +404,16 @@ def compare_triggers(base_trigs, target_trigs, show_content):
         else:
             if b["type"] != t["type"] or b["event"] != t["event"]:
                 result[name] = "Trigger metadata differs"
-            else:
-                base_lines = clean_definition_lines(b["definition"])
-                target_lines = clean_definition_lines(t["definition"])
-                if base_lines != target_lines:
-                    if show_content:
-                        diff = difflib.ndiff(base_lines, target_lines)
-                        diff_lines = [line for line in diff if line.startswith("- ") or line.startswith("+ ")]
-                        result[name] = ["Definition differs"] + diff_lines
-                    else:
-                        result[name] = "Definition differs"
+            elif not definitions_equal(b["definition"], t["definition"]):
+                if show_content:
+                    base_lines = clean_definition_lines(b["definition"])
+                    target_lines = clean_definition_lines(t["definition"])
+                    result[name] = ["Definition differs"] + diff_lines(base_lines, target_lines, diff_settings)
+                else:
+                    result[name] = "Definition differs"
     return result
 
-def compare_full_schema(base_schema, target_schema, base_db, target_db, table_name, show_trigger_content=False):
+def compare_full_schema(base_schema, target_schema, base_db, target_db, table_name, show_trigger_content=False, diff_settings=None):
     b_schemas, b_pks, b_fks, b_indexes, b_trigs, b_uniques = base_schema
     t_schemas, t_pks, t_fks, t_indexes, t_trigs, t_uniques = target_schema
 
@@ -219,7 +457,7 @@ def compare_full_schema(base_schema, target_schema, base_db, target_db, table_na
         diff["Index"] = f"{sorted(b_indexes.get(table_name, set()))} vs {sorted(t_indexes.get(table_name, set()))}"
 
     # Trigger
-    trig_diff = compare_triggers(b_trigs.get(table_name, {}), t_trigs.get(table_name, {}), show_trigger_content)
+    trig_diff = compare_triggers(b_trigs.get(table_name, {}), t_trigs.get(table_name, {}), show_trigger_content, diff_settings)
     if trig_diff:
         diff["Trigger"] = trig_diff
 
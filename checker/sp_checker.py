@@ -5,39 +5,41 @@ Compares stored procedure definitions across SQL Server databases.
 Supports multiple target databases, shows content diffs, and outputs to JSON/CSV.
 """
 
-import pyodbc
 import argparse
 import asyncio
-import difflib
 from collections import defaultdict
 from datetime import datetime
 
 from utils.db_reader import read_db_info, read_list_from_excel
-from utils.sql_cleaner import clean_definition_lines
-from utils.result_writer import save_results
+from utils.sql_cleaner import clean_definition_lines, definitions_equal, configure_normalization_cache, close_normalization_cache
+from utils.result_writer import open_result_writer
+from utils.snapshot import fetch_with_snapshot
+from utils.definition_variants import VariantRegistry, VARIANTS_SECTION
+from utils.diff_engine import DiffSettings, diff_lines
+from utils.compare_pipeline import CompareJob, run_compare_pipeline, DEFAULT_COMPARE_WORKERS, DEFAULT_QUEUE_SIZE
+from checker.catalog_cache import get_definitions_cached_async
+from checker.schema_utils import build_conn_str
+from checker.module_definitions import (
+    DEFAULT_BATCH_SIZE, is_streaming, iter_module_definitions, name_case_differs, open_module_stream_async, pair_listed_rows
+)
 from utils.config import DEFAULT_ACCOUNT_PATH, DEFAULT_SP_LIST
 
-# Retrieve all stored procedure definitions from a database
-def get_sp_definitions(conn_str):
-    conn = pyodbc.connect(conn_str)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT o.name, m.definition
-        FROM sys.sql_modules m
-        JOIN sys.objects o ON m.object_id = o.object_id
-        WHERE o.type = 'P'
-    """)
-    definitions = {row[0]: row[1].strip() if row[1] else None for row in cursor.fetchall()}
-    conn.close()
-    return definitions
+# Retrieve stored procedure definitions (all, or only the listed names filtered server-side)
+def get_sp_definitions(conn_str, names=None, batch_size=DEFAULT_BATCH_SIZE):
+    return dict(iter_module_definitions(conn_str, "sp", names, batch_size))
 
 # Wrap in asynchronous execution
-def get_sp_definitions_async(conn_str):
+def get_sp_definitions_async(conn_str, names=None, batch_size=DEFAULT_BATCH_SIZE):
     loop = asyncio.get_running_loop()
-    return loop.run_in_executor(None, get_sp_definitions, conn_str)
+    return loop.run_in_executor(None, get_sp_definitions, conn_str, names, batch_size)
+
+# Line diff between two cleaned definitions (engine and limits from DiffSettings)
+def diff_definitions(base_def, target_def, diff_settings=None):
+    return diff_lines(clean_definition_lines(base_def), clean_definition_lines(target_def), diff_settings)
 
 # Compare stored procedure definitions (optionally show content differences)
-def compare_definitions(base_def, target_def, base_db, target_db, sp_name, show_content):
+# With a VariantRegistry, each distinct target version is diffed once and listed in the Variants report
+def compare_definitions(base_def, target_def, base_db, target_db, sp_name, show_content, variants=None, location=None, diff_settings=None):
     differences = defaultdict(dict)
 
     if base_def is None and target_def is None:
@@ -46,87 +48,130 @@ def compare_definitions(base_def, target_def, base_db, target_db, sp_name, show_
         differences[target_db][f"[{sp_name}]"] = ["Missing in standard"]
     elif target_def is None:
         differences[target_db][f"[{sp_name}]"] = ["Missing in target database"]
-    else:
-        base_lines = clean_definition_lines(base_def)
-        target_lines = clean_definition_lines(target_def)
-
-        if base_lines != target_lines:
-            if show_content:
-                diff = difflib.ndiff(base_lines, target_lines)
-                diff_lines = [line for line in diff if line.startswith("- ") or line.startswith("+ ")]
-                differences[target_db][f"[{sp_name}]"] = ["Definition is different!", *diff_lines]
-            else:
-                differences[target_db][f"[{sp_name}]"] = ["Definition is different!"]
+    elif not definitions_equal(base_def, target_def):
+        make_diff = lambda: diff_definitions(base_def, target_def, diff_settings) if show_content else []
+        if variants is not None:
+            entry = variants.register(f"[{sp_name}]", target_def, location or target_db, make_diff)
+            differences[target_db][f"[{sp_name}]"] = ["Definition is different!", f"Variant {entry['id']} (see {VARIANTS_SECTION} report)"]
+        else:
+            differences[target_db][f"[{sp_name}]"] = ["Definition is different!", *make_diff()]
 
     return differences if differences else None
 
-# Compare stored procedures for one target database
-async def compare_sp_definitions(base_db, target_db, sp_list, show_content):
-    base_conn_str = f"DRIVER={{SQL Server}};SERVER={base_db['server']};DATABASE={base_db['database']};UID={base_db['username']};PWD={base_db['password']}"
-    target_conn_str = f"DRIVER={{SQL Server}};SERVER={target_db['server']};DATABASE={target_db['database']};UID={target_db['username']};PWD={target_db['password']}"
-
-    base_defs, target_defs = await asyncio.gather(
-        get_sp_definitions_async(base_conn_str),
-        get_sp_definitions_async(target_conn_str)
+# Fetch SP definitions for one database (live or from snapshot)
+# Live fetches without cache/snapshot options only pull the listed names
+async def fetch_sp_definitions(db, args=None, names=None):
+    conn_str = build_conn_str(db)
+    cache_dir = getattr(args, "catalog_cache", None)
+    if cache_dir:
+        fetch = lambda: get_definitions_cached_async(conn_str, db, "sp", cache_dir)
+    else:
+        names = names if is_streaming(args) else None
+        fetch = lambda: get_sp_definitions_async(conn_str, names, getattr(args, "fetch_batch_size", None) or DEFAULT_BATCH_SIZE)
+    return await fetch_with_snapshot(db, "sp", fetch, args)
+
+# Compare one listed SP; matches are (schema.name, definition) pairs, None when missing
+def compare_listed_sp(sp, base_match, target_match, base_db, target_db, show_content, variants, diff_settings):
+    base_key, base_def = base_match or (None, None)
+    target_key, target_def = target_match or (None, None)
+
+    # Brackets are ignored, and a schema missing from the listed name (or the row) is not compared
+    messages = []
+    if any(key is None or name_case_differs(sp, key) for key in (base_key, target_key)):
+        messages.append(f"Warning: Case mismatch for SP '{sp}' → Base='{base_key}', Target='{target_key}'")
+
+    diff = compare_definitions(
+        base_def, target_def, base_db["database"], target_db["database"], sp, show_content,
+        variants, f"{target_db['server']}/{target_db['database']}", diff_settings
     )
 
-    base_keys = {k.lower(): k for k in base_defs}
-    target_keys = {k.lower(): k for k in target_defs}
-
     result = defaultdict(dict)
-    for sp in sp_list:
-        key_lower = sp.lower()
-        base_key = base_keys.get(key_lower)
-        target_key = target_keys.get(key_lower)
-        base_def = base_defs.get(base_key)
-        target_def = target_defs.get(target_key)
-
-        messages = []
-        if base_key != sp or target_key != sp:
-            messages.append(f"Warning: Case mismatch for SP '{sp}' → Base='{base_key}', Target='{target_key}'")
-
-        diff = compare_definitions(base_def, target_def, base_db["database"], target_db["database"], sp, show_content)
-
-        if diff:
-            for db, d in diff.items():
-                for name, msg in d.items():
-                    result[db][name] = messages + msg
-        elif messages:
-            result[target_db["database"]][f"[{sp}]"] = messages
+    if diff:
+        for db, d in diff.items():
+            for name, msg in d.items():
+                result[db][name] = messages + msg
+    elif messages:
+        result[target_db["database"]][f"[{sp}]"] = messages
+    return result
+
+# Compare target rows as they are read; each target definition is released once compared
+def compare_sp_rows(base_defs, target_rows, sp_list, base_db, target_db, show_content, variants=None, diff_settings=None):
+    compared = {}
+    for sp, base_match, target_match in pair_listed_rows(sp_list, base_defs, target_rows):
+        compared[sp] = compare_listed_sp(sp, base_match, target_match, base_db, target_db, show_content, variants, diff_settings)
 
-    return target_db["server"], result
+    result = defaultdict(dict)
+    for sp in dict.fromkeys(sp_list):
+        for db, d in compared[sp].items():
+            result[db].update(d)
+    return result
+
+# Pipeline job for one target database: fetch its definitions, then compare them against the shared base definitions
+# Without cache/snapshot options the fetch connects, runs the query and reads the first fetchmany batch in the
+# executor; the comparer reads the remaining batches as it compares
+def sp_compare_job(base_defs, base_db, target_db, sp_list, show_content, args=None, variants=None):
+    async def fetch():
+        if is_streaming(args):
+            conn_str = build_conn_str(target_db)
+            return await open_module_stream_async(conn_str, "sp", sp_list, getattr(args, "fetch_batch_size", None) or DEFAULT_BATCH_SIZE)
+        return (await fetch_sp_definitions(target_db, args)).items()
+
+    diff_settings = DiffSettings.from_args(args)
+    return CompareJob(
+        db=target_db,
+        kind="sp",
+        fetch=fetch,
+        compare=lambda target_rows: compare_sp_rows(
+            base_defs, target_rows, sp_list, base_db, target_db, show_content, variants, diff_settings
+        ),
+    )
 
 # Async entry point
+# Targets go through the compare pipeline: each is diffed as soon as its definitions arrive and written as soon as it is compared
 async def main_async(args):
     print(f"Start Time: {datetime.now():%Y-%m-%d %H:%M:%S}")
-
-    base_db, target_dbs = read_db_info(DEFAULT_ACCOUNT_PATH)
-    sp_list = read_list_from_excel(DEFAULT_SP_LIST, column_name="SP Name")
-
-    tasks = [
-        compare_sp_definitions(base_db, target_db, sp_list, args.show_content)
-        for target_db in target_dbs
-    ]
-    all_results = await asyncio.gather(*tasks)
-
-    final_diff = defaultdict(lambda: defaultdict(dict))
-    for server, db_diff in all_results:
-        for dbname, data in db_diff.items():
-            final_diff[server][dbname].update(data)
-
-    if args.output:
-        save_results(final_diff, args.format, args.output)
-    else:
-        save_results(final_diff, "console", None)
-
+    configure_normalization_cache(args)
+
+    try:
+        base_db, target_dbs = read_db_info(DEFAULT_ACCOUNT_PATH)
+        sp_list = read_list_from_excel(DEFAULT_SP_LIST, column_name="SP Name")
+
+        # Base definitions are fetched once and shared by every target
+        base_defs = await fetch_sp_definitions(base_db, args, sp_list)
+        variants = VariantRegistry([f"{db['server']}/{db['database']}" for db in target_dbs])
+
+        jobs = [
+            sp_compare_job(base_defs, base_db, target_db, sp_list, args.show_content, args, variants)
+            for target_db in target_dbs
+        ]
+        # Variants need every target, so they are written last
+        with open_result_writer(args) as writer:
+            stats = await run_compare_pipeline(jobs, writer, args)
+            writer.add_variants(variants.report())
+        print(stats.report())
+    finally:
+        # Report and save the cache even when a fetch or the writer fails
+        close_normalization_cache()
     print(f"End Time: {datetime.now():%Y-%m-%d %H:%M:%S}")
 
 # CLI entry point
 def main(args=None):
     parser = argparse.ArgumentParser(description="Compare SQL Server Stored Procedure definitions")
     parser.add_argument("--output", required=False, help="Output filename (optional)")
-    parser.add_argument("--format", choices=["json", "csv"], default="json", help="Output format")
+    parser.add_argument("--format", choices=["json", "csv", "ndjson", "parquet"], default="json", help="Output format (ndjson streams findings as each target finishes; parquet requires pyarrow)")
     parser.add_argument("--show-content", action="store_true", help="Show detailed diff content")
+    parser.add_argument("--save-snapshot", metavar="DIR", help="Save fetched definitions to snapshots in DIR")
+    parser.add_argument("--from-snapshot", metavar="DIR", help="Compare from snapshots in DIR instead of connecting")
+    parser.add_argument("--catalog-cache", metavar="DIR", help="Keep a local definition cache in DIR and only download objects changed since the last run")
+    parser.add_argument("--diff-engine", choices=["myers", "ndiff"], default="myers", help="Diff engine for --show-content")
+    parser.add_argument("--diff-context", type=int, default=3, help="Context lines around each diff hunk (myers engine)")
+    parser.add_argument("--diff-max-lines", type=int, default=2000, help="Summarize instead of listing diffs longer than this (0 = no limit)")
+    parser.add_argument("--diff-timeout", type=float, default=2.0, help="Per-object diff time limit in seconds (0 = no limit)")
+    parser.add_argument("--fetch-batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per fetchmany when streaming definitions")
+    parser.add_argument("--compare-workers", type=int, default=DEFAULT_COMPARE_WORKERS, help="Targets compared concurrently as their definitions arrive")
+    parser.add_argument("--pipeline-queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="Fetched targets allowed to wait for a comparer")
+    parser.add_argument("--norm-cache-size", type=float, default=64, help="Normalization cache memory bound in MB (0 = unbounded)")
+    parser.add_argument("--norm-cache-file", metavar="PATH", help="Persist the normalization cache to PATH between runs")
     if args is None:
         args = parser.parse_args()
     asyncio.run(main_async(args))
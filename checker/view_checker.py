@@ -8,118 +8,261 @@ Supports multiple target databases and outputs results as JSON, CSV, or to conso
 import pyodbc
 import argparse
 import asyncio
-import difflib
-from collections import defaultdict
 from datetime import datetime
 
 from utils.db_reader import read_db_info, read_list_from_excel
-from utils.sql_cleaner import clean_definition_lines
-from utils.result_writer import save_results
+from utils.sql_cleaner import clean_definition_lines, definitions_equal, configure_normalization_cache, close_normalization_cache
+from utils.result_writer import open_result_writer
+from utils.snapshot import fetch_with_snapshot
+from utils.definition_variants import VariantRegistry, VARIANTS_SECTION
+from utils.diff_engine import DiffSettings, diff_lines
+from utils.compare_pipeline import CompareJob, run_compare_pipeline, DEFAULT_COMPARE_WORKERS, DEFAULT_QUEUE_SIZE
+from checker.catalog_cache import get_definitions_cached_async
+from checker.schema_utils import build_conn_str
+from checker.module_definitions import (
+    DEFAULT_BATCH_SIZE, build_name_index, is_streaming, iter_module_definitions, load_name_filter, match_name, open_module_stream_async,
+    pair_listed_rows, split_object_name
+)
 from utils.config import DEFAULT_ACCOUNT_PATH, DEFAULT_VIEW_LIST
 
-# Retrieve View definitions from the database
-def get_view_definitions(conn_str):
-    conn = pyodbc.connect(conn_str)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT o.name, m.definition
-        FROM sys.sql_modules m
-        JOIN sys.objects o ON m.object_id = o.object_id
-        WHERE o.type = 'V'
-    """)
-    definitions = {row[0]: row[1].strip() if row[1] else None for row in cursor.fetchall()}
-    conn.close()
-    return definitions
-
-def get_view_definitions_async(conn_str):
+ROW_COUNT_MODES = ("exact", "estimate")
+DEFAULT_COUNT_BATCH_SIZE = 20
+DEFAULT_COUNT_TIMEOUT = 300
+DEFAULT_ESTIMATE_TOLERANCE = 0.05
+
+# Retrieve View definitions (all, or only the listed names filtered server-side)
+def get_view_definitions(conn_str, names=None, batch_size=DEFAULT_BATCH_SIZE):
+    return dict(iter_module_definitions(conn_str, "view", names, batch_size))
+
+def get_view_definitions_async(conn_str, names=None, batch_size=DEFAULT_BATCH_SIZE):
     loop = asyncio.get_running_loop()
-    return loop.run_in_executor(None, get_view_definitions, conn_str)
+    return loop.run_in_executor(None, get_view_definitions, conn_str, names, batch_size)
 
-# Retrieve View row count
+# Fetch View definitions for one database (live or from snapshot)
+# Live fetches without cache/snapshot options only pull the listed names
+async def fetch_view_definitions(db, args=None, names=None):
+    conn_str = build_conn_str(db)
+    cache_dir = getattr(args, "catalog_cache", None)
+    if cache_dir:
+        fetch = lambda: get_definitions_cached_async(conn_str, db, "view", cache_dir)
+    else:
+        names = names if is_streaming(args) else None
+        fetch = lambda: get_view_definitions_async(conn_str, names, getattr(args, "fetch_batch_size", None) or DEFAULT_BATCH_SIZE)
+    return await fetch_with_snapshot(db, "view", fetch, args)
 
-def get_view_row_count(conn_str, view_name):
+# Quote a (optionally schema-qualified) view name for use in a query
+def quote_view_name(view_name):
+    schema, name = split_object_name(view_name)
+    parts = [schema, name] if schema else [name]
+    return ".".join("[" + part.replace("]", "]]") + "]" for part in parts)
+
+# Retrieve View row counts over one connection, several views per batch
+# Each batch returns one result set per view (read with nextset); when a batch fails, only the views
+# it had not counted yet are retried one by one
+def get_view_row_counts(conn_str, views, batch_size=DEFAULT_COUNT_BATCH_SIZE, timeout=DEFAULT_COUNT_TIMEOUT):
+    views = list(dict.fromkeys(views))
     try:
         conn = pyodbc.connect(conn_str)
+    except Exception as e:
+        return {view: f"Error: {str(e)}" for view in views}
+
+    counts = {}
+    try:
         cursor = conn.cursor()
-        cursor.execute(f"SELECT COUNT(*) FROM [{view_name}]")
-        count = cursor.fetchone()[0]
+        for start in range(0, len(views), batch_size):
+            batch = views[start:start + batch_size]
+            # timeout is per query, so a batch of n views gets n times the budget
+            conn.timeout = timeout * len(batch) if timeout else 0
+            try:
+                cursor.execute("SET NOCOUNT ON;\n" + ";\n".join(f"SELECT COUNT_BIG(*) FROM {quote_view_name(view)}" for view in batch))
+                for i, view in enumerate(batch):
+                    if i and not cursor.nextset():
+                        raise RuntimeError(f"Expected {len(batch)} result sets, got {i}")
+                    counts[view] = cursor.fetchone()[0]
+            except Exception:
+                conn.timeout = timeout or 0
+                for view in batch:
+                    if view in counts:
+                        continue
+                    try:
+                        counts[view] = cursor.execute(f"SELECT COUNT_BIG(*) FROM {quote_view_name(view)}").fetchone()[0]
+                    except Exception as e:
+                        counts[view] = f"Error: {str(e)}"
+    finally:
         conn.close()
-        return count
+    return counts
+
+# Estimate View row counts from sys.dm_db_partition_stats of the tables each view references
+# (heap / clustered index rows, summed over partitions and tables); views referenced by the view are
+# followed down to their tables, and no view is executed.
+# Views whose references resolve to no table (e.g. only synonyms or remote objects) map to None: not estimable
+def estimate_view_row_counts(conn_str, views, timeout=DEFAULT_COUNT_TIMEOUT):
+    views = list(dict.fromkeys(views))
+    try:
+        conn = pyodbc.connect(conn_str)
+    except Exception as e:
+        return {view: f"Error: {str(e)}" for view in views}
+
+    try:
+        conn.timeout = timeout or 0
+        cursor = conn.cursor()
+        load_name_filter(cursor, views)
+        # referenced_minor_id = 0: one row per referenced object, not one per referenced column
+        # (schema-bound views list each column, which would multiply the sum)
+        cursor.execute("""
+            WITH refs AS (
+                SELECT v.object_id AS view_id, d.referenced_id, 0 AS depth
+                FROM sys.views v
+                JOIN sys.sql_expression_dependencies d ON d.referencing_id = v.object_id AND d.referenced_minor_id = 0
+                WHERE EXISTS (
+                    SELECT 1 FROM #names n
+                    WHERE LOWER(n.object_name) = LOWER(v.name COLLATE DATABASE_DEFAULT)
+                      AND (n.schema_name IS NULL OR LOWER(n.schema_name) = LOWER(SCHEMA_NAME(v.schema_id) COLLATE DATABASE_DEFAULT))
+                )
+                UNION ALL
+                SELECT r.view_id, d.referenced_id, r.depth + 1
+                FROM refs r
+                JOIN sys.views nested ON nested.object_id = r.referenced_id
+                JOIN sys.sql_expression_dependencies d ON d.referencing_id = nested.object_id AND d.referenced_minor_id = 0
+                WHERE r.depth < 32
+            )
+            SELECT SCHEMA_NAME(v.schema_id) + '.' + v.name, SUM(ps.row_count)
+            FROM (SELECT DISTINCT view_id, referenced_id FROM refs) r
+            JOIN sys.views v ON v.object_id = r.view_id
+            JOIN sys.tables t ON t.object_id = r.referenced_id
+            JOIN sys.dm_db_partition_stats ps ON ps.object_id = t.object_id AND ps.index_id IN (0, 1)
+            GROUP BY v.schema_id, v.name
+        """)
+        index = build_name_index(views)
+        counts = {}
+        for name, row_count in cursor:
+            for view in match_name(index, name):
+                counts.setdefault(view, row_count)
     except Exception as e:
-        return f"Error: {str(e)}"
+        return {view: f"Error: {str(e)}" for view in views}
+    finally:
+        conn.close()
+    return {view: counts.get(view) for view in views}
 
-def get_view_row_count_async(conn_str, view_name):
+def get_view_row_counts_async(conn_str, views, mode="exact", batch_size=DEFAULT_COUNT_BATCH_SIZE, timeout=DEFAULT_COUNT_TIMEOUT):
     loop = asyncio.get_running_loop()
-    return loop.run_in_executor(None, get_view_row_count, conn_str, view_name)
+    if mode == "estimate":
+        return loop.run_in_executor(None, estimate_view_row_counts, conn_str, views, timeout)
+    return loop.run_in_executor(None, get_view_row_counts, conn_str, views, batch_size, timeout)
+
+# Whether two row counts agree within a relative tolerance (0 = exact)
+def row_counts_match(target_count, test_count, tolerance=0.0):
+    if not tolerance:
+        return target_count == test_count
+    return abs(target_count - test_count) <= tolerance * max(abs(target_count), abs(test_count))
+
+# Line diff between two cleaned definitions (engine and limits from DiffSettings)
+def diff_definitions(base_def, target_def, diff_settings=None):
+    return diff_lines(clean_definition_lines(base_def), clean_definition_lines(target_def), diff_settings)
 
 # Compare view definitions between base and target
-def compare_view_definitions(base_def, target_def, show_content=False):
+# With a VariantRegistry, each distinct target version is diffed once and listed in the Variants report
+def compare_view_definitions(base_def, target_def, show_content=False, variants=None, view_key=None, location=None, diff_settings=None):
     if base_def is None and target_def is None:
         return ["Missing in both databases"]
     elif base_def is None:
         return ["Missing in standard"]
     elif target_def is None:
         return ["Missing in target database"]
-    else:
-        base_lines = clean_definition_lines(base_def)
-        target_lines = clean_definition_lines(target_def)
-        if base_lines != target_lines:
-            if show_content:
-                diff = difflib.ndiff(base_lines, target_lines)
-                diff_lines = [line for line in diff if line.startswith("- ") or line.startswith("+ ")]
-                return ["Definition is different!", *diff_lines]
-            else:
-                return ["Definition is different!"]
+    elif not definitions_equal(base_def, target_def):
+        make_diff = lambda: diff_definitions(base_def, target_def, diff_settings) if show_content else []
+        if variants is not None:
+            entry = variants.register(view_key, target_def, location, make_diff)
+            return ["Definition is different!", f"Variant {entry['id']} (see {VARIANTS_SECTION} report)"]
+        return ["Definition is different!", *make_diff()]
     return []
 
-# Compare definitions across all target databases
-async def compare_view_definitions_across_targets(base_db, target_dbs, views_to_compare, show_content):
-    base_conn_str = f"DRIVER={{SQL Server}};SERVER={base_db['server']};DATABASE={base_db['database']};UID={base_db['username']};PWD={base_db['password']}"
-    base_defs = await get_view_definitions_async(base_conn_str)
-
-    all_differences = defaultdict(lambda: defaultdict(dict))
-    for target_db in target_dbs:
-        target_conn_str = f"DRIVER={{SQL Server}};SERVER={target_db['server']};DATABASE={target_db['database']};UID={target_db['username']};PWD={target_db['password']}"
-        target_defs = await get_view_definitions_async(target_conn_str)
-
-        for view in views_to_compare:
-            diffs = compare_view_definitions(base_defs.get(view), target_defs.get(view), show_content)
-            if diffs:
-                all_differences[target_db["server"]][target_db["database"]][f"[{view}]"] = diffs
-    return all_differences
-
-# Compare row counts between target and test environments
-async def compare_view_row_counts(target_dbs, views_to_compare, to_test_server):
-    differences = defaultdict(lambda: defaultdict(dict))
-
-    for target_db in target_dbs:
-        test_db = target_db.copy()
-        test_db["server"] = to_test_server(target_db["server"])
-
-        target_conn_str = f"DRIVER={{SQL Server}};SERVER={target_db['server']};DATABASE={target_db['database']};UID={target_db['username']};PWD={target_db['password']}"
-        test_conn_str = f"DRIVER={{SQL Server}};SERVER={test_db['server']};DATABASE={test_db['database']};UID={test_db['username']};PWD={test_db['password']}"
-
-        row_tasks = []
-        for view in views_to_compare:
-            row_tasks.append(get_view_row_count_async(target_conn_str, view))
-            row_tasks.append(get_view_row_count_async(test_conn_str, view))
-
-        row_results = await asyncio.gather(*row_tasks)
-
-        for i, view in enumerate(views_to_compare):
-            target_count = row_results[i * 2]
-            test_count = row_results[i * 2 + 1]
-            diffs = []
-            if isinstance(target_count, int) and isinstance(test_count, int):
-                if target_count != test_count:
-                    diffs.append(f"Row count mismatch: Target={target_count}, Test={test_count}")
-            else:
-                diffs.append(f"Query error: Target={target_count}, Test={test_count}")
-            if diffs:
-                differences[target_db["server"]][target_db["database"]][f"[{view}]"] = diffs
+# Compare target rows as they are read (case-insensitive, schema-aware name matching)
+def compare_view_rows(base_defs, target_rows, views_to_compare, target_db, show_content=False, variants=None, diff_settings=None):
+    location = f"{target_db['server']}/{target_db['database']}"
+    compared = {}
+    for view, base_match, target_match in pair_listed_rows(views_to_compare, base_defs, target_rows):
+        compared[view] = compare_view_definitions(
+            base_match and base_match[1], target_match and target_match[1], show_content, variants, f"[{view}]", location, diff_settings
+        )
 
+    differences = {}
+    for view in dict.fromkeys(views_to_compare):
+        if compared[view]:
+            differences[f"[{view}]"] = compared[view]
     return differences
 
+# Pipeline job for one target database: fetch its view definitions, then compare them against the shared base definitions
+# Without cache/snapshot options the fetch connects, runs the query and reads the first fetchmany batch in the
+# executor; the comparer reads the remaining batches as it compares
+def view_definition_job(base_defs, target_db, views_to_compare, show_content, args=None, variants=None):
+    async def fetch():
+        if is_streaming(args):
+            conn_str = build_conn_str(target_db)
+            batch_size = getattr(args, "fetch_batch_size", None) or DEFAULT_BATCH_SIZE
+            return await open_module_stream_async(conn_str, "view", views_to_compare, batch_size)
+        return (await fetch_view_definitions(target_db, args)).items()
+
+    def compare(target_rows):
+        diffs = compare_view_rows(base_defs, target_rows, views_to_compare, target_db, show_content, variants, diff_settings)
+        return {target_db["database"]: diffs} if diffs else {}
+
+    diff_settings = DiffSettings.from_args(args)
+    return CompareJob(db=target_db, kind="view", fetch=fetch, compare=compare)
+
+# Row count settings from the CLI options: (mode, tolerance, batch_size, timeout)
+def row_count_settings(args=None):
+    mode = getattr(args, "row_count_mode", None) or "exact"
+    tolerance = getattr(args, "row_count_tolerance", None)
+    if tolerance is None:
+        tolerance = DEFAULT_ESTIMATE_TOLERANCE if mode == "estimate" else 0.0
+    batch_size = getattr(args, "row_count_batch_size", None) or DEFAULT_COUNT_BATCH_SIZE
+    timeout = getattr(args, "row_count_timeout", None)
+    timeout = DEFAULT_COUNT_TIMEOUT if timeout is None else timeout
+    return mode, tolerance, batch_size, timeout
+
+# Compare the row counts of one target database with its test-server counterpart
+def compare_row_counts(target_counts, test_counts, views_to_compare, mode="exact", tolerance=0.0):
+    label = " (estimated)" if mode == "estimate" else ""
+    differences = {}
+    for view in views_to_compare:
+        target_count = target_counts[view]
+        test_count = test_counts[view]
+        if target_count is None or test_count is None:
+            # Not estimable (no table statistics behind the view): nothing to compare
+            continue
+        diffs = []
+        if isinstance(target_count, int) and isinstance(test_count, int):
+            if not row_counts_match(target_count, test_count, tolerance):
+                diffs.append(f"Row count mismatch{label}: Target={target_count}, Test={test_count}")
+        else:
+            diffs.append(f"Query error: Target={target_count}, Test={test_count}")
+        if diffs:
+            differences[f"[{view}]"] = diffs
+    return differences
+
+# Pipeline job for the row counts of one target database and its test server
+# Both databases are counted concurrently, each over its own connection
+def view_row_count_job(target_db, views_to_compare, to_test_server, args=None):
+    mode, tolerance, batch_size, timeout = row_count_settings(args)
+    test_db = target_db.copy()
+    test_db["server"] = to_test_server(target_db["server"])
+
+    target_conn_str = build_conn_str(target_db)
+    test_conn_str = build_conn_str(test_db)
+
+    async def fetch():
+        return await asyncio.gather(
+            get_view_row_counts_async(target_conn_str, views_to_compare, mode, batch_size, timeout),
+            get_view_row_counts_async(test_conn_str, views_to_compare, mode, batch_size, timeout),
+        )
+
+    def compare(counts):
+        diffs = compare_row_counts(*counts, views_to_compare, mode, tolerance)
+        return {target_db["database"]: diffs} if diffs else {}
+
+    return CompareJob(db=target_db, kind="rowcount", fetch=fetch, compare=compare)
+
 # Generate test server name (e.g., DB123 → DBTST123)
 def to_test_server(server_name):
     import re
@@ -128,40 +271,57 @@ def to_test_server(server_name):
 # Async main workflow
 async def main_async(args):
     print(f"Start Time: {datetime.now():%Y-%m-%d %H:%M:%S}")
+    configure_normalization_cache(args)
 
-    base_db, target_dbs = read_db_info(DEFAULT_ACCOUNT_PATH)
-    views_to_compare = read_list_from_excel(DEFAULT_VIEW_LIST, column_name="View Name")
-
-    def_task = compare_view_definitions_across_targets(base_db, target_dbs, views_to_compare, args.show_content)
-    count_task = compare_view_row_counts(target_dbs, views_to_compare, to_test_server)
-    all_definitions, all_counts = await asyncio.gather(def_task, count_task)
-
-    all_differences = defaultdict(lambda: defaultdict(dict))
-    for server, dbs in all_definitions.items():
-        for db, content in dbs.items():
-            all_differences[server][db].update(content)
-
-    for server, dbs in all_counts.items():
-        for db, content in dbs.items():
-            for view_key, diff_list in content.items():
-                if view_key in all_differences[server][db]:
-                    all_differences[server][db][view_key].extend(diff_list)
-                else:
-                    all_differences[server][db][view_key] = diff_list
+    try:
+        base_db, target_dbs = read_db_info(DEFAULT_ACCOUNT_PATH)
+        views_to_compare = read_list_from_excel(DEFAULT_VIEW_LIST, column_name="View Name")
 
-    if args.output:
-        save_results(all_differences, args.format, args.output)
-    else:
-        save_results(all_differences, "console", None)
+        base_defs = await fetch_view_definitions(base_db, args, views_to_compare)
+        variants = VariantRegistry([f"{db['server']}/{db['database']}" for db in target_dbs])
+        jobs = [
+            view_definition_job(base_defs, target_db, views_to_compare, args.show_content, args, variants)
+            for target_db in target_dbs
+        ]
+        if getattr(args, "from_snapshot", None):
+            # Row counts need live data, so snapshot runs compare definitions only
+            print("[INFO] --from-snapshot: skipping view row count comparison")
+        else:
+            jobs += [view_row_count_job(target_db, views_to_compare, to_test_server, args) for target_db in target_dbs]
 
+        # Definitions and row counts of each target go through the compare pipeline and are written as
+        # soon as they are compared; findings for the same view are merged in arrival order
+        with open_result_writer(args) as writer:
+            stats = await run_compare_pipeline(jobs, writer, args)
+            writer.add_variants(variants.report())
+        print(stats.report())
+    finally:
+        # Report and save the cache even when a fetch or the writer fails
+        close_normalization_cache()
     print(f"End Time: {datetime.now():%Y-%m-%d %H:%M:%S}")
 
 # CLI entry point
 def main(args=None):
     parser = argparse.ArgumentParser(description="Compare SQL Server View definitions and row counts")
     parser.add_argument("--output", required=False, help="Output filename (optional)")
-    parser.add_argument("--format", choices=["json", "csv"], default="json", help="Output format")
+    parser.add_argument("--format", choices=["json", "csv", "ndjson", "parquet"], default="json", help="Output format (ndjson streams findings as each target finishes; parquet requires pyarrow)")
     parser.add_argument("--show-content", action="store_true", help="Show detailed diff content")
+    parser.add_argument("--save-snapshot", metavar="DIR", help="Save fetched definitions to snapshots in DIR")
+    parser.add_argument("--from-snapshot", metavar="DIR", help="Compare from snapshots in DIR instead of connecting")
+    parser.add_argument("--catalog-cache", metavar="DIR", help="Keep a local definition cache in DIR and only download objects changed since the last run")
+    parser.add_argument("--diff-engine", choices=["myers", "ndiff"], default="myers", help="Diff engine for --show-content")
+    parser.add_argument("--diff-context", type=int, default=3, help="Context lines around each diff hunk (myers engine)")
+    parser.add_argument("--diff-max-lines", type=int, default=2000, help="Summarize instead of listing diffs longer than this (0 = no limit)")
+    parser.add_argument("--diff-timeout", type=float, default=2.0, help="Per-object diff time limit in seconds (0 = no limit)")
+    parser.add_argument("--fetch-batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per fetchmany when streaming definitions")
+    parser.add_argument("--row-count-mode", choices=ROW_COUNT_MODES, default="exact", help="exact: batched COUNT_BIG(*); estimate: sys.dm_db_partition_stats of referenced tables")
+    parser.add_argument("--row-count-tolerance", type=float, help="Relative row count difference to tolerate (default 0 exact, 0.05 estimate)")
+    parser.add_argument("--row-count-batch-size", type=int, default=DEFAULT_COUNT_BATCH_SIZE, help="Views counted per query batch")
+    parser.add_argument("--row-count-timeout", type=int, default=DEFAULT_COUNT_TIMEOUT, help="Per-query timeout in seconds (0 = none)")
+    parser.add_argument("--compare-workers", type=int, default=DEFAULT_COMPARE_WORKERS, help="Targets compared concurrently as their definitions / row counts arrive")
+    parser.add_argument("--pipeline-queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="Fetched targets allowed to wait for a comparer")
+    parser.add_argument("--norm-cache-size", type=float, default=64, help="Normalization cache memory bound in MB (0 = unbounded)")
+    parser.add_argument("--norm-cache-file", metavar="PATH", help="Persist the normalization cache to PATH between runs")
     if args is None:
         args = parser.parse_args()
     asyncio.run(main_async(args))
@@ -2,6 +2,7 @@ import argparse
 from checker.sp_checker import main as sp_main
 from checker.view_checker import main as view_main
 from checker.schema_checker import main as schema_main
+from checker.data_drift import check_drift_args, main as drift_main
 from sync import object_sync
 
 # Entry point of the CLI tool for comparison and sync operations
@@ -15,26 +16,66 @@ def main():
     parser.add_argument(
         "--mode",
         required=True,
-        choices=["sp", "view", "schema", "sync_sp", "sync_view"],
+        choices=["sp", "view", "schema", "drift", "sync_sp", "sync_view"],
         help="Choose the task to perform:\n"
              "  - sp: Compare stored procedures\n"
              "  - view: Compare views\n"
              "  - schema: Compare table schemas\n"
+             "  - drift: Find data drift between targets and their test servers by chunked checksums\n"
              "  - sync_sp: Sync only stored procedures (auto-configured)\n"
              "  - sync_view: Sync only views (auto-configured)"
     )
 
     # Output options
     parser.add_argument("--output", help="Optional output filename")
-    parser.add_argument("--format", choices=["json", "csv"], default="json", help="Format of the output report")
+    parser.add_argument("--format", choices=["json", "csv", "ndjson", "parquet"], default="json", help="Format of the output report (ndjson streams one finding per line as each target finishes; parquet writes one typed row per finding, requires pyarrow)")
 
     # Comparison-specific option
     parser.add_argument("--show-content", action="store_true", help="Show detailed content differences if applicable")
+    parser.add_argument("--diff-engine", choices=["myers", "ndiff"], default="myers", help="Diff engine for --show-content (default: myers)")
+    parser.add_argument("--diff-context", type=int, default=3, help="Context lines around each diff hunk (myers engine)")
+    parser.add_argument("--diff-max-lines", type=int, default=2000, help="Summarize instead of listing diffs longer than this (0 = no limit)")
+    parser.add_argument("--diff-timeout", type=float, default=2.0, help="Per-object diff time limit in seconds (0 = no limit)")
+    parser.add_argument("--all-tables", action="store_true", help="Schema mode: compare every table in the database instead of TableList.xlsx")
+    parser.add_argument("--fingerprint", action="store_true", help="Schema mode: compare per-table fingerprints first, fetch details only for drifted tables")
+
+    # Data drift options
+    parser.add_argument("--drift-source", choices=["view", "table"], default="view", help="Drift mode: compare views (ViewList.xlsx, requires --drift-key) or tables (TableList.xlsx)")
+    parser.add_argument("--drift-key", help="Drift mode: integer key column used for chunking (required for views; tables default to their single-column integer primary key)")
+    parser.add_argument("--drift-chunks", type=int, default=16, help="Drift mode: buckets per key range at each level")
+    parser.add_argument("--drift-min-chunk", type=int, default=1000, help="Drift mode: stop splitting ranges at this many keys")
+    parser.add_argument("--drift-parallelism", type=int, default=4, help="Drift mode: concurrent chunk queries per database pair")
+
+    # Snapshot options (sp / view / schema)
+    parser.add_argument("--save-snapshot", metavar="DIR", help="Save fetched schema/definitions of every database to DIR")
+    parser.add_argument("--from-snapshot", metavar="DIR", help="Run the comparison from snapshots in DIR without connecting")
+    parser.add_argument("--row-count-mode", choices=["exact", "estimate"], default="exact", help="View mode: exact batched COUNT_BIG(*) or estimate from sys.dm_db_partition_stats")
+    parser.add_argument("--row-count-tolerance", type=float, help="View mode: relative row count difference to tolerate (default 0 exact, 0.05 estimate)")
+    parser.add_argument("--row-count-batch-size", type=int, default=20, help="View mode: views counted per query batch")
+    parser.add_argument("--row-count-timeout", type=int, default=300, help="View mode: per-query row count timeout in seconds (0 = none)")
+    parser.add_argument("--fetch-batch-size", type=int, default=500, help="sp / view mode: rows per fetchmany when streaming definitions")
+    parser.add_argument("--compare-workers", type=int, default=8, help="sp / view / schema mode: targets compared concurrently as their catalogs arrive")
+    parser.add_argument("--pipeline-queue-size", type=int, default=8, help="sp / view / schema mode: fetched catalogs allowed to wait for a comparer")
+    parser.add_argument("--norm-cache-size", type=float, default=64, help="sp / view / schema mode: normalization cache memory bound in MB (0 = unbounded)")
+    parser.add_argument("--norm-cache-file", metavar="PATH", help="Persist the normalization cache to PATH between runs")
+    parser.add_argument("--catalog-cache", metavar="DIR", help="sp / view mode: local definition cache refreshed by sys.objects.modify_date")
 
     # Sync option
     parser.add_argument("--allow-create-new", action="store_true", help="Create objects in target DBs if missing")
+    parser.add_argument("--plan", metavar="DIR", help="Sync mode: dry run; write a deployment script and JSON plan per target to DIR without executing DDL (with --from-snapshot, plan from snapshots)")
+    parser.add_argument("--apply-plan", metavar="DIR", help="Sync mode: execute the plans previously written to DIR by --plan")
+    parser.add_argument("--force-deploy", action="store_true", help="Sync mode: redeploy objects even when the target definition already matches")
+    parser.add_argument("--transaction", choices=["per-object", "per-batch", "all"], default="per-object", help="Sync mode: commit after each object, each --deploy-batch-size objects, or once per target (all-or-nothing)")
+    parser.add_argument("--deploy-batch-size", type=int, default=50, help="Sync mode: objects per transaction with --transaction per-batch")
+    parser.add_argument("--sync-workers", type=int, default=8, help="Sync mode: target databases deployed concurrently in total")
+    parser.add_argument("--sync-per-server", type=int, default=2, help="Sync mode: target databases deployed concurrently per server")
 
     args = parser.parse_args()
+    if args.mode == "drift":
+        try:
+            check_drift_args(args)
+        except ValueError as e:
+            parser.error(str(e))
 
     # Sync mode routing
     if args.mode == "sync_sp":
@@ -51,6 +92,8 @@ def main():
         view_main(args)
     elif args.mode == "schema":
         schema_main(args)
+    elif args.mode == "drift":
+        drift_main(args)
 
 
 if __name__ == "__main__":
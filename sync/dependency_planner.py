@@ -0,0 +1,123 @@
+"""
+dependency_planner.py
+
+Orders sync objects by their dependencies in the base catalog (sys.sql_expression_dependencies).
+Objects are topologically sorted into waves: every object depends only on objects in earlier
+waves, so each wave can be deployed at full parallelism. Cycles and references that do not
+resolve in the base database are reported before anything is deployed.
+"""
+
+from collections import defaultdict
+
+import pyodbc
+
+from checker.module_definitions import TYPE_CODES, build_name_index, load_name_filter, match_name
+
+# Direct object references of the listed procedures / views (temp tables, cross-database and
+# caller-dependent references cannot be checked here and are left out)
+DEPENDENCIES_SQL = """
+    SELECT SCHEMA_NAME(o.schema_id) + '.' + o.name, RTRIM(o.type),
+           COALESCE(SCHEMA_NAME(ro.schema_id), d.referenced_schema_name, SCHEMA_NAME(o.schema_id)) + '.' + d.referenced_entity_name,
+           d.referenced_id
+    FROM sys.sql_expression_dependencies d
+    JOIN sys.objects o ON o.object_id = d.referencing_id
+    LEFT JOIN sys.objects ro ON ro.object_id = d.referenced_id
+    WHERE o.type IN ('P', 'V')
+      AND d.referencing_minor_id = 0
+      AND d.referenced_class = 1
+      AND d.referenced_database_name IS NULL
+      AND d.referenced_server_name IS NULL
+      AND d.is_caller_dependent = 0
+      AND d.referenced_entity_name NOT LIKE '#%'
+      AND EXISTS (
+          SELECT 1 FROM #names n
+          WHERE LOWER(n.object_name) = LOWER(o.name COLLATE DATABASE_DEFAULT)
+            AND (n.schema_name IS NULL OR LOWER(n.schema_name) = LOWER(SCHEMA_NAME(o.schema_id) COLLATE DATABASE_DEFAULT))
+      )
+"""
+
+def fetch_dependencies(conn_str, objects):
+    """
+    Read the dependencies of the listed objects from the base database.
+
+    Args:
+        conn_str (str): base connection string
+        objects (list[tuple]): (object_name, 'sp' or 'view')
+
+    Returns:
+        tuple: (edges {object: set(objects it depends on)}, missing {object: [unresolved names]})
+    """
+    objects = list(dict.fromkeys(objects))
+    if not objects:
+        return {}, {}
+    index = build_name_index(name for name, _ in objects)
+    types_by_name = defaultdict(set)
+    for name, object_type in objects:
+        types_by_name[name].add(object_type)
+    types_by_code = {code: object_type for object_type, code in TYPE_CODES.items()}
+
+    edges = defaultdict(set)
+    missing = defaultdict(list)
+    with pyodbc.connect(conn_str) as conn:
+        cursor = conn.cursor()
+        load_name_filter(cursor, [name for name, _ in objects])
+        cursor.execute(DEPENDENCIES_SQL)
+        for referencing_name, type_code, referenced_name, referenced_id in cursor.fetchall():
+            object_type = types_by_code.get(type_code)
+            sources = [(name, object_type) for name in match_name(index, referencing_name) if object_type in types_by_name[name]]
+            if referenced_id is None:
+                for source in sources:
+                    missing[source].append(referenced_name)
+                continue
+            targets = [(name, t) for name in match_name(index, referenced_name) for t in types_by_name[name]]
+            for source in sources:
+                edges[source].update(target for target in targets if target != source)
+    return dict(edges), dict(missing)
+
+def plan_waves(objects, edges):
+    """
+    Topologically sort objects into waves (Kahn's algorithm, one level per wave).
+    List order is kept inside each wave. Objects on a dependency cycle cannot be ordered;
+    they are returned separately and should be deployed after every wave.
+
+    Returns:
+        tuple: (waves [[object, ...], ...], cyclic [object, ...])
+    """
+    objects = list(dict.fromkeys(objects))
+    listed = set(objects)
+    remaining = {obj: {dep for dep in edges.get(obj, ()) if dep in listed} for obj in objects}
+    waves = []
+    while True:
+        wave = [obj for obj in objects if obj in remaining and not remaining[obj]]
+        if not wave:
+            break
+        waves.append(wave)
+        for obj in wave:
+            del remaining[obj]
+        done = set(wave)
+        for deps in remaining.values():
+            deps -= done
+    cyclic = [obj for obj in objects if obj in remaining]
+    return waves, cyclic
+
+def plan_deployment(conn_str, objects):
+    """
+    Build the deployment order for the listed objects and the warnings to report up front.
+
+    Returns:
+        tuple: (ordered objects, waves, warnings {object: [message, ...]})
+    """
+    edges, missing = fetch_dependencies(conn_str, objects)
+    waves, cyclic = plan_waves(objects, edges)
+
+    warnings = defaultdict(list)
+    for obj, names in missing.items():
+        warnings[obj].append(f"Warning: missing dependency in base: {', '.join(sorted(set(names)))}")
+    for obj in cyclic:
+        on_cycle = sorted(dep[0] for dep in edges.get(obj, ()) if dep in cyclic)
+        warnings[obj].append(f"Warning: dependency cycle with {', '.join(on_cycle)}; deployed after all waves")
+
+    if cyclic:
+        waves = waves + [cyclic]
+    ordered = [obj for wave in waves for obj in wave]
+    return ordered, waves, dict(warnings)
@@ -0,0 +1,75 @@
+"""
+deploy_executor.py
+
+Thread-pool executor for deploying objects to many target databases.
+Each target database is a lane whose jobs run in order on one worker thread, so per-target
+ordering is preserved; lanes run concurrently, limited globally (max_workers) and per target
+server (per_server). Results are handed back to the caller as soon as each job finishes.
+"""
+
+import inspect
+import queue
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_PER_SERVER = 2
+
+class DeployExecutor:
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, per_server=DEFAULT_PER_SERVER):
+        self.max_workers = max(1, max_workers)
+        self.per_server = max(1, per_server)
+
+    def run(self, lanes, on_result):
+        """
+        Run every lane and stream job results to on_result in the calling thread.
+
+        Args:
+            lanes (list[tuple]): (server, lane_key, jobs); jobs are callables run in list order;
+                a job that returns a generator has each yielded item reported as a separate result
+            on_result: called as on_result(lane_key, result) in completion order; a job that
+                raises is reported with the exception as its result
+        """
+        events = queue.Queue()
+        pending = defaultdict(deque)
+        active = defaultdict(int)
+
+        def run_lane(server, lane_key, jobs):
+            try:
+                for job in jobs:
+                    try:
+                        result = job()
+                        if inspect.isgenerator(result):
+                            for item in result:
+                                events.put(("result", lane_key, item))
+                            continue
+                    except Exception as e:
+                        result = e
+                    events.put(("result", lane_key, result))
+            finally:
+                events.put(("done", server, None))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            def submit(server):
+                lane_key, jobs = pending[server].popleft()
+                active[server] += 1
+                pool.submit(run_lane, server, lane_key, jobs)
+
+            for server, lane_key, jobs in lanes:
+                pending[server.lower()].append((lane_key, jobs))
+            # Servers take turns so one large server cannot fill the global pool first
+            while any(pending[server] and active[server] < self.per_server for server in pending):
+                for server in list(pending):
+                    if pending[server] and active[server] < self.per_server:
+                        submit(server)
+
+            remaining = len(lanes)
+            while remaining:
+                kind, key, result = events.get()
+                if kind == "done":
+                    remaining -= 1
+                    active[key] -= 1
+                    if pending[key]:
+                        submit(key)
+                else:
+                    on_result(key, result)
@@ -0,0 +1,152 @@
+"""
+deploy_plan.py
+
+Offline deployment plans for the sync modes (dry run).
+For every target a plan is built by comparing the normalized digests of the base and target
+definitions, without executing any DDL, and written as:
+  - <server>__<database>.plan.json: the actions (create / alter / skip / error) with the exact SQL
+  - <server>__<database>.sql: the same deployment as a script (CREATE / ALTER ... GO)
+--apply-plan executes the saved plans as-is; an object whose target definition changed since the
+plan was generated is not deployed.
+"""
+
+import json
+import os
+import re
+from datetime import datetime
+
+from checker.module_definitions import TYPE_CODES, build_name_index, match_name
+from sync.deploy_session import to_deploy_statement
+from utils.snapshot import load_snapshot
+from utils.sql_cleaner import definition_digest
+
+PLAN_VERSION = 1
+DEPLOY_ACTIONS = ("create", "alter")
+
+def plan_path(plan_dir, db, suffix):
+    name = re.sub(r"[^\w.-]", "_", f"{db['server']}__{db['database']}")
+    return os.path.join(plan_dir, f"{name}{suffix}")
+
+# Definitions of the listed objects from a snapshot, keyed like export_definitions: {(name, type): definition}
+def snapshot_definitions(snapshot_dir, db, objects):
+    definitions = {}
+    for object_type in dict.fromkeys(object_type for _, object_type in objects):
+        names = [name for name, t in objects if t == object_type]
+        index = build_name_index(names)
+        for snapshot_name, definition in load_snapshot(snapshot_dir, db, object_type).items():
+            for name in match_name(index, snapshot_name):
+                if definition:
+                    definitions.setdefault((name, object_type), definition)
+    return definitions
+
+# Listed objects present in a snapshot, keyed like find_existing_objects (encrypted modules are saved with a None definition)
+def snapshot_existing_objects(snapshot_dir, db, objects):
+    existing = set()
+    for object_type in dict.fromkeys(object_type for _, object_type in objects):
+        index = build_name_index(name for name, t in objects if t == object_type)
+        for snapshot_name in load_snapshot(snapshot_dir, db, object_type):
+            existing.update((name, object_type) for name in match_name(index, snapshot_name))
+    return existing
+
+def build_target_plan(base_db, target_db, ordered, base_defs, target_defs, warnings=None, allow_create_new=False, force=False, existing=None):
+    """
+    Decide what sync would do on one target.
+
+    Args:
+        ordered (list[tuple]): (object_name, object_type) in deployment order
+        base_defs (dict): {(name, type): definition or Exception}
+        target_defs (dict): {(name, type): definition}; missing objects are absent
+        warnings (dict): {(name, type): [message]} reported by the dependency planner
+        allow_create_new (bool): plan creation of objects missing in the target
+        force (bool): plan objects even when the target already matches
+        existing (set | None): (name, type) present in the target, including encrypted modules that have
+            no definition in target_defs; None treats the objects in target_defs as the existing ones
+
+    Returns:
+        dict: the plan (see module docstring)
+    """
+    warnings = warnings or {}
+    existing = set(target_defs) if existing is None else existing
+    actions = []
+    for name, object_type in ordered:
+        base_def = base_defs.get((name, object_type))
+        target_def = target_defs.get((name, object_type))
+        exists = (name, object_type) in existing
+        action = {
+            "object": name,
+            "type": object_type,
+            "target_digest": definition_digest(target_def) if target_def is not None else None,
+            "warnings": warnings.get((name, object_type), []),
+        }
+        if isinstance(base_def, Exception) or not base_def:
+            action.update(action="error", reason=str(base_def) if base_def else "Definition is empty or not found.")
+        elif not exists and not allow_create_new:
+            action.update(action="error", reason=f"{object_type.title()} '{name}' does not exist and --allow-create-new not set.")
+        elif target_def is not None and not force and definition_digest(base_def) == action["target_digest"]:
+            action.update(action="skip", reason="unchanged")
+        else:
+            action.update(action="alter" if exists else "create", sql=to_deploy_statement(base_def, exists))
+        actions.append(action)
+
+    return {
+        "version": PLAN_VERSION,
+        "created_at": f"{datetime.now():%Y-%m-%d %H:%M:%S}",
+        "base": {"server": base_db["server"], "database": base_db["database"]},
+        "target": {"server": target_db["server"], "database": target_db["database"]},
+        "actions": actions,
+    }
+
+def plan_script(plan):
+    """
+    Render a plan as a deployment script (one CREATE / ALTER batch per deployed object)
+    """
+    target = plan["target"]
+    lines = [
+        f"-- Deployment plan for {target['server']}/{target['database']} (generated {plan['created_at']})",
+        f"-- Base: {plan['base']['server']}/{plan['base']['database']}",
+        "",
+    ]
+    for action in plan["actions"]:
+        if action["action"] in DEPLOY_ACTIONS:
+            lines += [f"-- {action['action']} {action['type']} {action['object']}", action["sql"].rstrip(), "GO", ""]
+        else:
+            lines.append(f"-- {action['action']} {action['type']} {action['object']}: {action['reason']}")
+    return "\n".join(lines) + "\n"
+
+def write_plan(plan_dir, plan):
+    """
+    Write the JSON plan and its script; returns the JSON path
+    """
+    os.makedirs(plan_dir, exist_ok=True)
+    json_path = plan_path(plan_dir, plan["target"], ".plan.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(plan, f, indent=2, ensure_ascii=False)
+    with open(plan_path(plan_dir, plan["target"], ".sql"), "w", encoding="utf-8") as f:
+        f.write(plan_script(plan))
+    return json_path
+
+def load_plans(plan_dir):
+    plans = []
+    for file_name in sorted(os.listdir(plan_dir)):
+        if not file_name.endswith(".plan.json"):
+            continue
+        path = os.path.join(plan_dir, file_name)
+        with open(path, encoding="utf-8") as f:
+            plan = json.load(f)
+        if plan.get("version") != PLAN_VERSION:
+            raise ValueError(f"Unsupported plan version {plan.get('version')} in {path}")
+        plans.append(plan)
+    return plans
+
+def plan_items(plan):
+    """
+    Deployable items of a plan for DeploySession.deploy, and the target digests recorded at planning time
+    """
+    items = []
+    expected = {}
+    for action in plan["actions"]:
+        if action["action"] in DEPLOY_ACTIONS and action["type"] in TYPE_CODES:
+            key = (action["object"], action["type"])
+            items.append((action["object"], action["type"], action["sql"]))
+            expected[key] = action["target_digest"]
+    return items, expected
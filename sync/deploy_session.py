@@ -0,0 +1,134 @@
+"""
+deploy_session.py
+
+Per-target deploy session: one connection for all objects deployed to a target database.
+Existing objects are looked up once per session; each definition is then sent as ALTER when the
+object exists and CREATE when it does not, so each object is a single round trip with no DROP and
+no window where the object is missing. ALTER (unlike CREATE OR ALTER) is stored in sys.sql_modules
+with the CREATE header of the original text, so a deployed target still matches the base digest.
+
+With skip_unchanged, the target definitions are exported in bulk first and objects whose
+normalized digest (same cleaning as clean_definition_lines) matches the base are not deployed,
+so unchanged objects keep their cached plans.
+
+Transaction grouping:
+  - per-object: commit after every object; a failure affects only that object
+  - per-batch:  commit every batch_size objects; a failure rolls back its whole batch
+  - all:        one transaction; the first failure rolls back everything and stops
+"""
+
+import re
+
+import pyodbc
+
+from checker.module_definitions import export_definitions_with_cursor, find_existing_objects
+from utils.sql_cleaner import definition_digest, definitions_equal
+
+TRANSACTION_MODES = ("per-object", "per-batch", "all")
+DEFAULT_BATCH_SIZE = 50
+SKIPPED_UNCHANGED = "Skipped: unchanged"
+PLAN_OUTDATED = "Skipped: target changed since the plan was generated"
+
+# Leading whitespace / comments, then CREATE | ALTER PROC | PROCEDURE | VIEW (CREATE OR ALTER is left alone)
+_MODULE_HEADER = re.compile(
+    r"\A((?:\s+|--[^\n]*(?:\n|\Z)|/\*.*?\*/)*)(?:CREATE|ALTER)(\s+(?:PROC|PROCEDURE|VIEW)\b)",
+    re.IGNORECASE | re.DOTALL,
+)
+
+def to_deploy_statement(definition: str, exists: bool) -> str:
+    """
+    Rewrite the leading CREATE / ALTER of a procedure / view definition to ALTER for an existing
+    object and CREATE for a new one (definitions that start with CREATE OR ALTER, or with neither
+    keyword, are returned unchanged)
+    """
+    return _MODULE_HEADER.sub(r"\1ALTER\2" if exists else r"\1CREATE\2", definition, count=1)
+
+class DeploySession:
+    def __init__(self, conn_str, transaction="per-object", batch_size=DEFAULT_BATCH_SIZE, connect=pyodbc.connect):
+        if transaction not in TRANSACTION_MODES:
+            raise ValueError(f"Unknown transaction mode: {transaction}")
+        self.conn_str = conn_str
+        self.transaction = transaction
+        self.batch_size = max(1, batch_size)
+        self.connect = connect
+        self.conn = None
+
+    def __enter__(self):
+        self.conn = self.connect(self.conn_str, autocommit=False)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is not None:
+                self.conn.rollback()
+        finally:
+            self.conn.close()
+            self.conn = None
+
+    def _groups(self, items):
+        size = {"per-object": 1, "per-batch": self.batch_size, "all": len(items) or 1}[self.transaction]
+        for start in range(0, len(items), size):
+            yield items[start:start + size]
+
+    def deploy(self, items, allow_create_new=False, skip_unchanged=False, expected_digests=None):
+        """
+        Deploy objects in order and yield (object_name, messages) as each transaction group settles.
+
+        Args:
+            items (list[tuple]): (object_name, object_type, definition); a definition that is an
+                Exception is reported as-is and never deployed
+            allow_create_new (bool): create objects that do not exist in the target
+            skip_unchanged (bool): skip objects whose target definition already matches
+            expected_digests (dict | None): {(object_name, object_type): target digest or None} recorded
+                by a deployment plan; objects whose target changed since then are not deployed
+        """
+        deployable = [(name, object_type) for name, object_type, definition in items if not isinstance(definition, Exception)]
+        existing = find_existing_objects(self.conn.cursor(), deployable) if deployable else set()
+        check_targets = skip_unchanged or expected_digests is not None
+        target_defs = export_definitions_with_cursor(self.conn.cursor(), deployable) if check_targets and deployable else {}
+        self.conn.commit()
+        cursor = self.conn.cursor()
+
+        for group in self._groups(items):
+            applied = []
+            failure = None
+            for position, (name, object_type, definition) in enumerate(group):
+                if isinstance(definition, Exception):
+                    yield name, [str(definition)]
+                    continue
+                target_def = target_defs.get((name, object_type))
+                if expected_digests is not None:
+                    current = definition_digest(target_def) if target_def is not None else None
+                    if current != expected_digests.get((name, object_type)):
+                        yield name, [PLAN_OUTDATED]
+                        continue
+                if skip_unchanged and target_def is not None and definitions_equal(definition, target_def):
+                    yield name, [SKIPPED_UNCHANGED]
+                    continue
+                is_new = (name, object_type) not in existing
+                if is_new and not allow_create_new:
+                    yield name, [f"Sync failed: {object_type.title()} '{name}' does not exist and --allow-create-new not set."]
+                    continue
+                try:
+                    cursor.execute(to_deploy_statement(definition, not is_new))
+                    applied.append(name)
+                except Exception as e:
+                    failure = (name, e, position)
+                    break
+
+            if failure is None:
+                if applied:
+                    self.conn.commit()
+                for name in applied:
+                    yield name, ["Sync successful"]
+                continue
+
+            self.conn.rollback()
+            failed_name, error, position = failure
+            for name in applied:
+                yield name, [f"Rolled back: {failed_name} failed in the same transaction"]
+            yield failed_name, [f"Sync failed: {error}"]
+
+            # Objects after the failure in the same transaction are not run
+            for name, _, _ in group[position + 1:]:
+                yield name, [f"Skipped: transaction rolled back after {failed_name} failed"]
@@ -1,7 +1,7 @@
-import pyodbc
 import asyncio
 from collections import defaultdict
 from datetime import datetime
+from functools import partial
 import sys
 from colorama import init, Fore
 
@@ -9,72 +9,121 @@ from colorama import init, Fore
 init(autoreset=True)
 
 from utils.db_reader import read_db_info, read_list_from_excel
-from utils.result_writer import save_results
+from utils.result_writer import open_result_writer
 from utils.config import DEFAULT_ACCOUNT_PATH, DEFAULT_VIEW_LIST, DEFAULT_SP_LIST
-
-# Step 5: Build connection string for pyodbc from a dictionary
-def build_conn_str(info):
-    return f"DRIVER={{SQL Server}};SERVER={info['server']};DATABASE={info['database']};UID={info['username']};PWD={info['password']}"
-
-# Step 6: Retrieve object definition (View or SP) using sp_helptext to preserve formatting
-def get_object_definition_raw(conn, object_name, object_type):
-    cursor = conn.cursor()
-    cursor.execute(f"EXEC sp_helptext '{object_name}'")
-    rows = cursor.fetchall()
-    return ''.join(row[0] for row in rows) if rows else None
-
-# Step 8: Determine whether the object exists in the target DB
-def object_exists(conn, object_name, object_type):
-    cursor = conn.cursor()
-    type_code = {'view': 'V', 'sp': 'P'}[object_type]
-    cursor.execute("SELECT OBJECT_ID(?, ?)", (object_name, type_code))
-    return cursor.fetchone()[0] is not None
-
-# Step 7: Create or replace an object in the target DB
-def apply_object_definition(conn, object_name, definition, object_type, allow_create_new):
-    cursor = conn.cursor()
-    drop_type = {"sp": "PROCEDURE", "view": "VIEW"}[object_type]
-
-    if object_exists(conn, object_name, object_type):
-        print(f"[INFO] Replacing existing {object_type}: {object_name}")
-        cursor.execute(f"DROP {drop_type} {object_name};")
-        cursor.execute(definition)
-        conn.commit()
-    elif allow_create_new:
-        print(f"[INFO] Creating new {object_type}: {object_name}")
-        cursor.execute(definition)
-        conn.commit()
-    else:
-        raise Exception(f"{object_type.title()} '{object_name}' does not exist and --allow-create-new not set.")
-
-# Step 4: Synchronize a single object from base DB to all target DBs
-async def sync_object_to_targets(base_db, target_dbs, object_name, object_type, allow_create_new):
-    result = defaultdict(dict)
+from checker.module_definitions import export_definitions, export_target_state
+from checker.schema_utils import build_conn_str
+from sync.deploy_executor import DeployExecutor, DEFAULT_MAX_WORKERS, DEFAULT_PER_SERVER
+from sync.dependency_planner import plan_deployment
+from sync.deploy_plan import (
+    DEPLOY_ACTIONS, build_target_plan, load_plans, plan_items, snapshot_definitions, snapshot_existing_objects, write_plan
+)
+from sync.deploy_session import DeploySession, SKIPPED_UNCHANGED, DEFAULT_BATCH_SIZE as DEFAULT_DEPLOY_BATCH_SIZE
+
+# Step 4: Export every requested base definition in one streamed sys.sql_modules query, shared by every target
+def fetch_base_definitions(base_db, objects):
+    try:
+        exported = export_definitions(build_conn_str(base_db), objects)
+    except Exception as e:
+        return {obj: ValueError(f"Failed to get definition from base: {e}") for obj in objects}
+    return {
+        obj: exported.get(obj) or ValueError("Failed to get definition from base: Definition is empty or not found.")
+        for obj in objects
+    }
+
+# Step 4.1: Deploy every object to one target DB over a single session (runs on an executor thread)
+def sync_objects_to_target(target, items, args):
+    session = DeploySession(
+        build_conn_str(target),
+        getattr(args, "transaction", None) or "per-object",
+        getattr(args, "deploy_batch_size", None) or DEFAULT_DEPLOY_BATCH_SIZE,
+    )
+    reported = set()
+    try:
+        with session:
+            skip_unchanged = not getattr(args, "force_deploy", False)
+            for object_name, messages in session.deploy(items, args.allow_create_new, skip_unchanged):
+                reported.add(object_name)
+                yield object_name, messages
+    except Exception as e:
+        # Connection-level failure: every object not reported yet fails with it
+        for object_name, _, _ in items:
+            if object_name not in reported:
+                yield object_name, [f"Sync failed: {e}"]
+
+# Step 4.2: Build and write the deployment plan of one target without executing any DDL
+def plan_target(base_db, target, ordered, definitions, warnings, args):
+    objects = list(dict.fromkeys(ordered))
+    snapshot_dir = getattr(args, "from_snapshot", None)
     try:
-        with pyodbc.connect(build_conn_str(base_db)) as base_conn:
-            definition = get_object_definition_raw(base_conn, object_name, object_type)
-            if not definition:
-                raise ValueError("Definition is empty or not found.")
+        if snapshot_dir:
+            target_defs = snapshot_definitions(snapshot_dir, target, objects)
+            existing = snapshot_existing_objects(snapshot_dir, target, objects)
+        else:
+            target_defs, existing = export_target_state(build_conn_str(target), objects)
     except Exception as e:
-        msg = f"Failed to get definition from base: {e}"
-        for target in target_dbs:
-            print(f"{Fore.RED}[ERROR] {target['database']} - {object_name}: {msg}")
-            result[target['database']][f"[{object_name}]"] = [msg]
-        return result
-
-    for target in target_dbs:
-        try:
-            with pyodbc.connect(build_conn_str(target)) as conn:
-                apply_object_definition(conn, object_name, definition, object_type, allow_create_new)
-            result[target['database']][f"[{object_name}]"] = ["Sync successful"]
-        except Exception as e:
-            msg = f"Sync failed: {e}"
-            print(f"{Fore.RED}[ERROR] {target['database']} - {object_name}: {msg}")
-            result[target['database']][f"[{object_name}]"] = [msg]
-
-    return result
-
-# Step 3: Main logic to sync all specified object types in parallel
+        for object_name, _ in objects:
+            yield object_name, [f"Plan failed: {e}"]
+        return
+    plan = build_target_plan(
+        base_db, target, objects, definitions, target_defs, warnings,
+        args.allow_create_new, getattr(args, "force_deploy", False), existing
+    )
+    write_plan(args.plan, plan)
+    for action in plan["actions"]:
+        yield action["object"], [f"Plan: {action['action']}" + (f" ({action['reason']})" if action.get("reason") else "")]
+
+# Step 4.3: Execute a saved plan on one target; objects changed since planning are not deployed
+def apply_plan_to_target(target, plan, args):
+    items, expected = plan_items(plan)
+    for action in plan["actions"]:
+        if action["action"] == "skip":
+            yield action["object"], [SKIPPED_UNCHANGED]
+        elif action["action"] not in DEPLOY_ACTIONS:
+            yield action["object"], [f"Sync failed: {action['reason']}"]
+    if not items:
+        return
+    session = DeploySession(
+        build_conn_str(target),
+        getattr(args, "transaction", None) or "per-object",
+        getattr(args, "deploy_batch_size", None) or DEFAULT_DEPLOY_BATCH_SIZE,
+    )
+    reported = set()
+    try:
+        with session:
+            for object_name, messages in session.deploy(items, allow_create_new=True, expected_digests=expected):
+                reported.add(object_name)
+                yield object_name, messages
+    except Exception as e:
+        for object_name, _, _ in items:
+            if object_name not in reported:
+                yield object_name, [f"Sync failed: {e}"]
+
+# Step 3.2: Base definitions and dependency order (live), or list order from snapshots for --plan
+def prepare_base(base_db, objects, args):
+    snapshot_dir = getattr(args, "from_snapshot", None)
+    if snapshot_dir and getattr(args, "plan", None):
+        print("[INFO] --from-snapshot: planning from snapshots in list order (dependencies need a live base)")
+        exported = snapshot_definitions(snapshot_dir, base_db, objects)
+        definitions = {
+            obj: exported.get(obj) or ValueError("Failed to get definition from base: Definition is empty or not found.")
+            for obj in objects
+        }
+        return definitions, objects, {}
+
+    definitions = fetch_base_definitions(base_db, objects)
+    try:
+        ordered, waves, warnings = plan_deployment(build_conn_str(base_db), objects)
+        print(f"[INFO] Deploy plan: {len(waves)} wave(s) of {', '.join(str(len(wave)) for wave in waves) or '0'} object(s)")
+    except Exception as e:
+        print(f"{Fore.RED}[ERROR] Failed to read dependencies from base, deploying in list order: {e}")
+        ordered, warnings = objects, {}
+    for (object_name, _), messages in warnings.items():
+        for message in messages:
+            print(f"{Fore.YELLOW}[WARN] {object_name}: {message}")
+    return definitions, ordered, warnings
+
+# Step 3: Main logic: every target DB is a lane deployed in dependency order, lanes run concurrently
 async def main_async(args):
     try:
         sys.stdout.reconfigure(encoding='utf-8')
@@ -84,25 +133,73 @@ async def main_async(args):
 
     print(f"Start Time: {datetime.now():%Y-%m-%d %H:%M:%S}")
 
-    # Step 3.1: Read DB connection info
+    # Step 3.1: Read DB connection info and the objects of every selected type
     base_db, target_dbs = read_db_info(args.account)
-    final_result = defaultdict(lambda: defaultdict(dict))
-
-    # Step 3.2: Loop through selected object types
-    for object_type in args.target:
-        object_list = read_list_from_excel(args.input, column_name=f"{object_type.title()} Name")
-        tasks = [sync_object_to_targets(base_db, target_dbs, obj, object_type, args.allow_create_new) for obj in object_list]
-        sync_results = await asyncio.gather(*tasks)
-
-        for result in sync_results:
-            for db, content in result.items():
-                final_result[base_db['server']][db].update(content)
-
-    # Step 3.3: Save or print result
-    if args.output:
-        save_results(final_result, args.format, args.output)
+    warnings = {}
+
+    # Step 3.3: One lane per target; each target applies the waves in order, so targets never wait
+    # on each other. Results are added to the report as they arrive
+    if getattr(args, "apply_plan", None):
+        accounts = {(t["server"].lower(), t["database"].lower()): t for t in target_dbs}
+        lanes = []
+        for plan in load_plans(args.apply_plan):
+            key = (plan["target"]["server"].lower(), plan["target"]["database"].lower())
+            if key not in accounts:
+                print(f"{Fore.RED}[ERROR] No account for planned target {key[0]}/{key[1]}; plan skipped")
+                continue
+            target = accounts[key]
+            lanes.append((target["server"], target, [partial(apply_plan_to_target, target, plan, args)]))
     else:
-        save_results(final_result, "console", None)
+        objects = [
+            (obj, object_type)
+            for object_type in args.target
+            for obj in read_list_from_excel(args.input, column_name=f"{object_type.title()} Name")
+        ]
+        definitions, ordered, warnings = prepare_base(base_db, objects, args)
+        if getattr(args, "plan", None):
+            job = lambda target: partial(plan_target, base_db, target, ordered, definitions, warnings, args)
+        else:
+            items = [(obj, object_type, definitions[(obj, object_type)]) for obj, object_type in ordered]
+            job = lambda target: partial(sync_objects_to_target, target, items, args)
+        lanes = [(target["server"], target, [job(target)]) for target in target_dbs]
+
+    warnings_by_name = defaultdict(list)
+    for (object_name, _), messages in warnings.items():
+        warnings_by_name[object_name] += messages
+    summary = defaultdict(lambda: defaultdict(int))
+
+    def on_result(target, result):
+        database = target["database"]
+        if isinstance(result, Exception):
+            print(f"{Fore.RED}[ERROR] {database}: {result}")
+            return
+        object_name, messages = result
+        if messages == ["Sync successful"]:
+            summary[database]["deployed"] += 1
+        elif messages == [SKIPPED_UNCHANGED]:
+            summary[database]["unchanged"] += 1
+        elif messages[0].startswith("Plan: "):
+            summary[database][messages[0][len("Plan: "):].split(" ")[0]] += 1
+        else:
+            summary[database]["failed"] += 1
+            print(f"{Fore.RED}[ERROR] {database} - {object_name}: {messages[0]}")
+        writer.add(base_db['server'], database, f"[{object_name}]", warnings_by_name[object_name] + messages, "sync")
+
+    executor = DeployExecutor(
+        getattr(args, "sync_workers", None) or DEFAULT_MAX_WORKERS,
+        getattr(args, "sync_per_server", None) or DEFAULT_PER_SERVER,
+    )
+    loop = asyncio.get_running_loop()
+    # Step 3.4: Results are saved (or streamed with --format ndjson) as they arrive
+    with open_result_writer(args) as writer:
+        await loop.run_in_executor(None, executor.run, lanes, on_result)
+    for database, counts in summary.items():
+        if getattr(args, "plan", None):
+            print(f"[INFO] {database}: plan {counts['create']} create, {counts['alter']} alter, {counts['skip']} unchanged, {counts['error']} error")
+        else:
+            print(f"[INFO] {database}: {counts['deployed']} deployed, {counts['unchanged']} unchanged (skipped), {counts['failed']} failed")
+    if getattr(args, "plan", None):
+        print(f"[INFO] Deployment plans written to {args.plan}")
 
     print(f"End Time: {datetime.now():%Y-%m-%d %H:%M:%S}")
 
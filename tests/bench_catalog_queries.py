@@ -0,0 +1,254 @@
+"""
+Benchmark: legacy INFORMATION_SCHEMA extraction vs the sys.* catalog queries of schema_utils.
+
+Builds a synthetic catalog in a scratch database (schema [bench]: tables with a PK, a UNIQUE
+constraint, an index, an FK to the previous table and a hierarchyid column), then for each
+implementation reports:
+  - latency: median wall time of --repeat runs
+  - plan cost: total estimated subtree cost of its statements (SET SHOWPLAN_XML)
+and checks that both return the same columns (type and length included).
+
+Needs a live SQL Server and a database you may create objects in:
+
+    python -m tests.bench_catalog_queries --conn-str "DRIVER={SQL Server};SERVER=...;DATABASE=scratch;..." --tables 2000
+
+Without a server, --fake answers both implementations from the same synthetic catalog in memory,
+sleeping --rtt-ms per round trip and --row-us per returned row. That runs the whole harness,
+including the column check, and shows round trips and rows transferred; estimated plan costs
+need a live server and are not reported:
+
+    python -m tests.bench_catalog_queries --fake --tables 2000 --rtt-ms 5 --row-us 20
+"""
+
+import argparse
+import re
+import statistics
+import time
+
+from tests.fakes import FakeServer, ensure_pyodbc
+
+ensure_pyodbc()
+
+import pyodbc  # noqa: E402
+
+from checker.schema_utils import CATALOG_PARTS, load_table_filter  # noqa: E402
+
+SCHEMA = "bench"
+
+def legacy_queries(tables):
+    # The baseline queries (INFORMATION_SCHEMA, per-row OBJECTPROPERTY, name-only constraint joins)
+    table_str = ", ".join(f"'{t.split('.', 1)[1]}'" for t in tables)
+    return [
+        f"""SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, COALESCE(CHARACTER_MAXIMUM_LENGTH, 0), IS_NULLABLE, COLUMN_DEFAULT
+            FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = '{SCHEMA}'""",
+        f"""SELECT TABLE_NAME, COLUMN_NAME FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+            WHERE OBJECTPROPERTY(OBJECT_ID(CONSTRAINT_SCHEMA + '.' + CONSTRAINT_NAME), 'IsPrimaryKey') = 1
+            AND TABLE_NAME IN ({table_str})""",
+        f"""SELECT tc.TABLE_NAME, kcu.COLUMN_NAME, ccu.TABLE_NAME, ccu.COLUMN_NAME
+            FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS AS tc
+            JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE AS kcu ON tc.CONSTRAINT_NAME = kcu.CONSTRAINT_NAME
+            JOIN INFORMATION_SCHEMA.CONSTRAINT_COLUMN_USAGE AS ccu ON tc.CONSTRAINT_NAME = ccu.CONSTRAINT_NAME
+            WHERE tc.CONSTRAINT_TYPE = 'FOREIGN KEY' AND tc.TABLE_NAME IN ({table_str})""",
+        f"""SELECT tc.TABLE_NAME, kcu.COLUMN_NAME, tc.CONSTRAINT_NAME
+            FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS tc
+            JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE kcu ON tc.CONSTRAINT_NAME = kcu.CONSTRAINT_NAME
+            WHERE tc.CONSTRAINT_TYPE = 'UNIQUE' AND tc.TABLE_NAME IN ({table_str})""",
+    ]
+
+class CatalogServer(FakeServer):
+    """
+    The synthetic catalog of build_catalog, answering the INFORMATION_SCHEMA and sys.* statements
+    after a simulated delay per round trip and per returned row
+    """
+
+    def __init__(self, count, rtt, row_cost):
+        super().__init__()
+        self.count = count
+        self.rtt = rtt
+        self.row_cost = row_cost
+        self.rows = 0
+        self.on(r"INFORMATION_SCHEMA\.COLUMNS", lambda conn, sql, params: [self._columns(sql, legacy=True)])
+        self.on(r"'IsPrimaryKey'", lambda conn, sql, params: [[(t, "id") for t in self._listed(sql)]])
+        self.on(r"CONSTRAINT_TYPE = 'FOREIGN KEY'", lambda conn, sql, params: [self._foreign_keys(sql)])
+        self.on(r"CONSTRAINT_TYPE = 'UNIQUE'", lambda conn, sql, params: [[(t, "code", f"UQ_{t}") for t in self._listed(sql)]])
+        self.on(r"CREATE TABLE #tables", self._create_filter)
+        self.on(r"INSERT INTO #tables", lambda conn, sql, params: conn.temp["tables"].append(params[1]) or [])
+        self.on(r"UPDATE f SET object_id", lambda conn, sql, params: [])
+        self.on(r"JOIN sys\.columns c ON c\.object_id = t\.object_id", lambda conn, sql, params: [self._columns(sql, conn=conn)])
+        self.on(r"kc\.type = 'PK'", lambda conn, sql, params: [[(f"{SCHEMA}.{t}", "id") for t in self._filtered(conn, sql)]])
+        self.on(r"FROM sys\.foreign_key_columns", lambda conn, sql, params: [self._foreign_keys(sql, conn)])
+        self.on(r"FROM sys\.indexes ind", lambda conn, sql, params: [[(f"{SCHEMA}.{t}", f"ix_{t}_label", "label") for t in self._filtered(conn, sql)]])
+        self.on(r"FROM sys\.triggers trg", lambda conn, sql, params: [[]])
+        self.on(r"kc\.type = 'UQ'", lambda conn, sql, params: [[(f"{SCHEMA}.{t}", "code", f"UQ_{t}") for t in self._filtered(conn, sql)]])
+
+    def _create_filter(self, conn, sql, params):
+        conn.temp["tables"] = []
+        return []
+
+    def _listed(self, sql):
+        # Legacy statements filter by TABLE_NAME IN (...) literals, if at all
+        match = re.search(r"TABLE_NAME IN \(([^)]*)\)", sql)
+        names = [f"t{i}" for i in range(self.count)]
+        if match is None:
+            return names
+        listed = set(match.group(1).split(", "))
+        return [n for n in names if f"'{n}'" in listed]
+
+    def _filtered(self, conn, sql):
+        names = [f"t{i}" for i in range(self.count)]
+        if "#tables" not in sql:
+            return names
+        listed = set(conn.temp["tables"])
+        return [n for n in names if n in listed]
+
+    def _columns(self, sql, legacy=False, conn=None):
+        rows = []
+        for name in (self._listed(sql) if legacy else self._filtered(conn, sql)):
+            table = name if legacy else f"{SCHEMA}.{name}"
+            rows += [
+                (table, "id", "int", 0, "NO", None),
+                (table, "code", "varchar", 20, "NO", None),
+                (table, "label", "nvarchar", 100, "YES", "(N'x')"),
+                (table, "notes", "ntext", 1073741823, "YES", None),
+                (table, "node", "hierarchyid", 892, "YES", None),
+            ]
+            if name != "t0":
+                rows.append((table, "parent_id", "int", 0, "YES", None))
+        return rows
+
+    def _foreign_keys(self, sql, conn=None):
+        names = self._listed(sql) if conn is None else self._filtered(conn, sql)
+        prefix = "" if conn is None else f"{SCHEMA}."
+        return [(prefix + n, "parent_id", prefix + f"t{int(n[1:]) - 1}", "id") for n in names if n != "t0"]
+
+    def handle(self, conn, sql, params):
+        sets = super().handle(conn, sql, params)
+        rows = sum(len(rows) for rows in sets)
+        self.rows += rows
+        time.sleep(self.rtt + rows * self.row_cost)
+        return sets
+
+    def handle_many(self, conn, sql, rows):
+        # executemany is one round trip (fast_executemany)
+        time.sleep(self.rtt)
+        for row in rows:
+            super().handle(conn, sql, row)
+
+def build_catalog(cursor, count):
+    cursor.execute(f"IF SCHEMA_ID('{SCHEMA}') IS NULL EXEC('CREATE SCHEMA {SCHEMA}')")
+    for i in range(count):
+        fk = f", parent_id int NULL REFERENCES {SCHEMA}.t{i - 1}(id)" if i else ""
+        cursor.execute(f"""
+            IF OBJECT_ID('{SCHEMA}.t{i}') IS NULL
+            CREATE TABLE {SCHEMA}.t{i} (
+                id int NOT NULL PRIMARY KEY,
+                code varchar(20) NOT NULL UNIQUE,
+                label nvarchar(100) NULL DEFAULT (N'x'),
+                notes ntext NULL,
+                node hierarchyid NULL{fk},
+                INDEX ix_t{i}_label (label)
+            )
+        """)
+    cursor.commit()
+
+def drop_catalog(cursor, count):
+    for i in reversed(range(count)):
+        cursor.execute(f"IF OBJECT_ID('{SCHEMA}.t{i}') IS NOT NULL DROP TABLE {SCHEMA}.t{i}")
+    cursor.commit()
+
+def run_sys(cursor, tables):
+    load_table_filter(cursor, tables)
+    results = []
+    for build_sql, parse in CATALOG_PARTS:
+        results.append(parse(cursor.execute(build_sql(tables))))
+    return results
+
+def run_legacy(cursor, tables):
+    return [cursor.execute(sql).fetchall() for sql in legacy_queries(tables)]
+
+def plan_cost(cursor, statements):
+    cursor.execute("SET SHOWPLAN_XML ON")
+    try:
+        total = 0.0
+        for sql in statements:
+            plan = cursor.execute(sql).fetchone()[0]
+            total += sum(float(cost) for cost in re.findall(r'StatementSubTreeCost="([^"]+)"', plan))
+        return total
+    finally:
+        cursor.execute("SET SHOWPLAN_XML OFF")
+
+def median_time(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def compare_columns(cursor, tables):
+    legacy_columns = {(r[0], r[1], r[2], r[3]) for r in run_legacy(cursor, tables)[0]}
+    sys_columns = {
+        (table.split(".", 1)[1], col[0], col[1], col[2])
+        for table, cols in run_sys(cursor, tables)[0].items() for col in cols
+    }
+    return len(legacy_columns - sys_columns), len(sys_columns - legacy_columns)
+
+def run_fake(args, tables):
+    server = CatalogServer(args.tables, args.rtt_ms / 1000, args.row_us / 1_000_000)
+    cursor = server.connect("fake").cursor()
+    counts = {}
+    timings = {}
+    for name, run in (("legacy", run_legacy), ("sys", run_sys)):
+        before = (server.round_trips, server.rows)
+        timings[name] = median_time(lambda: run(cursor, tables), args.repeat)
+        counts[name] = ((server.round_trips - before[0]) // args.repeat, (server.rows - before[1]) // args.repeat)
+    missing = compare_columns(cursor, tables)
+
+    print(f"{args.tables} tables (fake server: round trip {args.rtt_ms:g} ms, {args.row_us:g} us per row), median of {args.repeat} runs")
+    for label, name in (("INFORMATION_SCHEMA", "legacy"), ("sys.* catalog", "sys")):
+        round_trips, rows = counts[name]
+        print(f"  {label + ':':<19} {timings[name] * 1000:9.1f} ms, {round_trips} round trips, {rows} rows")
+    print(f"  columns only in INFORMATION_SCHEMA: {missing[0]}, only in sys.*: {missing[1]}")
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark INFORMATION_SCHEMA vs sys.* schema extraction")
+    parser.add_argument("--conn-str", help="Connection string of a scratch database")
+    parser.add_argument("--fake", action="store_true", help="Run against an in-memory catalog instead of a server")
+    parser.add_argument("--tables", type=int, default=1000, help="Synthetic tables to create")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per implementation")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic tables afterwards")
+    parser.add_argument("--rtt-ms", type=float, default=5.0, help="--fake: simulated time per round trip")
+    parser.add_argument("--row-us", type=float, default=20.0, help="--fake: simulated time per returned row")
+    if args is None:
+        args = parser.parse_args()
+        if not args.fake and not args.conn_str:
+            parser.error("--conn-str is required unless --fake is given")
+
+    tables = [f"{SCHEMA}.t{i}" for i in range(args.tables)]
+    if args.fake:
+        run_fake(args, tables)
+        return
+
+    with pyodbc.connect(args.conn_str) as conn:
+        cursor = conn.cursor()
+        build_catalog(cursor, args.tables)
+        try:
+            legacy = median_time(lambda: run_legacy(cursor, tables), args.repeat)
+            current = median_time(lambda: run_sys(cursor, tables), args.repeat)
+
+            load_table_filter(cursor, tables)
+            legacy_cost = plan_cost(cursor, legacy_queries(tables))
+            sys_cost = plan_cost(cursor, [build_sql(tables) for build_sql, _ in CATALOG_PARTS])
+
+            missing = compare_columns(cursor, tables)
+        finally:
+            if not args.keep:
+                drop_catalog(cursor, args.tables)
+
+    print(f"{args.tables} tables, median of {args.repeat} runs")
+    print(f"  INFORMATION_SCHEMA: {legacy * 1000:9.1f} ms, estimated plan cost {legacy_cost:10.2f}")
+    print(f"  sys.* catalog:      {current * 1000:9.1f} ms, estimated plan cost {sys_cost:10.2f}")
+    print(f"  columns only in INFORMATION_SCHEMA: {missing[0]}, only in sys.*: {missing[1]}")
+
+if __name__ == "__main__":
+    main()
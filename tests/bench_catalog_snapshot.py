@@ -0,0 +1,103 @@
+"""
+Benchmark: connections and round trips per database of get_catalog_snapshot (one connection, one
+batch) vs the six standalone catalog queries it replaced (one connection each).
+
+Each database is a fake pyodbc server that sleeps --login-ms per connection and --rtt-ms per round
+trip (execute / executemany), so the wall times show what the counts cost on a remote server.
+Both paths run the catalog queries of --databases databases concurrently, like schema mode, once
+for a --tables table list (loaded into #tables on each connection) and once for the whole database.
+
+    python -m tests.bench_catalog_snapshot --databases 20 --tables 500 --login-ms 30 --rtt-ms 5
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tests.fakes import FakeServer, counting_connect, ensure_pyodbc, per_server_counts
+
+ensure_pyodbc()
+
+from checker import schema_utils  # noqa: E402
+from checker.schema_utils import CATALOG_PARTS, build_conn_str, fetch_schema_info  # noqa: E402
+
+SEPARATE_QUERIES = (
+    schema_utils.get_schemas, schema_utils.get_primary_keys, schema_utils.get_foreign_keys,
+    schema_utils.get_indexes, schema_utils.get_triggers, schema_utils.get_unique_constraints,
+)
+
+class LatencyServer(FakeServer):
+    """
+    Answers the catalog statements with empty result sets after a simulated network delay
+    """
+
+    def __init__(self, login, rtt):
+        super().__init__()
+        self.login = login
+        self.rtt = rtt
+        self.on(r"SET NOCOUNT ON", lambda conn, sql, params: [[] for _ in CATALOG_PARTS])
+        self.on(r".", lambda conn, sql, params: [[]])
+
+    def connect(self, conn_str, *args, **kwargs):
+        time.sleep(self.login)
+        return super().connect(conn_str, *args, **kwargs)
+
+    def handle(self, conn, sql, params):
+        time.sleep(self.rtt)
+        return super().handle(conn, sql, params)
+
+    def handle_many(self, conn, sql, rows):
+        # executemany is one round trip (fast_executemany)
+        time.sleep(self.rtt)
+        for row in rows:
+            super().handle(conn, sql, row)
+
+def target_dbs(count):
+    return [{"server": "SRV01", "database": f"db{i}", "username": "u", "password": "p"} for i in range(count)]
+
+async def run_separate(dbs, tables, pool):
+    # The replaced fetch_schema_info: six helpers gathered concurrently, one connection each
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*[
+        loop.run_in_executor(pool, query, build_conn_str(db), tables)
+        for db in dbs for query in SEPARATE_QUERIES
+    ])
+
+async def run_snapshot(dbs, tables, pool):
+    asyncio.get_running_loop().set_default_executor(pool)
+    await asyncio.gather(*[fetch_schema_info(db, tables) for db in dbs])
+
+def measure(run, dbs, tables, login, rtt):
+    servers = {db["database"]: LatencyServer(login, rtt) for db in dbs}
+    schema_utils.pyodbc.connect = counting_connect(servers)
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        start = time.perf_counter()
+        asyncio.run(run(dbs, tables, pool))
+        elapsed = time.perf_counter() - start
+    counts = per_server_counts(servers)
+    per_db = {tuple(c.values()) for c in counts.values()}
+    assert len(per_db) == 1, per_db
+    connections, round_trips = per_db.pop()
+    return connections, round_trips, elapsed
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Count connections and round trips of the schema catalog fetch")
+    parser.add_argument("--databases", type=int, default=20, help="Target databases fetched concurrently")
+    parser.add_argument("--tables", type=int, default=500, help="Tables in the table list")
+    parser.add_argument("--login-ms", type=float, default=30.0, help="Simulated login time per connection")
+    parser.add_argument("--rtt-ms", type=float, default=5.0, help="Simulated time per round trip")
+    if args is None:
+        args = parser.parse_args()
+
+    dbs = target_dbs(args.databases)
+    login, rtt = args.login_ms / 1000, args.rtt_ms / 1000
+    print(f"{args.databases} databases, login {args.login_ms:g} ms, round trip {args.rtt_ms:g} ms")
+    for label, tables in ((f"{args.tables}-table list", [f"dbo.t{i}" for i in range(args.tables)]), ("whole database", None)):
+        print(f"  {label}:")
+        for name, run in (("six queries", run_separate), ("one batch", run_snapshot)):
+            connections, round_trips, elapsed = measure(run, dbs, tables, login, rtt)
+            print(f"    {name:<12} {connections} connections, {round_trips:2d} round trips per database, wall {elapsed * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
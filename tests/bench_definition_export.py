@@ -0,0 +1,203 @@
+"""
+Benchmark: per-object sp_helptext (the original sync export) vs export_definitions (one streamed
+sys.sql_modules query) on large modules.
+
+Builds --objects procedures of about --lines lines each (some lines longer than sp_helptext's
+255-character rows) and reports, for each implementation, round trips, rows fetched and the median
+wall time of --repeat runs, and checks that both return the same definitions.
+
+Without --conn-str the modules live in a fake server that sleeps --rtt-ms per round trip:
+
+    python -m tests.bench_definition_export --objects 300 --lines 2000 --rtt-ms 2
+
+With --conn-str the procedures are created in schema [bench] of a scratch database and dropped
+afterwards (unless --keep); round trips are then counted by the benchmark itself:
+
+    python -m tests.bench_definition_export --conn-str "DRIVER={SQL Server};SERVER=...;DATABASE=scratch;..."
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from tests.fakes import ModuleServer, ensure_pyodbc
+
+ensure_pyodbc()
+
+import pyodbc  # noqa: E402
+
+from checker import module_definitions  # noqa: E402
+from checker.module_definitions import export_definitions  # noqa: E402
+
+SCHEMA = "bench"
+
+def synthetic_module(index, lines, rng):
+    body = []
+    for i in range(lines):
+        if rng.random() < 0.05:
+            columns = ", ".join(f"o.col_{i}_{c} AS alias_{c}" for c in range(20))
+            body.append(f"    SELECT {columns} FROM dbo.orders o WHERE o.id = @id;")
+        else:
+            body.append(f"    UPDATE dbo.orders SET amount = amount + {i} WHERE id = @id AND line = {i}; -- step {i}")
+    return f"CREATE PROCEDURE {SCHEMA}.p{index} @id int AS\r\nBEGIN\r\n" + "\r\n".join(body) + "\r\nEND\r\n"
+
+class LatencyModuleServer(ModuleServer):
+    """
+    ModuleServer that sleeps rtt per round trip and counts the rows it returns
+    """
+
+    def __init__(self, modules, rtt):
+        super().__init__(modules)
+        self.rtt = rtt
+        self.rows = 0
+
+    def handle(self, conn, sql, params):
+        time.sleep(self.rtt)
+        result = super().handle(conn, sql, params)
+        self.rows += sum(len(rows) for rows in result)
+        return result
+
+    def handle_many(self, conn, sql, rows):
+        time.sleep(self.rtt)
+        for row in rows:
+            super().handle(conn, sql, row)
+
+class CountingCursor:
+    """
+    Wraps a live cursor to count round trips and fetched rows
+    """
+
+    def __init__(self, cursor, counts):
+        self.cursor = cursor
+        self.counts = counts
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __setattr__(self, name, value):
+        if name in ("cursor", "counts"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.cursor, name, value)
+
+    def execute(self, *args):
+        self.counts["round_trips"] += 1
+        self.cursor.execute(*args)
+        return self
+
+    def executemany(self, *args):
+        self.counts["round_trips"] += 1
+        return self.cursor.executemany(*args)
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.counts["rows"] += len(rows)
+        return rows
+
+    def fetchmany(self, size):
+        rows = self.cursor.fetchmany(size)
+        self.counts["rows"] += len(rows)
+        return rows
+
+class CountingConnection:
+    def __init__(self, conn, counts):
+        self.conn = conn
+        self.counts = counts
+
+    def cursor(self):
+        return CountingCursor(self.conn.cursor(), self.counts)
+
+    def close(self):
+        self.conn.close()
+
+def helptext_definitions(connect, conn_str, objects):
+    # The original export: one sp_helptext call per object, one row per line
+    conn = connect(conn_str)
+    try:
+        cursor = conn.cursor()
+        definitions = {}
+        for name, object_type in objects:
+            rows = cursor.execute("EXEC sp_helptext ?", name).fetchall()
+            if rows:
+                definitions[(name, object_type)] = "".join(row[0] for row in rows)
+        return definitions
+    finally:
+        conn.close()
+
+def bulk_definitions(connect, conn_str, objects):
+    original = module_definitions.pyodbc.connect
+    module_definitions.pyodbc.connect = connect
+    try:
+        return export_definitions(conn_str, objects)
+    finally:
+        module_definitions.pyodbc.connect = original
+
+def median_time(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+def create_modules(conn_str, modules):
+    with pyodbc.connect(conn_str, autocommit=True) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"IF SCHEMA_ID('{SCHEMA}') IS NULL EXEC('CREATE SCHEMA {SCHEMA}')")
+        for name, definition in modules.items():
+            cursor.execute(f"IF OBJECT_ID('{name}') IS NOT NULL DROP PROCEDURE {name}")
+            cursor.execute(definition)
+
+def drop_modules(conn_str, modules):
+    with pyodbc.connect(conn_str, autocommit=True) as conn:
+        cursor = conn.cursor()
+        for name in modules:
+            cursor.execute(f"IF OBJECT_ID('{name}') IS NOT NULL DROP PROCEDURE {name}")
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark sp_helptext against the bulk definition export")
+    parser.add_argument("--objects", type=int, default=200, help="Procedures to export")
+    parser.add_argument("--lines", type=int, default=1000, help="Lines per procedure")
+    parser.add_argument("--rtt-ms", type=float, default=2.0, help="Fake server: simulated time per round trip")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per implementation")
+    parser.add_argument("--conn-str", help="Run against a live scratch database instead of the fake server")
+    parser.add_argument("--keep", action="store_true", help="Live mode: keep the created procedures")
+    if args is None:
+        args = parser.parse_args()
+
+    rng = random.Random(0)
+    modules = {f"{SCHEMA}.p{i}": synthetic_module(i, args.lines, rng) for i in range(args.objects)}
+    objects = [(name, "sp") for name in modules]
+    size_mb = sum(len(definition) for definition in modules.values()) / 1024 / 1024
+
+    live_connect = pyodbc.connect
+    if args.conn_str:
+        create_modules(args.conn_str, modules)
+        conn_str = args.conn_str
+    else:
+        server = LatencyModuleServer({name: ("P", definition) for name, definition in modules.items()}, args.rtt_ms / 1000)
+        conn_str = "DATABASE=bench"
+
+    try:
+        print(f"{args.objects} procedures x {args.lines} lines ({size_mb:.1f} MB), median of {args.repeat} runs")
+        results = {}
+        for label, run in (("sp_helptext", helptext_definitions), ("bulk export", bulk_definitions)):
+            counts = {"round_trips": 0, "rows": 0}
+            if args.conn_str:
+                connect = lambda cs, *a, counts=counts, **kw: CountingConnection(live_connect(cs, *a, **kw), counts)
+            else:
+                server.round_trips = server.rows = 0
+                connect = server.connect
+            elapsed, results[label] = median_time(lambda: run(connect, conn_str, objects), args.repeat)
+            if not args.conn_str:
+                counts = {"round_trips": server.round_trips, "rows": server.rows}
+            print(f"  {label:<12} {counts['round_trips'] // args.repeat:6d} round trips, {counts['rows'] // args.repeat:8d} rows, {elapsed * 1000:9.1f} ms")
+        same = results["sp_helptext"] == results["bulk export"]
+        print(f"  definitions identical: {same} ({len(results['bulk export'])} exported)")
+    finally:
+        if args.conn_str and not args.keep:
+            drop_modules(args.conn_str, modules)
+
+if __name__ == "__main__":
+    main()
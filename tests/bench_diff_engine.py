@@ -0,0 +1,63 @@
+"""
+Micro-benchmark: the Myers engine of utils.diff_engine vs difflib.ndiff on definition-sized inputs.
+
+For each size in --sizes, builds a synthetic procedure and a target copy with --edit-rate of its
+lines changed (scattered single-line edits) plus one replaced block of --block lines, then reports
+the median time of --repeat runs for:
+  - myers: diff_lines(engine="myers"), no limits
+  - ndiff: diff_lines(engine="ndiff"), no limits
+  - ndiff capped: diff_lines(engine="ndiff", timeout=--timeout), i.e. the bounded legacy engine
+
+    python -m tests.bench_diff_engine --sizes 200 1000 5000 --block 200
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from utils.diff_engine import DiffSettings, diff_lines
+
+def synthetic_pair(size, edit_rate, block, seed=0):
+    rng = random.Random(seed)
+    base = [
+        f"select o.col{i}, o.amount * {rng.randint(1, 9)} as total{i} from dbo.orders_{i % 40} o where o.id = @id + {i}"
+        for i in range(size)
+    ]
+    target = [line + " -- edited" if rng.random() < edit_rate else line for line in base]
+    start = size // 2
+    target[start:start + block] = [line.replace("amount", "amt") for line in base[start:start + block]]
+    return base, target
+
+def median_time(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Myers diff engine against difflib.ndiff")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 1000, 5000], help="Lines per definition")
+    parser.add_argument("--edit-rate", type=float, default=0.02, help="Share of lines with a scattered edit")
+    parser.add_argument("--block", type=int, default=100, help="Lines of one replaced block")
+    parser.add_argument("--timeout", type=float, default=2.0, help="Time limit of the capped ndiff run")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per engine")
+    if args is None:
+        args = parser.parse_args()
+
+    engines = {
+        "myers": DiffSettings(engine="myers", max_lines=0, timeout=0),
+        "ndiff": DiffSettings(engine="ndiff", max_lines=0, timeout=0),
+        "ndiff capped": DiffSettings(engine="ndiff", max_lines=0, timeout=args.timeout),
+    }
+    for size in args.sizes:
+        base, target = synthetic_pair(size, args.edit_rate, min(args.block, size // 2))
+        print(f"{size} lines, {args.edit_rate:.0%} scattered edits, {min(args.block, size // 2)}-line replaced block")
+        for name, settings in engines.items():
+            elapsed, lines = median_time(lambda: diff_lines(base, target, settings), args.repeat)
+            print(f"  {name:<12} {elapsed * 1000:10.1f} ms  {len(lines):6d} output lines")
+
+if __name__ == "__main__":
+    main()
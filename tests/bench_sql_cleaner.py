@@ -0,0 +1,118 @@
+"""
+Benchmark: the single-pass comment scanner of utils.sql_cleaner vs the original two-regex cleanup.
+
+Generates --modules procedures of roughly --lines lines each in two flavours:
+  - comment-heavy: line and nested block comments, string literals with doubled quotes and
+    comment markers, bracketed identifiers
+  - realistic: scripted-out style code with [bracketed] names and N'' literals, a header block
+    and only the occasional -- comment
+and reports the median time of --repeat runs for:
+  - baseline: re.sub('--.*') then re.sub('/\\*.*?\\*/') (not literal-aware, no nesting)
+  - scanner:  utils.sql_cleaner.remove_sql_comments
+and for the full comparison path (comments removed, lowercased, stripped, blank lines dropped):
+  - baseline: the original clean_definition_lines on top of the two-regex cleanup
+  - scanner:  utils.sql_cleaner.clean_definition_lines with the normalization cache cleared first
+It also counts the modules where the two disagree; those are the inputs the baseline got wrong.
+
+    python -m tests.bench_sql_cleaner --modules 5000 --lines 200
+"""
+
+import argparse
+import random
+import re
+import statistics
+import time
+
+from utils.sql_cleaner import clean_definition_lines, get_normalization_cache, remove_sql_comments
+
+def baseline_remove_sql_comments(sql_text):
+    sql_text = re.sub(r'--.*', '', sql_text)
+    sql_text = re.sub(r'/\*.*?\*/', '', sql_text, flags=re.DOTALL)
+    return sql_text.strip()
+
+def baseline_clean_definition_lines(sql_text):
+    sql_text = baseline_remove_sql_comments(sql_text)
+    return [line.strip().lower() for line in sql_text.splitlines() if line.strip()]
+
+_LINES = [
+    "    SELECT o.[Order Id], o.Amount, c.Name FROM dbo.Orders o JOIN dbo.Customers c ON c.Id = o.CustomerId",
+    "    WHERE o.Status = 'OPEN' AND o.Note NOT LIKE '%--%' -- skip annotated orders",
+    "    SET @msg = N'it''s /* not */ a comment';",
+    "    /* block comment",
+    "       spanning lines /* nested */ still inside */",
+    "    UPDATE dbo.[Weird]]Name] SET Total = Total * 2 / 3 WHERE Id = @id;",
+    "    -- plain line comment",
+    "    INSERT INTO dbo.Audit (Msg) VALUES ('http://example.com/a--b');",
+]
+
+_REALISTIC_LINES = [
+    "\tSELECT [o].[OrderId], [o].[Amount], [c].[Name]",
+    "\tFROM [dbo].[Orders] AS [o] WITH (NOLOCK)",
+    "\tINNER JOIN [dbo].[Customers] AS [c] ON [c].[CustomerId] = [o].[CustomerId]",
+    "\tWHERE [o].[Status] = N'OPEN' AND [o].[CreatedAt] >= @from",
+    "\tSET @msg = N'Order ' + CAST(@id AS nvarchar(20)) + N' processed';",
+    "\tUPDATE [dbo].[Orders] SET [Total] = [Total] * 2 / 3, [UpdatedAt] = GETDATE() WHERE [OrderId] = @id;",
+    "\tIF @@ROWCOUNT = 0 RAISERROR(N'Order %d not found', 16, 1, @id);",
+    "",
+    "\tINSERT INTO [dbo].[Audit] ([Msg], [At]) VALUES (@msg, SYSDATETIME());",
+]
+
+def synthetic_modules(count, lines, seed=0):
+    rng = random.Random(seed)
+    modules = []
+    for i in range(count):
+        body = [rng.choice(_LINES) for _ in range(lines)]
+        modules.append(f"CREATE PROCEDURE dbo.p{i} @id int AS\nBEGIN\n" + "\n".join(body) + "\nEND\n")
+    return modules
+
+def realistic_modules(count, lines, seed=0):
+    rng = random.Random(seed)
+    modules = []
+    for i in range(count):
+        body = [rng.choice(_REALISTIC_LINES) for _ in range(lines)]
+        for _ in range(max(1, lines // 50)):
+            body.insert(rng.randrange(len(body) + 1), "\t-- keep in sync with the reporting job")
+        header = f"/*\n  Procedure: [dbo].[usp_Order{i}]\n  Author:    dba team\n*/\n"
+        modules.append(header + f"CREATE PROCEDURE [dbo].[usp_Order{i}]\n\t@id int,\n\t@from datetime\nAS\nBEGIN\n\tSET NOCOUNT ON;\n" + "\r\n".join(body) + "\nEND\n")
+    return modules
+
+def median_time(run, modules, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        for sql in modules:
+            run(sql)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark SQL comment removal")
+    parser.add_argument("--modules", type=int, default=2000, help="Synthetic modules to clean")
+    parser.add_argument("--lines", type=int, default=200, help="Lines per module")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per implementation")
+    if args is None:
+        args = parser.parse_args()
+
+    cache = get_normalization_cache()
+    print(f"{args.modules} modules x {args.lines} lines, median of {args.repeat} runs")
+    for label, modules in (("comment-heavy", synthetic_modules(args.modules, args.lines)),
+                           ("realistic", realistic_modules(args.modules, args.lines))):
+        size_mb = sum(len(sql) for sql in modules) / 1024 / 1024
+        print(f"{label} ({size_mb:.1f} MB):")
+        for step, baseline_run, scanner_run in (
+            ("remove_sql_comments", baseline_remove_sql_comments, remove_sql_comments),
+            ("clean_definition_lines", baseline_clean_definition_lines, clean_definition_lines),
+        ):
+            baseline = median_time(baseline_run, modules, args.repeat)
+            scanner = median_time(scanner_run, modules, args.repeat, setup=cache.clear)
+            differing = sum(baseline_run(sql) != scanner_run(sql) for sql in modules)
+            print(f"  {step}:")
+            print(f"    baseline two-regex: {baseline * 1000:9.1f} ms ({size_mb / baseline:6.1f} MB/s)")
+            print(f"    scanner:            {scanner * 1000:9.1f} ms ({size_mb / scanner:6.1f} MB/s)")
+            print(f"    modules where the baseline output differs: {differing}")
+        cache.clear()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+from tests.fakes import ensure_pyodbc
+
+# Where pyodbc cannot load, every test passes its own fake connect
+ensure_pyodbc()
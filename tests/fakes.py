@@ -0,0 +1,251 @@
+"""
+In-memory stand-ins for pyodbc used by the tests and benchmarks.
+
+FakeServer counts connections and round trips (execute / executemany calls) and answers each
+statement with the first handler whose pattern matches the SQL text. A handler returns a list of
+result sets (each a list of row tuples); several result sets are read with cursor.nextset().
+ModuleServer adds the sys.sql_modules / sys.objects / #names / DDL behaviour of SQL Server that
+the SP / view / sync code relies on.
+"""
+
+import re
+import sys
+import types
+from collections import defaultdict
+
+class FakeError(Exception):
+    pass
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.fast_executemany = False
+        self._sets = []
+        self._rows = []
+
+    def execute(self, sql, *params):
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = tuple(params[0])
+        server = self.conn.server
+        server.round_trips += 1
+        server.statements.append(sql)
+        # A result set given as an exception is raised when it is reached, like a failing statement in a batch
+        self._sets = [rows if isinstance(rows, Exception) else list(rows) for rows in server.handle(self.conn, sql, params)] or [[]]
+        if isinstance(self._sets[0], Exception):
+            raise self._sets[0]
+        self._rows = self._sets.pop(0)
+        return self
+
+    def executemany(self, sql, rows):
+        server = self.conn.server
+        server.round_trips += 1
+        server.statements.append(sql)
+        server.handle_many(self.conn, sql, [tuple(row) for row in rows])
+
+    def nextset(self):
+        if not self._sets:
+            return False
+        self._rows = self._sets.pop(0)
+        if isinstance(self._rows, Exception):
+            error, self._rows, self._sets = self._rows, [], []
+            raise error
+        return True
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size=1):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def __iter__(self):
+        while self._rows:
+            yield self._rows.pop(0)
+
+class FakeConnection:
+    def __init__(self, server, conn_str, autocommit=False):
+        self.server = server
+        self.conn_str = conn_str
+        self.autocommit = autocommit
+        self.timeout = 0
+        self.temp = {}
+        self.pending = {}
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.server.commit(self)
+
+    def rollback(self):
+        self.pending.clear()
+
+    def close(self):
+        self.pending.clear()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class FakeServer:
+    def __init__(self):
+        self.connections = 0
+        self.round_trips = 0
+        self.statements = []
+        self.handlers = []
+
+    def on(self, pattern, handler):
+        self.handlers.append((re.compile(pattern, re.IGNORECASE | re.DOTALL), handler))
+        return self
+
+    def connect(self, conn_str, autocommit=False, **kwargs):
+        self.connections += 1
+        return FakeConnection(self, conn_str, autocommit)
+
+    def handle(self, conn, sql, params):
+        for pattern, handler in self.handlers:
+            if pattern.search(sql):
+                return handler(conn, sql, params)
+        raise FakeError(f"Unexpected statement: {sql.strip()[:80]}")
+
+    def handle_many(self, conn, sql, rows):
+        for row in rows:
+            self.handle(conn, sql, row)
+
+    def commit(self, conn):
+        conn.pending.clear()
+
+def pyodbc_module(connect=None):
+    """
+    Minimal module object standing in for pyodbc where the ODBC driver cannot be loaded
+    """
+    def refuse(*args, **kwargs):
+        raise FakeError("pyodbc is not available; pass a fake connect")
+    return types.SimpleNamespace(connect=connect or refuse, Error=FakeError, __name__="pyodbc")
+
+def ensure_pyodbc():
+    """
+    The modules import pyodbc at import time; where the ODBC driver manager is not installed,
+    substitute pyodbc_module() so they import and fakes can be patched in
+    """
+    try:
+        import pyodbc  # noqa: F401
+    except ImportError:
+        sys.modules["pyodbc"] = pyodbc_module()
+
+_NAME_FILTER = re.compile(r"#names", re.IGNORECASE)
+_DDL = re.compile(
+    r"\A((?:\s+|--[^\n]*(?:\n|\Z)|/\*.*?\*/)*)(CREATE\s+OR\s+ALTER|CREATE|ALTER)\s+(PROC|PROCEDURE|VIEW)\s+([\w.\[\]]+)",
+    re.IGNORECASE | re.DOTALL,
+)
+
+class ModuleServer(FakeServer):
+    """
+    Procedures and views of one database: {schema.name: (type code, definition)}.
+    Like SQL Server, an ALTER is stored with a CREATE header while CREATE OR ALTER is stored as sent.
+    DDL is kept per connection until commit (immediately applied on autocommit connections).
+    """
+
+    def __init__(self, modules=None):
+        super().__init__()
+        self.modules = dict(modules or {})
+        self.failing = set()
+        self.on(r"CREATE TABLE #names", self._create_names)
+        self.on(r"INSERT INTO #names", self._insert_name)
+        self.on(r"\bsp_helptext\b", self._helptext)
+        self.on(r"FROM sys\.sql_modules", self._definitions)
+        self.on(r"FROM sys\.objects o\s+WHERE o\.type IN \('P', 'V'\)", self._existing)
+        self.on(r"\A(?:\s|--[^\n]*\n|/\*.*?\*/)*(CREATE|ALTER)\b", self._ddl)
+
+    def _create_names(self, conn, sql, params):
+        conn.temp["names"] = []
+        return []
+
+    def _insert_name(self, conn, sql, params):
+        conn.temp["names"].append(params)
+        return []
+
+    def visible(self, conn):
+        modules = dict(self.modules)
+        modules.update(conn.pending)
+        return modules
+
+    def _listed(self, conn, qualified):
+        schema, name = qualified.split(".", 1)
+        return any(
+            n.lower() == name.lower() and (s is None or s.lower() == schema.lower())
+            for s, n in conn.temp.get("names", [])
+        )
+
+    def _definitions(self, conn, sql, params):
+        rows = []
+        filtered = bool(_NAME_FILTER.search(sql))
+        with_type = "RTRIM(o.type)" in sql
+        for qualified, (type_code, definition) in self.visible(conn).items():
+            if type_code not in params or (filtered and not self._listed(conn, qualified)):
+                continue
+            rows.append((qualified, type_code, definition) if with_type else (qualified, definition))
+        return [rows]
+
+    def _existing(self, conn, sql, params):
+        return [[(q, t) for q, (t, _) in self.visible(conn).items() if self._listed(conn, q)]]
+
+    def _helptext(self, conn, sql, params):
+        qualified = params[0] if "." in params[0] else f"dbo.{params[0]}"
+        _, definition = self.visible(conn)[qualified]
+        # sp_helptext: one row per line, long lines split at 255 characters
+        rows = []
+        for line in definition.splitlines(keepends=True):
+            rows += [(line[i:i + 255],) for i in range(0, len(line), 255)]
+        return [rows]
+
+    def _ddl(self, conn, sql, params):
+        match = _DDL.match(sql)
+        if not match:
+            raise FakeError(f"Unsupported DDL: {sql[:60]}")
+        prefix, verb, kind, name = match.groups()
+        qualified = name.replace("[", "").replace("]", "")
+        qualified = qualified if "." in qualified else f"dbo.{qualified}"
+        if qualified in self.failing:
+            raise FakeError(f"Deployment of {qualified} failed")
+        exists = qualified in self.visible(conn)
+        verb = " ".join(verb.upper().split())
+        if verb == "CREATE" and exists:
+            raise FakeError(f"There is already an object named '{qualified}' in the database.")
+        if verb == "ALTER" and not exists:
+            raise FakeError(f"Invalid object name '{qualified}'.")
+        stored = sql
+        if verb == "ALTER":
+            start = len(prefix)
+            stored = sql[:start] + "CREATE" + sql[start + len(match.group(2)):]
+        conn.pending[qualified] = ("V" if kind.upper() == "VIEW" else "P", stored)
+        if conn.autocommit:
+            self.commit(conn)
+        return []
+
+    def commit(self, conn):
+        self.modules.update(conn.pending)
+        conn.pending.clear()
+
+def counting_connect(servers):
+    """
+    connect() routing each connection string to a FakeServer by its DATABASE= value
+    """
+    def connect(conn_str, *args, **kwargs):
+        database = re.search(r"DATABASE=([^;]*)", conn_str).group(1)
+        return servers[database].connect(conn_str, *args, **kwargs)
+    return connect
+
+def per_server_counts(servers):
+    counts = defaultdict(dict)
+    for database, server in servers.items():
+        counts[database] = {"connections": server.connections, "round_trips": server.round_trips}
+    return dict(counts)
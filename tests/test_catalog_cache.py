@@ -0,0 +1,163 @@
+import itertools
+from datetime import datetime, timedelta
+
+import pytest
+
+from checker import catalog_cache
+from checker.catalog_cache import apply_refresh, cache_path, get_definitions_cached, plan_refresh
+from tests.fakes import FakeServer
+
+DB = {"server": "SRV01", "database": "Sales"}
+
+class CatalogServer(FakeServer):
+    """
+    sys.objects / sys.sql_modules of one database: {object_id: [schema, name, type code, modify_date, definition]}
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.objects = {}
+        self.downloaded = []
+        self._ids = itertools.count(100)
+        self._clock = datetime(2024, 1, 1)
+        self.on(r"FROM sys\.objects o\s+WHERE o\.type = \?", self._server_objects)
+        self.on(r"CREATE TABLE #changed", self._create_changed)
+        self.on(r"INSERT INTO #changed", self._insert_changed)
+        self.on(r"JOIN #changed", self._definitions)
+
+    def _tick(self):
+        self._clock += timedelta(seconds=1)
+        return self._clock
+
+    def add(self, name, definition, type_code="P", schema="dbo"):
+        object_id = next(self._ids)
+        self.objects[object_id] = [schema, name, type_code, self._tick(), definition]
+        return object_id
+
+    def alter(self, object_id, definition):
+        self.objects[object_id][3:] = [self._tick(), definition]
+
+    def rename(self, object_id, name):
+        # sp_rename keeps object_id and modify_date; only the name changes
+        self.objects[object_id][1] = name
+
+    def transfer(self, object_id, schema):
+        # ALTER SCHEMA ... TRANSFER keeps object_id
+        self.objects[object_id][0] = schema
+
+    def drop(self, object_id):
+        del self.objects[object_id]
+
+    def _server_objects(self, conn, sql, params):
+        return [[(i, schema, name, modified) for i, (schema, name, type_code, modified, _) in self.objects.items() if type_code == params[0]]]
+
+    def _create_changed(self, conn, sql, params):
+        conn.temp["changed"] = []
+        return []
+
+    def _insert_changed(self, conn, sql, params):
+        conn.temp["changed"].append(params[0])
+        return []
+
+    def _definitions(self, conn, sql, params):
+        rows = [(i, self.objects[i][4]) for i in conn.temp["changed"] if i in self.objects]
+        self.downloaded.extend(i for i, _ in rows)
+        return [rows]
+
+@pytest.fixture
+def server(monkeypatch):
+    server = CatalogServer()
+    monkeypatch.setattr(catalog_cache.pyodbc, "connect", server.connect)
+    return server
+
+def refresh(server, tmp_path):
+    """
+    One cached fetch: (definitions, sorted object ids whose definitions were downloaded)
+    """
+    server.downloaded = []
+    definitions = get_definitions_cached("DATABASE=Sales", DB, "sp", str(tmp_path))
+    return definitions, sorted(server.downloaded)
+
+def test_refresh_downloads_only_added_altered_and_renamed_objects(server, tmp_path):
+    orders = server.add("usp_orders", "CREATE PROC usp_orders AS SELECT 1")
+    stock = server.add("usp_stock", "CREATE PROC usp_stock AS SELECT 2")
+    old = server.add("usp_old", "CREATE PROC usp_old AS SELECT 3")
+    server.add("v_orders", "CREATE VIEW v_orders AS SELECT 1", type_code="V")
+
+    definitions, downloaded = refresh(server, tmp_path)
+    assert definitions == {
+        "dbo.usp_orders": "CREATE PROC usp_orders AS SELECT 1",
+        "dbo.usp_stock": "CREATE PROC usp_stock AS SELECT 2",
+        "dbo.usp_old": "CREATE PROC usp_old AS SELECT 3",
+    }
+    assert downloaded == [orders, stock, old]
+
+    # Nothing changed: served from the cache without fetching any definition
+    assert refresh(server, tmp_path) == (definitions, [])
+
+    server.alter(orders, "CREATE PROC usp_orders AS SELECT 10")
+    server.rename(stock, "usp_inventory")
+    server.drop(old)
+    new = server.add("usp_new", "CREATE PROC usp_new AS SELECT 4")
+
+    definitions, downloaded = refresh(server, tmp_path)
+    assert definitions == {
+        "dbo.usp_orders": "CREATE PROC usp_orders AS SELECT 10",
+        "dbo.usp_inventory": "CREATE PROC usp_stock AS SELECT 2",
+        "dbo.usp_new": "CREATE PROC usp_new AS SELECT 4",
+    }
+    assert downloaded == sorted([orders, stock, new])
+    assert refresh(server, tmp_path) == (definitions, [])
+
+def test_dropped_and_recreated_object_gets_a_new_id(server, tmp_path):
+    first = server.add("usp_orders", "CREATE PROC usp_orders AS SELECT 1")
+    refresh(server, tmp_path)
+    server.drop(first)
+    second = server.add("usp_orders", "CREATE PROC usp_orders AS SELECT 2")
+    definitions, downloaded = refresh(server, tmp_path)
+    assert definitions == {"dbo.usp_orders": "CREATE PROC usp_orders AS SELECT 2"}
+    assert downloaded == [second]
+
+def test_same_name_in_several_schemas_and_schema_transfer(server, tmp_path):
+    dbo = server.add("usp_orders", "CREATE PROC dbo.usp_orders AS SELECT 1")
+    sales = server.add("usp_orders", "CREATE PROC sales.usp_orders AS SELECT 2", schema="sales")
+    definitions, _ = refresh(server, tmp_path)
+    assert definitions == {
+        "dbo.usp_orders": "CREATE PROC dbo.usp_orders AS SELECT 1",
+        "sales.usp_orders": "CREATE PROC sales.usp_orders AS SELECT 2",
+    }
+    server.transfer(sales, "hr")
+    definitions, downloaded = refresh(server, tmp_path)
+    assert set(definitions) == {"dbo.usp_orders", "hr.usp_orders"} and downloaded == [sales]
+    assert dbo not in downloaded
+
+def test_cache_of_another_version_is_rebuilt(server, tmp_path, monkeypatch):
+    orders = server.add("usp_orders", "CREATE PROC usp_orders AS SELECT 1")
+    refresh(server, tmp_path)
+    monkeypatch.setattr(catalog_cache, "CACHE_VERSION", catalog_cache.CACHE_VERSION + 1)
+    assert refresh(server, tmp_path)[1] == [orders]
+
+def test_plan_and_apply_refresh():
+    cached = {
+        1: {"schema": "dbo", "name": "a", "modify_date": "2024-01-01T00:00:00", "definition": "A"},
+        2: {"schema": "dbo", "name": "b", "modify_date": "2024-01-01T00:00:00", "definition": "B"},
+        3: {"schema": "dbo", "name": "c", "modify_date": "2024-01-01T00:00:00", "definition": "C"},
+        4: {"schema": "dbo", "name": "d", "modify_date": "2024-01-01T00:00:00", "definition": "D"},
+        6: {"schema": "dbo", "name": "f", "modify_date": "2024-01-01T00:00:00", "definition": "F"},
+    }
+    server_objects = {
+        1: ("dbo", "a", "2024-01-01T00:00:00"),   # unchanged
+        2: ("dbo", "b", "2024-02-01T00:00:00"),   # altered
+        3: ("dbo", "c2", "2024-01-01T00:00:00"),  # renamed
+        5: ("dbo", "e", "2024-03-01T00:00:00"),   # added; 4 was dropped
+        6: ("hr", "f", "2024-01-01T00:00:00"),    # moved to another schema
+    }
+    changed, dropped = plan_refresh(cached, server_objects)
+    assert sorted(changed) == [2, 3, 5, 6] and dropped == [4]
+
+    objects = apply_refresh(cached, server_objects, {2: "B2", 3: "C", 5: "E", 6: "F"}, dropped)
+    assert {f"{entry['schema']}.{entry['name']}": entry["definition"] for entry in objects.values()} == {
+        "dbo.a": "A", "dbo.b": "B2", "dbo.c2": "C", "dbo.e": "E", "hr.f": "F",
+    }
+    assert objects[2]["modify_date"] == "2024-02-01T00:00:00"
+    assert cache_path("cache", DB, "sp").endswith("SRV01__Sales__sp.catalog.json.gz")
@@ -0,0 +1,86 @@
+import asyncio
+import importlib
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from checker import module_definitions
+from checker.sp_checker import sp_compare_job
+from checker.view_checker import view_definition_job
+from utils.compare_pipeline import run_compare_pipeline
+from tests.fakes import ModuleServer
+
+BASE_DB = {"server": "SRV00", "database": "Base"}
+TARGET_DB = {"server": "SRV01", "database": "Sales", "username": "u", "password": "p"}
+
+class ListWriter:
+    def __init__(self):
+        self.results = []
+
+    def add_results(self, server, result, kind):
+        self.results.append((server, result, kind))
+
+@pytest.fixture
+def server(monkeypatch):
+    server = ModuleServer({
+        "dbo.usp_a": ("P", "CREATE PROC dbo.usp_a AS SELECT 1"),
+        "dbo.usp_b": ("P", "CREATE PROC dbo.usp_b AS SELECT 2"),
+        "dbo.v_a": ("V", "CREATE VIEW dbo.v_a AS SELECT 1"),
+    })
+    server.threads = []
+    def connect(conn_str, *args, **kwargs):
+        server.threads.append(threading.current_thread())
+        return ModuleServer.connect(server, conn_str, *args, **kwargs)
+    monkeypatch.setattr(module_definitions.pyodbc, "connect", connect)
+    return server
+
+def test_streaming_fetch_runs_the_query_in_the_executor(server):
+    base_defs = {"dbo.usp_a": "CREATE PROC dbo.usp_a AS SELECT 1", "dbo.usp_b": "CREATE PROC dbo.usp_b AS SELECT 20"}
+    job = sp_compare_job(base_defs, BASE_DB, TARGET_DB, ["usp_a", "usp_b"], False, SimpleNamespace(fetch_batch_size=1))
+
+    async def fetch_only():
+        return await job.fetch()
+
+    rows = asyncio.run(fetch_only())
+    # Connection, query and first fetchmany happened during fetch, off the event loop thread
+    assert server.connections == 1
+    assert any("sys.sql_modules" in sql for sql in server.statements)
+    assert server.threads and server.threads[0] is not threading.main_thread()
+    trips = server.round_trips
+
+    result = job.compare(rows)
+    assert server.round_trips == trips
+    assert list(result["Sales"]) == ["[usp_b]"]
+
+def test_view_jobs_stream_through_the_pipeline(server):
+    base_defs = {"dbo.v_a": "CREATE VIEW dbo.v_a AS SELECT 2"}
+    job = view_definition_job(base_defs, TARGET_DB, ["v_a"], False)
+    writer = ListWriter()
+    stats = asyncio.run(run_compare_pipeline([job], writer))
+    assert writer.results == [("SRV01", {"Sales": {"[v_a]": ["Definition is different!"]}}, "view")]
+    assert len(stats.fetch_ends) == 1
+
+def test_fetch_errors_are_reported_per_target(monkeypatch):
+    def refuse(conn_str, *args, **kwargs):
+        raise RuntimeError("login failed")
+    monkeypatch.setattr(module_definitions.pyodbc, "connect", refuse)
+    job = view_definition_job({}, TARGET_DB, ["v_a"], False)
+    writer = ListWriter()
+    asyncio.run(run_compare_pipeline([job], writer))
+    assert writer.results == [("SRV01", {"Sales": {"[ERROR]": "login failed"}}, "view")]
+
+@pytest.mark.parametrize("module_name", ["checker.sp_checker", "checker.view_checker", "checker.schema_checker"])
+def test_normalization_cache_is_closed_when_the_run_fails(monkeypatch, module_name):
+    module = importlib.import_module(module_name)
+    closed = []
+
+    def fail(path):
+        raise OSError("account file missing")
+
+    monkeypatch.setattr(module, "configure_normalization_cache", lambda args: None)
+    monkeypatch.setattr(module, "close_normalization_cache", lambda: closed.append(True))
+    monkeypatch.setattr(module, "read_db_info", fail)
+    with pytest.raises(OSError):
+        asyncio.run(module.main_async(SimpleNamespace(show_content=False)))
+    assert closed == [True]
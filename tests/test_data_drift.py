@@ -0,0 +1,96 @@
+import asyncio
+import os
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from checker import data_drift
+from checker.data_drift import SqlServerDialect, SqliteDialect, check_drift_args, compare_target_drift, main_async, sqlite_connect
+from checker.view_checker import to_test_server
+
+TARGET = {"server": "SRV01", "database": "Sales", "username": "u", "password": "p"}
+
+def create_database(directory, server, rows):
+    os.makedirs(os.path.join(directory, server), exist_ok=True)
+    with sqlite3.connect(os.path.join(directory, server, "Sales.db")) as conn:
+        conn.execute("CREATE TABLE Orders (OrderID INTEGER PRIMARY KEY, Amount INTEGER, Note TEXT)")
+        conn.executemany("INSERT INTO Orders VALUES (?, ?, ?)", rows)
+        conn.execute("CREATE VIEW OrderView AS SELECT OrderID, Amount FROM Orders")
+
+@pytest.fixture
+def databases(tmp_path):
+    rows = [(i, i * 10, f"order {i}") for i in range(1, 20001)]
+    drifted = [row for row in rows if row[0] != 7000]
+    drifted = [(i, amount + 1 if 12000 <= i < 12010 else amount, note) for i, amount, note in drifted]
+    create_database(str(tmp_path), TARGET["server"], rows)
+    create_database(str(tmp_path), to_test_server(TARGET["server"]), drifted)
+    return str(tmp_path)
+
+def run_drift(directory, objects, **options):
+    args = SimpleNamespace(drift_parallelism=4, drift_chunks=8, drift_min_chunk=100, drift_key=None)
+    vars(args).update(options)
+    return asyncio.run(compare_target_drift(TARGET, objects, args, sqlite_connect(directory), SqliteDialect()))
+
+def test_table_drift_reports_only_the_changed_ranges(databases):
+    server, result = run_drift(databases, ["Orders"])
+    assert server == "SRV01"
+    diffs = result["Sales"]["[Orders]"]
+    assert len(diffs) == 2
+    assert diffs[0].startswith("Data drift in OrderID range [") and "Target rows=" in diffs[0]
+    # Each drifted range is narrowed down to at most --drift-min-chunk keys around the change
+    bounds = [tuple(int(v) for v in d.split("[", 1)[1].split(")", 1)[0].split(", ")) for d in diffs]
+    assert bounds[0][0] <= 7000 < bounds[0][1] and bounds[0][1] - bounds[0][0] <= 100
+    assert bounds[1][0] <= 12000 and 12009 < bounds[1][1] and bounds[1][1] - bounds[1][0] <= 100
+
+def test_identical_objects_report_nothing(tmp_path):
+    databases = str(tmp_path)
+    create_database(os.path.join(databases, "same"), "SRV01", [(1, 1, "a")])
+    create_database(os.path.join(databases, "same"), "SRVTST01", [(1, 1, "a")])
+    assert run_drift(os.path.join(databases, "same"), ["Orders"]) == ("SRV01", {})
+
+def test_views_are_compared_by_the_given_key(databases):
+    _, result = run_drift(databases, ["OrderView"], drift_key="OrderID")
+    assert len(result["Sales"]["[OrderView]"]) == 2
+
+def test_view_without_key_is_skipped_per_object(databases):
+    _, result = run_drift(databases, ["OrderView"])
+    assert result["Sales"]["[OrderView]"] == ["Data drift skipped: no single-column integer primary key (use --drift-key)"]
+
+def test_view_mode_requires_a_key_up_front():
+    with pytest.raises(ValueError, match="--drift-key"):
+        check_drift_args(SimpleNamespace(drift_source="view", drift_key=None))
+    with pytest.raises(ValueError, match="--drift-key"):
+        asyncio.run(main_async(SimpleNamespace(drift_source=None, drift_key=None)))
+    check_drift_args(SimpleNamespace(drift_source="view", drift_key="OrderID"))
+    check_drift_args(SimpleNamespace(drift_source="table", drift_key=None))
+
+class ColumnCursor:
+    def __init__(self, columns):
+        self.columns = columns
+
+    def execute(self, sql, params=()):
+        self.params = params
+        return self
+
+    def fetchall(self):
+        return self.columns
+
+def test_sql_server_chunks_hash_every_column_without_xor():
+    cursor = ColumnCursor([("OrderID", "int", False), ("Note", "ntext", False), ("Doc", "xml", False),
+                           ("Blob", "image", False), ("Created", "datetime2", False), ("Node", "hierarchyid", True)])
+    sql = SqlServerDialect().chunk_sql(cursor, "dbo.Orders", "OrderID")
+    assert cursor.params == ("dbo.Orders",)
+    assert "BINARY_CHECKSUM" not in sql and "CHECKSUM_AGG" not in sql
+    assert "HASHBYTES('SHA2_256', CONCAT(" in sql and "SUM(CONVERT(decimal(38, 0)" in sql
+    assert "CONVERT(nvarchar(max), [Note])" in sql and "CONVERT(nvarchar(max), [Doc])" in sql
+    assert "CONVERT(nvarchar(max), CONVERT(varbinary(max), [Blob]), 2)" in sql
+    assert "CONVERT(nvarchar(max), CONVERT(varbinary(max), [Node]), 2)" in sql
+    assert "CONVERT(nvarchar(64), [Created], 126)" in sql
+    assert "FROM [dbo].[Orders]" in sql
+
+def test_cli_reports_missing_view_key_as_usage_error(capsys):
+    with pytest.raises(SystemExit) as exc:
+        data_drift.main(SimpleNamespace(drift_source="view", drift_key=None))
+    assert exc.value.code == 2
+    assert "--drift-key" in capsys.readouterr().err
@@ -0,0 +1,104 @@
+import csv
+import json
+import random
+import threading
+
+import pytest
+
+from checker.sp_checker import compare_definitions
+from utils.definition_variants import VariantRegistry
+from utils.result_writer import NdjsonResultWriter, ResultWriter, convert_ndjson, variants_path
+from utils.sql_cleaner import clean_definition_lines, definition_digest
+
+LOCATIONS = [f"SRV0{i}/Sales" for i in range(1, 7)]
+BASE = "CREATE PROC usp_orders AS SELECT 1"
+VERSIONS = {
+    "SRV01/Sales": "CREATE PROC usp_orders AS SELECT 2",
+    "SRV02/Sales": "CREATE PROC usp_orders AS SELECT 3",
+    "SRV03/Sales": "CREATE PROC usp_orders AS SELECT 2",
+    "SRV04/Sales": "create proc usp_orders as select 3 -- same as SRV02 once normalized",
+    "SRV05/Sales": "CREATE PROC usp_orders AS SELECT 4",
+    "SRV06/Sales": "CREATE PROC usp_orders AS SELECT 2",
+}
+
+def build_report(order, threads=False):
+    registry = VariantRegistry(LOCATIONS)
+    # Versions of one variant differ only in formatting, so they diff alike whichever registers first
+    def register(location):
+        registry.register("[usp_orders]", VERSIONS[location], location, lambda: [f"+ {line}" for line in clean_definition_lines(VERSIONS[location])])
+    if threads:
+        workers = [threading.Thread(target=register, args=(location,)) for location in order]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    else:
+        for location in order:
+            register(location)
+    return registry.report()
+
+def test_variant_ids_do_not_depend_on_completion_order():
+    expected = build_report(LOCATIONS)
+    for seed in range(10):
+        order = LOCATIONS[:]
+        random.Random(seed).shuffle(order)
+        assert build_report(order, threads=seed % 2 == 1) == expected
+
+def test_variants_are_ordered_by_account_list():
+    report = build_report(list(reversed(LOCATIONS)))
+    variants = report["[usp_orders]"]
+    assert [entry["databases"] for entry in variants.values()] == [
+        ["SRV01/Sales", "SRV03/Sales", "SRV06/Sales"],
+        ["SRV02/Sales", "SRV04/Sales"],
+        ["SRV05/Sales"],
+    ]
+    first = f"Variant {definition_digest(VERSIONS['SRV01/Sales'])[:10]}"
+    assert list(variants)[0] == first
+
+def test_findings_reference_the_variant_id():
+    registry = VariantRegistry(LOCATIONS)
+    diffs = compare_definitions(BASE, VERSIONS["SRV01/Sales"], BASE, "Sales", "usp_orders", False, registry, "SRV01/Sales")
+    variant = next(iter(registry.report()["[usp_orders]"]))
+    assert diffs["Sales"]["[usp_orders]"] == ["Definition is different!", f"{variant} (see Variants report)"]
+
+@pytest.mark.parametrize("output_format", ["json", "csv"])
+def test_variants_get_their_own_report(tmp_path, output_format):
+    output = str(tmp_path / f"results.{output_format}")
+    with ResultWriter(output_format, output) as writer:
+        writer.add_results("SRV01", {"Sales": {"[usp_orders]": ["Definition is different!"]}}, "sp")
+        writer.add_variants(build_report(LOCATIONS))
+
+    with open(output, encoding="utf-8") as f:
+        content = f.read()
+    assert "Variants" not in content and "SRV01" in content
+    assert variants_path(output) == str(tmp_path / f"results.variants.{output_format}")
+    with open(variants_path(output), encoding="utf-8", newline="") as f:
+        if output_format == "json":
+            assert json.load(f) == build_report(LOCATIONS)
+        else:
+            rows = list(csv.reader(f))
+            assert rows[0] == ["Object", "Variant", "Databases", "Differences"]
+            assert rows[1][2] == "SRV01/Sales\nSRV03/Sales\nSRV06/Sales"
+            assert len(rows) == 4
+
+def test_no_variants_report_without_variants(tmp_path):
+    output = str(tmp_path / "results.json")
+    with ResultWriter("json", output) as writer:
+        writer.add_variants({})
+    assert not (tmp_path / "results.variants.json").exists()
+
+def test_ndjson_variants_convert_with_the_results(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    output = str(tmp_path / "results.ndjson")
+    with NdjsonResultWriter(output) as writer:
+        writer.add_results("SRV01", {"Sales": {"[usp_orders]": ["Definition is different!"]}}, "sp")
+        writer.add_variants(build_report(LOCATIONS))
+
+    convert_ndjson(output, "json", str(tmp_path / "converted.json"))
+    with open(tmp_path / "converted.variants.json", encoding="utf-8") as f:
+        assert json.load(f) == build_report(LOCATIONS)
+
+    convert_ndjson(output, "parquet", str(tmp_path / "converted.parquet"))
+    assert set(pq.read_table(str(tmp_path / "converted.parquet")).column("server").to_pylist()) == {"SRV01"}
+    rows = pq.read_table(str(tmp_path / "converted.variants.parquet")).to_pylist()
+    assert [row["databases"] for row in rows][1] == ["SRV02/Sales", "SRV04/Sales"]
@@ -0,0 +1,78 @@
+from checker import module_definitions
+from checker.module_definitions import export_target_state
+from sync.deploy_plan import build_target_plan
+from sync.deploy_session import DeploySession, SKIPPED_UNCHANGED, to_deploy_statement
+from tests.fakes import ModuleServer
+from utils.sql_cleaner import definition_digest
+
+BASE_SP = "-- header\nCREATE PROCEDURE dbo.usp_a AS SELECT 2"
+
+def test_deploy_statement_headers():
+    assert to_deploy_statement(BASE_SP, True) == "-- header\nALTER PROCEDURE dbo.usp_a AS SELECT 2"
+    assert to_deploy_statement("alter view v as select 1", False) == "CREATE view v as select 1"
+    assert to_deploy_statement("CREATE OR ALTER VIEW v AS SELECT 1", True) == "CREATE OR ALTER VIEW v AS SELECT 1"
+
+def test_existing_object_is_altered_and_matches_base_afterwards():
+    server = ModuleServer({"dbo.usp_a": ("P", "CREATE PROCEDURE dbo.usp_a AS SELECT 1")})
+    with DeploySession("DATABASE=t", connect=server.connect) as session:
+        results = list(session.deploy([("usp_a", "sp", BASE_SP)]))
+    assert results == [("usp_a", ["Sync successful"])]
+    assert "-- header\nALTER PROCEDURE dbo.usp_a AS SELECT 2" in server.statements
+    assert definition_digest(server.modules["dbo.usp_a"][1]) == definition_digest(BASE_SP)
+
+    # A second sync finds nothing to do
+    with DeploySession("DATABASE=t", connect=server.connect) as session:
+        assert list(session.deploy([("usp_a", "sp", BASE_SP)], skip_unchanged=True)) == [("usp_a", [SKIPPED_UNCHANGED])]
+
+def test_new_object_is_created_only_when_allowed():
+    server = ModuleServer()
+    with DeploySession("DATABASE=t", connect=server.connect) as session:
+        (name, messages), = session.deploy([("usp_a", "sp", BASE_SP)])
+    assert messages[0].startswith("Sync failed") and "dbo.usp_a" not in server.modules
+
+    with DeploySession("DATABASE=t", connect=server.connect) as session:
+        assert list(session.deploy([("usp_a", "sp", BASE_SP)], allow_create_new=True)) == [("usp_a", ["Sync successful"])]
+    assert server.modules["dbo.usp_a"] == ("P", BASE_SP)
+
+def test_failed_batch_rolls_back_the_whole_group():
+    server = ModuleServer({
+        "dbo.a": ("P", "CREATE PROC dbo.a AS SELECT 1"),
+        "dbo.b": ("P", "CREATE PROC dbo.b AS SELECT 1"),
+        "dbo.c": ("P", "CREATE PROC dbo.c AS SELECT 1"),
+    })
+    server.failing.add("dbo.b")
+    items = [(n, "sp", f"CREATE PROC dbo.{n} AS SELECT 2") for n in "abc"]
+    with DeploySession("DATABASE=t", transaction="all", connect=server.connect) as session:
+        results = dict(session.deploy(items))
+    assert results["a"][0].startswith("Rolled back")
+    assert results["b"][0].startswith("Sync failed")
+    assert results["c"][0].startswith("Skipped: transaction rolled back")
+    assert server.modules["dbo.a"][1] == "CREATE PROC dbo.a AS SELECT 1"
+
+def test_plan_uses_alter_for_existing_and_create_for_new_objects():
+    db = {"server": "s", "database": "d"}
+    plan = build_target_plan(
+        db, db, [("usp_a", "sp"), ("usp_b", "sp")],
+        {("usp_a", "sp"): BASE_SP, ("usp_b", "sp"): "CREATE PROC dbo.usp_b AS SELECT 1"},
+        {("usp_a", "sp"): "CREATE PROCEDURE dbo.usp_a AS SELECT 1"},
+        allow_create_new=True,
+    )
+    actions = {a["object"]: a for a in plan["actions"]}
+    assert actions["usp_a"]["action"] == "alter" and "\nALTER PROCEDURE" in actions["usp_a"]["sql"]
+    assert actions["usp_b"]["action"] == "create" and actions["usp_b"]["sql"].startswith("CREATE PROC")
+
+def test_plan_alters_existing_encrypted_modules(monkeypatch):
+    # WITH ENCRYPTION: sys.sql_modules.definition is NULL, so the export has no definition for usp_a
+    server = ModuleServer({"dbo.usp_a": ("P", None)})
+    monkeypatch.setattr(module_definitions.pyodbc, "connect", server.connect)
+    objects = [("usp_a", "sp"), ("usp_b", "sp")]
+    target_defs, existing = export_target_state("DATABASE=t", objects)
+    assert target_defs == {} and existing == {("usp_a", "sp")}
+    assert server.connections == 1
+
+    db = {"server": "s", "database": "d"}
+    base_defs = {("usp_a", "sp"): BASE_SP, ("usp_b", "sp"): "CREATE PROC dbo.usp_b AS SELECT 1"}
+    plan = build_target_plan(db, db, objects, base_defs, target_defs, existing=existing)
+    actions = {a["object"]: a for a in plan["actions"]}
+    assert actions["usp_a"]["action"] == "alter" and "\nALTER PROCEDURE" in actions["usp_a"]["sql"]
+    assert actions["usp_b"]["action"] == "error" and "does not exist" in actions["usp_b"]["reason"]
@@ -0,0 +1,81 @@
+import difflib
+import random
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from utils.diff_engine import DiffSettings, DiffTooLarge, diff_lines, myers_opcodes
+
+def apply_ops(a, b, ops):
+    """
+    Rebuild both sides from an edit script
+    """
+    return [a[i] for tag, i, _ in ops if tag != "+"], [b[j] for tag, _, j in ops if tag != "-"]
+
+@pytest.mark.parametrize("seed", range(20))
+def test_myers_is_a_minimal_edit_script(seed):
+    rng = random.Random(seed)
+    a = [rng.choice("abcde") for _ in range(rng.randint(0, 40))]
+    b = [rng.choice("abcde") for _ in range(rng.randint(0, 40))]
+    ops = myers_opcodes(a, b)
+    assert apply_ops(a, b, ops) == (a, b)
+    matched = sum(size for _, _, size in difflib.SequenceMatcher(None, a, b, autojunk=False).get_matching_blocks())
+    # Myers keeps a longest common subsequence, at least as long as difflib's matching blocks
+    assert sum(tag == "=" for tag, _, _ in ops) >= matched
+
+def test_hunks_show_context_around_changes():
+    base = [f"line {i}" for i in range(20)]
+    target = base[:10] + ["changed"] + base[11:]
+    assert diff_lines(base, target, DiffSettings(context=1)) == ["@@ -10,3 +10,3 @@", "  line 9", "- line 10", "+ changed", "  line 11"]
+
+def test_zero_disables_the_limits():
+    settings = DiffSettings.from_args(SimpleNamespace(diff_max_lines=0, diff_timeout=0, diff_context=None))
+    assert settings.max_lines == 0 and settings.timeout == 0 and settings.context == 3
+    assert DiffSettings.from_args(None) == DiffSettings()
+    base = [f"a{i}" for i in range(50)]
+    target = [f"b{i}" for i in range(50)]
+    assert len(diff_lines(base, target, settings)) == 101
+
+def test_max_lines_summarizes():
+    lines = diff_lines(["a", "b"], ["c", "d"], DiffSettings(max_lines=2))
+    assert lines == ["Diff too large: more than 2 lines changed (limit 2 lines; standard 2 lines, target 2 lines)"]
+
+def test_max_lines_summarizes_context_overflow():
+    # Few edits, but the context lines push the output past the limit
+    base = [f"line {i}" for i in range(10)]
+    target = base[:5] + ["changed"] + base[6:]
+    lines = diff_lines(base, target, DiffSettings(max_lines=3))
+    assert lines == ["Diff too large: 1 lines removed, 1 lines added (limit 3 lines)"]
+
+def test_max_lines_stops_myers_early():
+    base = [f"select a{i} from t{i}" for i in range(20000)]
+    target = [f"select b{i} from u{i}" for i in range(20000)]
+    start = time.perf_counter()
+    lines = diff_lines(base, target, DiffSettings(max_lines=2000, timeout=0))
+    assert time.perf_counter() - start < 2.0
+    assert lines[0].startswith("Diff too large: more than 2000 lines changed")
+
+def test_myers_opcodes_max_edits():
+    with pytest.raises(DiffTooLarge):
+        myers_opcodes(list("abcdef"), list("uvwxyz"), max_edits=11)
+    with pytest.raises(DiffTooLarge):
+        myers_opcodes(list("abc"), list("abcdefgh"), max_edits=4)
+    ops = myers_opcodes(list("abcdef"), list("uvwxyz"), max_edits=12)
+    assert sum(tag != "=" for tag, _, _ in ops) == 12
+
+def test_ndiff_deadline_interrupts_intraline_matching():
+    # ndiff pairs similar lines of a replaced block before yielding anything: O(n * m) line ratios
+    rng = random.Random(1)
+    base = [f"select col{i}, amount * {rng.randint(1, 9)} from dbo.table_{i % 50} where id = {i}" for i in range(800)]
+    target = [line.replace("amount", "amt") for line in base]
+    start = time.perf_counter()
+    lines = diff_lines(base, target, DiffSettings(engine="ndiff", timeout=0.2))
+    assert time.perf_counter() - start < 1.0
+    assert lines == ["Diff skipped: exceeded 0.2s limit (standard 800 lines, target 800 lines)"]
+
+def test_ndiff_output_is_unchanged_within_the_limit():
+    base = ["select a", "from t", "where x = 1"]
+    target = ["select a, b", "from t", "where x = 2"]
+    expected = [line for line in difflib.ndiff(base, target) if line[:2] in ("- ", "+ ")]
+    assert diff_lines(base, target, DiffSettings(engine="ndiff")) == expected
@@ -0,0 +1,57 @@
+from checker import module_definitions
+from checker.module_definitions import export_definitions, pair_listed_rows
+from checker.sp_checker import compare_listed_sp, get_sp_definitions
+from tests.fakes import ModuleServer
+
+LONG_LINE = "    SELECT " + ", ".join(f"o.column_{i}" for i in range(60)) + " FROM dbo.orders o;"
+MODULES = {
+    "dbo.usp_orders": ("P", "CREATE PROCEDURE dbo.usp_orders AS\r\nBEGIN\r\n" + LONG_LINE + "\r\n\t-- keep   spacing\r\nEND\r\n"),
+    "sales.v_orders": ("V", "CREATE VIEW sales.v_orders AS\nSELECT 1 AS one\n"),
+    "dbo.usp_other": ("P", "CREATE PROCEDURE dbo.usp_other AS SELECT 2"),
+}
+
+def helptext(server, name):
+    conn = server.connect("DATABASE=db")
+    return "".join(row[0] for row in conn.cursor().execute("EXEC sp_helptext ?", name).fetchall())
+
+def test_bulk_export_matches_sp_helptext_in_one_query(monkeypatch):
+    server = ModuleServer(MODULES)
+    monkeypatch.setattr(module_definitions.pyodbc, "connect", server.connect)
+    objects = [("usp_orders", "sp"), ("sales.v_orders", "view"), ("missing", "sp")]
+    definitions = export_definitions("DATABASE=db", objects)
+    # #names create + insert + one sys.sql_modules query, over one connection
+    assert (server.connections, server.round_trips) == (1, 3)
+    assert definitions == {
+        ("usp_orders", "sp"): helptext(server, "dbo.usp_orders"),
+        ("sales.v_orders", "view"): helptext(server, "sales.v_orders"),
+    }
+    assert definitions[("usp_orders", "sp")] == MODULES["dbo.usp_orders"][1]
+    assert len(LONG_LINE) > 255
+
+def test_unfiltered_definitions_are_schema_qualified(monkeypatch):
+    server = ModuleServer({"dbo.usp_a": ("P", "SELECT 1"), "sales.usp_a": ("P", "SELECT 2")})
+    monkeypatch.setattr(module_definitions.pyodbc, "connect", server.connect)
+    assert get_sp_definitions("DATABASE=db") == {"dbo.usp_a": "SELECT 1", "sales.usp_a": "SELECT 2"}
+
+def test_bare_names_pair_base_and_target_in_the_same_schema():
+    base = {"dbo.usp_a": "A", "sales.usp_a": "B"}
+    target = [("sales.usp_a", "B2"), ("dbo.usp_a", "A2"), ("hr.usp_b", "C2")]
+    pairs = list(pair_listed_rows(["usp_a", "usp_b"], base, target))
+    assert pairs == [
+        ("usp_a", ("sales.usp_a", "B"), ("sales.usp_a", "B2")),
+        ("usp_b", None, ("hr.usp_b", "C2")),
+    ]
+    # no target in a base schema: the first matching target is compared at the end
+    assert list(pair_listed_rows(["usp_a"], {"dbo.usp_a": "A"}, [("hr.usp_a", "H")])) == [
+        ("usp_a", ("dbo.usp_a", "A"), ("hr.usp_a", "H")),
+    ]
+
+def test_listed_names_warn_only_on_real_case_mismatches():
+    base_db = target_db = {"server": "s", "database": "db"}
+    def warnings(sp, key):
+        result = compare_listed_sp(sp, (key, "SELECT 1"), (key, "SELECT 1"), base_db, target_db, False, None, None)
+        return result.get("db", {})
+    assert warnings("[dbo].[usp_a]", "dbo.usp_a") == {}
+    assert warnings("dbo.usp_a", "dbo.usp_a") == {}
+    assert warnings("usp_a", "sales.usp_a") == {}
+    assert warnings("usp_A", "dbo.usp_a") == {"[usp_A]": ["Warning: Case mismatch for SP 'usp_A' → Base='dbo.usp_a', Target='dbo.usp_a'"]}
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from utils.result_writer import NdjsonResultWriter, convert_ndjson, iter_findings, read_ndjson, save_results
+
+SCHEMA_RESULTS = {
+    "SRV01": {
+        "Sales": {
+            "dbo.Orders": {
+                "Amount": "Type: int vs bigint",
+                "Note": "Missing in target",
+                "Primary Key": "['OrderID'] vs []",
+                "Trigger": {
+                    "trg_audit": ["Definition differs", "- select 1", "+ select 2"],
+                    "trg_old": "Missing in target",
+                },
+            },
+            "[ERROR]": "Login failed for user 'u'.",
+        },
+    },
+    "SRV02": {"Stock": {"dbo.Items": {"Code": "Length: 20 vs 30"}}},
+}
+SP_RESULTS = {"SRV01": {"Sales": {"[usp_orders]": ["Definition is different!", "- a", "+ b"], "[usp_one]": ["Missing in target database"]}}}
+
+def write_ndjson(path, reports, buffer_size=2):
+    with NdjsonResultWriter(str(path), buffer_size=buffer_size) as writer:
+        for results, kind in reports:
+            writer.add_report(results, kind)
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+def test_schema_results_are_written_one_record_per_finding(tmp_path):
+    records = write_ndjson(tmp_path / "r.ndjson", [(SCHEMA_RESULTS, "schema")])
+    assert all(isinstance(r["message"], str) for r in records)
+    assert len(records) == 9
+    by_message = {r["message"]: r for r in records}
+    assert by_message["Type: int vs bigint"]["category"] == "column"
+    assert by_message["Type: int vs bigint"]["element"] == "Amount"
+    assert by_message["['OrderID'] vs []"]["category"] == "pk"
+    assert by_message["+ select 2"]["category"] == "trigger"
+    assert by_message["+ select 2"]["element"] == "trg_audit"
+    assert by_message["+ select 2"]["path"] == ["Trigger", "trg_audit"]
+    assert by_message["Login failed for user 'u'."]["category"] == "error"
+
+@pytest.mark.parametrize("reports", [
+    [(SCHEMA_RESULTS, "schema")],
+    [(SP_RESULTS, "sp")],
+    [(SP_RESULTS, "sp"), ({"SRV01": {"Sales": {"[usp_orders]": ["Row count mismatch"]}}}, "rowcount")],
+])
+def test_read_ndjson_restores_the_json_layout(tmp_path, reports):
+    write_ndjson(tmp_path / "r.ndjson", reports)
+    expected = tmp_path / "expected.json"
+    converted = tmp_path / "converted.json"
+
+    direct = {}
+    for results, _ in reports:
+        for server, databases in results.items():
+            for database, objects in databases.items():
+                for name, diffs in objects.items():
+                    target = direct.setdefault(server, {}).setdefault(database, {})
+                    if isinstance(diffs, list) and name in target:
+                        target[name] = target[name] + diffs
+                    else:
+                        target[name] = diffs
+    assert read_ndjson(str(tmp_path / "r.ndjson")) == direct
+
+    save_results(direct, "json", str(expected))
+    convert_ndjson(str(tmp_path / "r.ndjson"), "json", str(converted))
+    assert converted.read_text(encoding="utf-8") == expected.read_text(encoding="utf-8")
+
+def test_csv_conversion_matches_direct_output(tmp_path):
+    write_ndjson(tmp_path / "r.ndjson", [(SP_RESULTS, "sp")])
+    save_results(SP_RESULTS, "csv", str(tmp_path / "expected.csv"))
+    convert_ndjson(str(tmp_path / "r.ndjson"), "csv", str(tmp_path / "converted.csv"))
+    assert (tmp_path / "converted.csv").read_bytes() == (tmp_path / "expected.csv").read_bytes()
+
+def test_parquet_conversion_keeps_categories(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    write_ndjson(tmp_path / "r.ndjson", [(SCHEMA_RESULTS, "schema")])
+    convert_ndjson(str(tmp_path / "r.ndjson"), "parquet", str(tmp_path / "r.parquet"))
+    rows = pq.read_table(str(tmp_path / "r.parquet")).to_pylist()
+    expected = [
+        finding
+        for server, databases in SCHEMA_RESULTS.items()
+        for database, objects in databases.items()
+        for name, diffs in objects.items()
+        for finding in iter_findings(name, diffs, "schema")
+    ]
+    assert [(r["category"], r["element"], r["detail"]) for r in rows] == expected
@@ -0,0 +1,59 @@
+import pytest
+
+from checker import schema_utils
+from checker.schema_utils import CATALOG_PARTS, get_catalog_snapshot, load_table_filter, qualify_table_name
+from tests.fakes import FakeError, FakeServer
+
+class TableFilterServer(FakeServer):
+    """
+    #tables with a case-insensitive primary key, as under the usual *_CI_AS database collation
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.on(r"CREATE TABLE #tables", self._create)
+        self.on(r"INSERT INTO #tables", self._insert)
+        self.on(r"UPDATE f SET object_id", lambda conn, sql, params: [])
+
+    def _create(self, conn, sql, params):
+        conn.temp["tables"] = {}
+        return []
+
+    def _insert(self, conn, sql, params):
+        key = tuple(part.casefold() for part in params)
+        if key in conn.temp["tables"]:
+            raise FakeError(f"Violation of PRIMARY KEY constraint. The duplicate key value is {params}.")
+        conn.temp["tables"][key] = params
+        return []
+
+def test_table_names_differing_only_in_case_are_loaded_once():
+    server = TableFilterServer()
+    conn = server.connect("DATABASE=Sales")
+    load_table_filter(conn.cursor(), ["dbo.Orders", "dbo.orders", "[DBO].[ORDERS]", "Items", "sales.Items"])
+    assert list(conn.temp["tables"].values()) == [("dbo", "Orders"), ("dbo", "Items"), ("sales", "Items")]
+
+def test_no_filter_for_whole_database():
+    server = TableFilterServer()
+    load_table_filter(server.connect("DATABASE=Sales").cursor(), None)
+    assert server.round_trips == 0
+
+@pytest.mark.parametrize("name, expected", [
+    ("Orders", "dbo.Orders"),
+    ("[sales].[Orders]", "sales.Orders"),
+    (" db.sales.Orders ", "sales.Orders"),
+])
+def test_qualify_table_name(name, expected):
+    assert qualify_table_name(name) == expected
+
+@pytest.mark.parametrize("tables, round_trips", [
+    # CREATE #tables, INSERT (executemany), UPDATE object_id, then the six queries in one batch
+    (["dbo.Orders", "dbo.Items"], 4),
+    (None, 1),
+])
+def test_catalog_snapshot_uses_one_connection_and_one_batch(monkeypatch, tables, round_trips):
+    server = TableFilterServer()
+    server.on(r"SET NOCOUNT ON", lambda conn, sql, params: [[] for _ in CATALOG_PARTS])
+    monkeypatch.setattr(schema_utils.pyodbc, "connect", server.connect)
+    snapshot = get_catalog_snapshot("DATABASE=Sales", tables)
+    assert len(snapshot) == len(CATALOG_PARTS) and not any(snapshot)
+    assert (server.connections, server.round_trips) == (1, round_trips)
@@ -0,0 +1,30 @@
+import gzip
+import json
+
+import pytest
+
+from sync.deploy_plan import snapshot_definitions
+from utils.snapshot import load_snapshot, save_snapshot, snapshot_path
+
+DB = {"server": "SRV01", "database": "Sales"}
+
+def test_same_name_in_several_schemas_round_trips(tmp_path):
+    definitions = {"dbo.usp_orders": "CREATE PROC dbo.usp_orders AS SELECT 1", "sales.usp_orders": "CREATE PROC sales.usp_orders AS SELECT 2"}
+    save_snapshot(str(tmp_path), DB, "sp", definitions)
+    assert load_snapshot(str(tmp_path), DB, "sp") == definitions
+    objects = [("sales.usp_orders", "sp"), ("[dbo].[usp_orders]", "sp")]
+    assert snapshot_definitions(str(tmp_path), DB, objects) == {
+        ("sales.usp_orders", "sp"): "CREATE PROC sales.usp_orders AS SELECT 2",
+        ("[dbo].[usp_orders]", "sp"): "CREATE PROC dbo.usp_orders AS SELECT 1",
+    }
+
+def test_snapshot_of_an_older_version_is_rejected_and_replaced(tmp_path):
+    path = snapshot_path(str(tmp_path), DB)
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump({"version": 1, "sp": {"usp_orders": "CREATE PROC usp_orders AS SELECT 1"}}, f)
+    with pytest.raises(ValueError, match="re-create it with --save-snapshot"):
+        load_snapshot(str(tmp_path), DB, "sp")
+    save_snapshot(str(tmp_path), DB, "view", {"dbo.v_orders": "CREATE VIEW dbo.v_orders AS SELECT 1"})
+    assert load_snapshot(str(tmp_path), DB, "view") == {"dbo.v_orders": "CREATE VIEW dbo.v_orders AS SELECT 1"}
+    with pytest.raises(ValueError, match="no 'sp' section"):
+        load_snapshot(str(tmp_path), DB, "sp")
@@ -0,0 +1,59 @@
+import pytest
+
+from utils.sql_cleaner import NormalizationCache, clean_definition_lines, definitions_equal, remove_sql_comments
+
+@pytest.mark.parametrize("sql, expected", [
+    # Comment markers inside string literals, including doubled quotes
+    ("SELECT 'http://x--y' AS url", "SELECT 'http://x--y' AS url"),
+    ("SELECT 'a /* b */ c'", "SELECT 'a /* b */ c'"),
+    ("SELECT 'it''s -- not a comment' -- comment", "SELECT 'it''s -- not a comment'"),
+    ("SELECT N'x' + '' -- c", "SELECT N'x' + ''"),
+    # Bracketed and quoted identifiers
+    ("SELECT [col--1], [a]]/*b] FROM t", "SELECT [col--1], [a]]/*b] FROM t"),
+    ('SELECT "q/*uoted" FROM t -- c', 'SELECT "q/*uoted" FROM t'),
+    ('SELECT "a""--b"', 'SELECT "a""--b"'),
+    # Line and block comments
+    ("SELECT 1 -- trailing\nFROM t", "SELECT 1 \nFROM t"),
+    ("SELECT /* inline */ 1", "SELECT  1"),
+    ("SELECT 1 /* multi\nline */ FROM t", "SELECT 1  FROM t"),
+    # Nested block comments keep their depth, including literal-like text inside them
+    ("a /* x /* y */ still comment */ b", "a  b"),
+    ("a /* it's */ b", "a  b"),
+    ("a /* -- */ b", "a  b"),
+    ("a -- /* \nb", "a \nb"),
+    # Unterminated constructs run to the end
+    ("a /* open", "a"),
+    ("SELECT 'open -- literal", "SELECT 'open -- literal"),
+    # Operators that only look like comment starts
+    ("SELECT 4/2, 3-1, a*/b", "SELECT 4/2, 3-1, a*/b"),
+    # Quotes and escapes inside identifiers must not flip the string-literal parity
+    ("SELECT [it's] -- c\nFROM t -- d", "SELECT [it's] \nFROM t"),
+    ("SELECT [a]]'] -- c", "SELECT [a]]']"),
+    ("SELECT [a--b], 'x' -- c", "SELECT [a--b], 'x'"),
+    ("SELECT 'a' + 'b--' -- c\n/* d */ 'e /* f' -- g", "SELECT 'a' + 'b--' \n 'e /* f'"),
+])
+def test_remove_sql_comments(sql, expected):
+    assert remove_sql_comments(sql) == expected
+
+@pytest.mark.parametrize("depth", [1, 8, 9, 50, 500])
+def test_arbitrarily_deep_nested_comments(depth):
+    sql = "a " + "/* " * depth + "*/ " * depth + "b"
+    assert remove_sql_comments(sql) == "a  b"
+    assert remove_sql_comments("a " + "/* " * depth + "*/ " * (depth - 1) + "b") == "a"
+
+def test_clean_definition_lines_folds_case_and_drops_blank_lines():
+    sql = "CREATE PROC [dbo].[P]\n  /* header\n  */\nAS\n\tSELECT 'Mixed--Case'  -- note\n"
+    assert clean_definition_lines(sql) == ["create proc [dbo].[p]", "as", "select 'mixed--case'"]
+
+def test_definitions_equal_ignores_comments_whitespace_and_case():
+    assert definitions_equal("SELECT 1 -- a\nFROM t", "select 1\n\n  from T /* b */")
+    assert not definitions_equal("SELECT '--a'", "SELECT ''")
+
+def test_cache_is_bounded_and_counts_hits():
+    entry = NormalizationCache()._entry_size(("select 0 from t",))
+    cache = NormalizationCache(max_bytes=entry * 5)
+    for i in range(20):
+        cache.get(f"SELECT {i} FROM t")
+    assert cache.get("SELECT 19 FROM t") == cache.get("select 19 from T -- x")
+    stats = cache.stats()
+    assert stats["bytes"] <= entry * 5 and stats["evictions"] > 0 and stats["hits"] == 1
@@ -0,0 +1,74 @@
+import re
+
+import pytest
+
+from checker import view_checker
+from checker.view_checker import compare_row_counts, estimate_view_row_counts, get_view_row_counts
+from tests.fakes import FakeError, FakeServer, ModuleServer
+
+_COUNT = re.compile(r"SELECT COUNT_BIG\(\*\) FROM \[dbo\]\.\[(\w+)\]")
+
+class CountServer(FakeServer):
+    """
+    Answers SELECT COUNT_BIG(*) batches; views in `failing` raise when their result set is reached
+    """
+
+    def __init__(self, rows, failing=()):
+        super().__init__()
+        self.rows = rows
+        self.failing = set(failing)
+        self.on(r"COUNT_BIG", self._count)
+
+    def _count(self, conn, sql, params):
+        return [
+            FakeError(f"Invalid object name '{view}'.") if view in self.failing else [(self.rows[view],)]
+            for view in _COUNT.findall(sql)
+        ]
+
+@pytest.fixture
+def use_server(monkeypatch):
+    def use(server):
+        monkeypatch.setattr(view_checker.pyodbc, "connect", server.connect)
+        return server
+    return use
+
+def counted(server, view):
+    return sum(f"[{view}]" in sql for sql in server.statements)
+
+def test_exact_counts_one_round_trip_per_batch(use_server):
+    server = use_server(CountServer({f"v{i}": i for i in range(5)}))
+    counts = get_view_row_counts("DATABASE=db", [f"dbo.v{i}" for i in range(5)], batch_size=2)
+    assert counts == {f"dbo.v{i}": i for i in range(5)}
+    assert server.round_trips == 3
+
+def test_failed_batch_retries_only_uncounted_views(use_server):
+    server = use_server(CountServer({"a": 1, "b": 2, "c": 3, "d": 4}, failing={"c"}))
+    counts = get_view_row_counts("DATABASE=db", ["dbo.a", "dbo.b", "dbo.c", "dbo.d"], batch_size=4)
+    assert counts["dbo.a"] == 1 and counts["dbo.b"] == 2 and counts["dbo.d"] == 4
+    assert counts["dbo.c"].startswith("Error: Invalid object name")
+    # a and b were counted by the batch before c failed: they are not counted again
+    assert [counted(server, v) for v in "abcd"] == [1, 1, 2, 2]
+
+def estimate_server(rows):
+    server = ModuleServer()
+    server.on(r"FROM sys\.views v", lambda conn, sql, params: [rows])
+    return server
+
+def test_estimate_counts_each_referenced_object_once(use_server):
+    server = use_server(estimate_server([("dbo.Orders", 120)]))
+    assert estimate_view_row_counts("DATABASE=db", ["dbo.Orders"]) == {"dbo.Orders": 120}
+    sql = server.statements[-1]
+    assert sql.count("d.referenced_minor_id = 0") == 2
+    assert "JOIN sys.views nested" in sql
+
+def test_views_without_table_statistics_are_skipped(use_server):
+    use_server(estimate_server([("dbo.Orders", 120)]))
+    target = estimate_view_row_counts("DATABASE=db", ["dbo.Orders", "dbo.Remote"])
+    assert target == {"dbo.Orders": 120, "dbo.Remote": None}
+    test = {"dbo.Orders": 100, "dbo.Remote": None}
+    diffs = compare_row_counts(target, test, ["dbo.Orders", "dbo.Remote"], "estimate", 0.05)
+    assert diffs == {"[dbo.Orders]": ["Row count mismatch (estimated): Target=120, Test=100"]}
+
+def test_query_errors_are_still_reported():
+    diffs = compare_row_counts({"v": "Error: timeout"}, {"v": 3}, ["v"])
+    assert diffs == {"[v]": ["Query error: Target=Error: timeout, Test=3"]}
@@ -0,0 +1,150 @@
+"""
+compare_pipeline.py
+
+比對流程的 producer / consumer 管線：
+    fetch（各目標並行讀取）→ 有界佇列 → 比對 worker（執行緒中 diff）→ 有界佇列 → 寫出
+每個目標的目錄一讀到就開始比對、比對完就交給寫出，不必等最慢的目標回應；
+同時讀取或等待比對的目錄最多為 佇列上限 + worker 數，記憶體不會隨目標數增加。
+結束時輸出 fetch 與比對重疊時間等統計，用來確認讀取延遲被比對掩蓋了多少。
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+DEFAULT_COMPARE_WORKERS = 8
+DEFAULT_QUEUE_SIZE = 8
+
+@dataclass
+class CompareJob:
+    """
+    一個目標的比對工作
+
+    Attributes:
+        db (dict): 目標連線資訊（需含 server、database）
+        kind (str): 結果種類（寫出時記錄，如 'schema'、'sp'、'view'）
+        fetch: 無參數 async 函式，回傳目標目錄
+        compare: compare(目錄) -> {database: {object: [differences]}}，在執行緒中執行
+    """
+    db: dict
+    kind: str
+    fetch: Callable[[], Awaitable[Any]]
+    compare: Callable[[Any], dict]
+
+    def error_result(self, error: Exception) -> dict:
+        return {self.db["database"]: {"[ERROR]": str(error)}}
+
+class PipelineStats:
+    """
+    記錄各階段耗時：每個 fetch 的完成時間、每次比對的起訖、寫出耗時與佇列最大深度
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.fetch_ends = []
+        self.compares = []
+        self.write_time = 0.0
+        self.max_depth = 0
+
+    def report(self) -> str:
+        """
+        統計摘要；overlapped 為最後一個 fetch 完成前就已進行的比對時間
+        """
+        finished = self.finished or time.perf_counter()
+        fetch_end = max(self.fetch_ends, default=self.started)
+        fetch_wall = fetch_end - self.started
+        compare_busy = sum(end - start for start, end in self.compares)
+        overlapped = sum(max(0.0, min(end, fetch_end) - start) for start, end in self.compares)
+        ratio = overlapped / compare_busy if compare_busy else 0.0
+        return (
+            f"[INFO] Pipeline: {len(self.fetch_ends)} fetches, fetch {fetch_wall:.2f}s, "
+            f"compare {compare_busy:.2f}s ({overlapped:.2f}s / {ratio:.1%} overlapped with fetches), "
+            f"write {self.write_time:.2f}s, wall {finished - self.started:.2f}s, max queue depth {self.max_depth}"
+        )
+
+def pipeline_settings(args=None) -> tuple[int, int]:
+    """
+    由 CLI 參數取得 (比對 worker 數, 佇列上限)
+    """
+    workers = getattr(args, "compare_workers", None) or DEFAULT_COMPARE_WORKERS
+    queue_size = getattr(args, "pipeline_queue_size", None) or DEFAULT_QUEUE_SIZE
+    return max(1, workers), max(1, queue_size)
+
+async def run_compare_pipeline(jobs: list, writer, args=None) -> PipelineStats:
+    """
+    執行所有比對工作並將結果交給 writer.add_results
+
+    fetch 或比對失敗的目標以 {"[ERROR]": 錯誤訊息} 寫出，不影響其他目標。
+
+    Args:
+        jobs (list[CompareJob]): 比對工作
+        writer: ResultWriter（僅在事件迴圈中呼叫）
+        args: CLI 參數（--compare-workers、--pipeline-queue-size）
+
+    Returns:
+        PipelineStats: 各階段統計
+    """
+    workers, queue_size = pipeline_settings(args)
+    stats = PipelineStats()
+    fetched = asyncio.Queue(maxsize=queue_size)
+    compared = asyncio.Queue(maxsize=queue_size)
+    loop = asyncio.get_running_loop()
+
+    # 比對完成才釋放，讀取中、排隊中與比對中的目錄合計不超過 slots
+    slots = asyncio.Semaphore(queue_size + workers)
+
+    async def produce(job):
+        await slots.acquire()
+        try:
+            catalog = await job.fetch()
+        except Exception as e:
+            catalog = e
+        stats.fetch_ends.append(time.perf_counter())
+        await fetched.put((job, catalog))
+        stats.max_depth = max(stats.max_depth, fetched.qsize())
+
+    async def compare_worker():
+        while (item := await fetched.get()) is not None:
+            job, catalog = item
+            start = time.perf_counter()
+            if isinstance(catalog, Exception):
+                result = job.error_result(catalog)
+            else:
+                try:
+                    result = await loop.run_in_executor(None, job.compare, catalog)
+                except Exception as e:
+                    result = job.error_result(e)
+            stats.compares.append((start, time.perf_counter()))
+            del item, catalog
+            slots.release()
+            await compared.put((job, result))
+
+    # 寫出失敗時仍持續取出佇列，避免比對 worker 卡在 put；錯誤於最後拋出
+    write_error = None
+    async def write_stage():
+        nonlocal write_error
+        while (item := await compared.get()) is not None:
+            job, result = item
+            if write_error is not None:
+                continue
+            start = time.perf_counter()
+            try:
+                writer.add_results(job.db["server"], result, job.kind)
+            except Exception as e:
+                write_error = e
+            stats.write_time += time.perf_counter() - start
+
+    write_task = asyncio.create_task(write_stage())
+    compare_tasks = [asyncio.create_task(compare_worker()) for _ in range(min(workers, len(jobs)) or 1)]
+    await asyncio.gather(*[produce(job) for job in jobs])
+    for _ in compare_tasks:
+        await fetched.put(None)
+    await asyncio.gather(*compare_tasks)
+    await compared.put(None)
+    await write_task
+    stats.finished = time.perf_counter()
+    if write_error is not None:
+        raise write_error
+    return stats
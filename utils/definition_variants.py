@@ -0,0 +1,76 @@
+"""
+definition_variants.py
+
+將同一物件在各目標資料庫中的不同版本（依標準化定義 digest）分群，
+每個不同版本只計算一次 diff，並記錄共用該版本的資料庫。
+版本摘要為獨立的報表區段（見 result_writer.save_variants），不混入各 server 的比對結果。
+"""
+
+import threading
+from collections import defaultdict
+
+from utils.sql_cleaner import definition_digest
+
+VARIANTS_SECTION = "Variants"
+VARIANT_ID_LENGTH = 10
+
+class VariantRegistry:
+    """
+    記錄每個物件與基準不同的版本：
+        {物件名稱: {digest: {"id": 版本代號, "diff": diff 內容, "databases": [server/database, ...]}}}
+    版本代號取自標準化定義的 digest 前 VARIANT_ID_LENGTH 碼，與各目標比對完成的先後無關；
+    報表中的版本與資料庫依 locations（帳號清單中的目標順序）排列。
+    """
+
+    def __init__(self, locations=None):
+        self._variants = defaultdict(dict)
+        self._order = {location: i for i, location in enumerate(locations or [])}
+        self._lock = threading.Lock()
+
+    def register(self, object_name: str, target_def: str, location: str, make_diff) -> dict:
+        """
+        登記一個與基準不同的目標定義；同一版本第一次出現時才呼叫 make_diff 計算 diff
+
+        Args:
+            object_name (str): 物件名稱（報表中的 key，如 "[sp_name]"）
+            target_def (str): 目標資料庫的原始定義
+            location (str): 目標位置（server/database）
+            make_diff: 無參數函式，回傳 diff 行（list[str]）
+
+        Returns:
+            dict: 該版本的登記內容（含 id、diff、databases）
+        """
+        digest = definition_digest(target_def)
+        with self._lock:
+            entry = self._variants[object_name].get(digest)
+        # diff 在鎖外計算，比對可在多個執行緒同時進行；同一版本同時出現時以先登記者為準
+        diff = make_diff() if entry is None else None
+        with self._lock:
+            variants = self._variants[object_name]
+            entry = variants.get(digest)
+            if entry is None:
+                entry = {"id": digest[:VARIANT_ID_LENGTH], "diff": diff, "databases": []}
+                variants[digest] = entry
+            entry["databases"].append(location)
+        return entry
+
+    def _position(self, location: str) -> tuple:
+        return self._order.get(location, len(self._order)), location
+
+    def report(self) -> dict:
+        """
+        產生版本摘要（交給 ResultWriter.add_variants）：
+            {物件名稱: {"Variant <代號>": {"databases": [...], "diff": [...]}}}
+        物件依名稱排列，版本依其第一個資料庫在帳號清單中的順序排列
+        """
+        report = {}
+        for object_name, variants in sorted(self._variants.items()):
+            entries = []
+            for entry in variants.values():
+                databases = sorted(entry["databases"], key=self._position)
+                entries.append((self._position(databases[0]), entry["id"], databases, entry["diff"] or []))
+            report[object_name] = {
+                f"Variant {variant_id}": {"databases": databases, "diff": diff}
+                for _, variant_id, databases, diff in sorted(entries)
+            }
+        return report
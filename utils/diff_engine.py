@@ -0,0 +1,233 @@
+"""
+diff_engine.py
+
+定義內容的逐行 diff 引擎，供 --show-content 使用。
+預設為 Myers 演算法（O(ND)，先去除共同前後綴），輸出含上下文的 hunk；
+亦可切換回 difflib.ndiff。每個物件的 diff 有行數與時間上限，
+超過上限時改為輸出摘要，避免超大定義拖慢整體比對。
+"""
+
+import difflib
+import time
+from array import array
+from dataclasses import dataclass
+
+DIFF_ENGINES = ("myers", "ndiff")
+
+class DiffLimitExceeded(Exception):
+    """diff 超過時間上限"""
+
+class DiffTooLarge(Exception):
+    """編輯數超過行數上限"""
+
+@dataclass(frozen=True)
+class DiffSettings:
+    engine: str = "myers"
+    context: int = 3
+    max_lines: int = 2000
+    timeout: float = 2.0
+
+    @classmethod
+    def from_args(cls, args) -> "DiffSettings":
+        """
+        由 CLI 參數建立設定（未提供的參數使用預設值；max_lines、timeout 為 0 代表不限制）
+        """
+        defaults = cls()
+        context = getattr(args, "diff_context", None)
+        max_lines = getattr(args, "diff_max_lines", None)
+        timeout = getattr(args, "diff_timeout", None)
+        return cls(
+            engine=getattr(args, "diff_engine", None) or defaults.engine,
+            context=defaults.context if context is None else context,
+            max_lines=defaults.max_lines if max_lines is None else max_lines,
+            timeout=defaults.timeout if timeout is None else timeout,
+        )
+
+class _DeadlineLines(list):
+    """
+    以索引取行時檢查期限的 list。
+    difflib 的行配對與 ndiff 的行內比對（_fancy_replace）都在迴圈中以索引取行，
+    兩次產出之間可能計算很久，因此在取行時檢查（每 256 次查一次時間），超過期限即中止。
+    """
+
+    def __init__(self, lines, deadline):
+        super().__init__(lines)
+        self.deadline = deadline
+        self.reads = 0
+
+    def __getitem__(self, index):
+        self.reads += 1
+        if not self.reads & 0xFF and time.monotonic() > self.deadline:
+            raise DiffLimitExceeded()
+        return super().__getitem__(index)
+
+def _myers_middle(a, b, deadline, max_edits=None):
+    """
+    Myers O(ND) 最短編輯腳本，回傳 [(tag, i, j)]，tag 為 '=', '-', '+'
+
+    編輯數（D）超過 max_edits 時立即拋出 DiffTooLarge：diff 行數至少為 D，不必算完再摘要。
+    """
+    n, m = len(a), len(b)
+    if max_edits is not None and abs(n - m) > max_edits:
+        raise DiffTooLarge()
+    offset = n + m + 1
+    v = [0] * (2 * offset + 1)
+    # trace[d] 只保存第 d 輪算出的 k = -d, -d+2, ..., d（回溯只會讀到這些），
+    # 以 array('i') 存放，記憶體約為 D^2 / 2 個 4 bytes 整數
+    trace = []
+
+    for d in range(n + m + 1):
+        if max_edits is not None and d > max_edits:
+            raise DiffTooLarge()
+        if deadline is not None and time.monotonic() > deadline:
+            raise DiffLimitExceeded()
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m, d)
+        trace.append(array("i", v[offset - d: offset + d + 1: 2]))
+    return []
+
+def _backtrack(trace, n, m, edits):
+    # trace[d][(k + d) // 2] 為第 d 輪在對角線 k 上到達的 x
+    ops = []
+    x, y = n, m
+    for d in range(edits, 0, -1):
+        previous = trace[d - 1]
+        k = x - y
+        if k == -d or (k != d and previous[(k - 1 + d - 1) // 2] < previous[(k + 1 + d - 1) // 2]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = previous[(prev_k + d - 1) // 2]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            ops.append(("=", x, y))
+        if x == prev_x:
+            ops.append(("+", None, y - 1))
+        else:
+            ops.append(("-", x - 1, None))
+        x, y = prev_x, prev_y
+    while x > 0:
+        x -= 1
+        y -= 1
+        ops.append(("=", x, y))
+    ops.reverse()
+    return ops
+
+def myers_opcodes(a, b, deadline=None, max_edits=None):
+    """
+    計算兩個行序列的編輯腳本（先去除共同前後綴以縮小問題）
+
+    Args:
+        a (list[str]): 基準行
+        b (list[str]): 目標行
+        deadline (float | None): time.monotonic() 期限，超過時拋出 DiffLimitExceeded
+        max_edits (int | None): 編輯數上限（去除共同前後綴後），超過時拋出 DiffTooLarge
+
+    Returns:
+        list[tuple]: [(tag, i, j)]，tag 為 '='（相同）、'-'（僅基準）、'+'（僅目標）
+    """
+    prefix = 0
+    limit = min(len(a), len(b))
+    while prefix < limit and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and a[len(a) - 1 - suffix] == b[len(b) - 1 - suffix]:
+        suffix += 1
+
+    middle = _myers_middle(a[prefix:len(a) - suffix], b[prefix:len(b) - suffix], deadline, max_edits)
+    ops = [("=", i, i) for i in range(prefix)]
+    for tag, i, j in middle:
+        ops.append((tag, None if i is None else i + prefix, None if j is None else j + prefix))
+    ops += [("=", len(a) - suffix + i, len(b) - suffix + i) for i in range(suffix)]
+    return ops
+
+def format_hunks(a, b, ops, context=3):
+    """
+    將編輯腳本整理為含上下文的 hunk（格式同 unified diff：@@ -起始,行數 +起始,行數 @@）
+    """
+    changes = [idx for idx, op in enumerate(ops) if op[0] != "="]
+    if not changes:
+        return []
+
+    # 相鄰變更之間的相同行不超過 2 * context 時合併為同一個 hunk
+    groups = []
+    start = changes[0]
+    end = changes[0]
+    for idx in changes[1:]:
+        if idx - end > 2 * context:
+            groups.append((start, end))
+            start = idx
+        end = idx
+    groups.append((start, end))
+
+    lines = []
+    for start, end in groups:
+        lo = max(0, start - context)
+        hi = min(len(ops), end + context + 1)
+        hunk = ops[lo:hi]
+        a_idx = [i for _, i, _ in hunk if i is not None]
+        b_idx = [j for _, _, j in hunk if j is not None]
+        a_start = a_idx[0] + 1 if a_idx else 0
+        b_start = b_idx[0] + 1 if b_idx else 0
+        lines.append(f"@@ -{a_start},{len(a_idx)} +{b_start},{len(b_idx)} @@")
+        for tag, i, j in hunk:
+            if tag == "=":
+                lines.append(f"  {a[i]}")
+            elif tag == "-":
+                lines.append(f"- {a[i]}")
+            else:
+                lines.append(f"+ {b[j]}")
+    return lines
+
+def diff_lines(base_lines, target_lines, settings=None):
+    """
+    比較兩份已清理的定義行，依設定的引擎輸出 diff；超過上限時回傳摘要
+
+    Args:
+        base_lines (list[str]): 基準定義（clean_definition_lines 結果）
+        target_lines (list[str]): 目標定義
+        settings (DiffSettings | None): 引擎與上限設定
+
+    Returns:
+        list[str]: diff 行或摘要
+    """
+    settings = settings or DiffSettings()
+    deadline = time.monotonic() + settings.timeout if settings.timeout else None
+
+    try:
+        if settings.engine == "ndiff":
+            lines = []
+            if deadline is not None:
+                base_lines = _DeadlineLines(base_lines, deadline)
+                target_lines = _DeadlineLines(target_lines, deadline)
+            for line in difflib.ndiff(base_lines, target_lines):
+                if line.startswith("- ") or line.startswith("+ "):
+                    lines.append(line)
+                if deadline is not None and time.monotonic() > deadline:
+                    raise DiffLimitExceeded()
+        else:
+            ops = myers_opcodes(base_lines, target_lines, deadline, settings.max_lines or None)
+            lines = format_hunks(base_lines, target_lines, ops, settings.context)
+    except DiffLimitExceeded:
+        return [f"Diff skipped: exceeded {settings.timeout}s limit (standard {len(base_lines)} lines, target {len(target_lines)} lines)"]
+    except DiffTooLarge:
+        # 每個編輯至少輸出一行，編輯數超過上限時 diff 必定超過行數上限
+        return [f"Diff too large: more than {settings.max_lines} lines changed (limit {settings.max_lines} lines; standard {len(base_lines)} lines, target {len(target_lines)} lines)"]
+
+    if settings.max_lines and len(lines) > settings.max_lines:
+        removed = sum(1 for line in lines if line.startswith("- "))
+        added = sum(1 for line in lines if line.startswith("+ "))
+        return [f"Diff too large: {removed} lines removed, {added} lines added (limit {settings.max_lines} lines)"]
+    return lines
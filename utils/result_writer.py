@@ -1,11 +1,36 @@
 """
 result_writer.py
 
-負責將比對結果輸出至 console、JSON 或 CSV 檔案。
+負責將比對結果輸出至 console、JSON、CSV、NDJSON 或 Parquet 檔案。
+NDJSON 為串流格式：每個目標比對完成就寫出，每行一筆發現
+（server、database、object、kind、category、element、message；結構比對結果另以 path 記錄所在的鍵），
+可再用 convert_ndjson 轉回 JSON / CSV 格式：
+
+    python -m utils.result_writer results.ndjson --format csv --output results.csv
+
+Parquet 為欄式格式（需安裝 pyarrow）：每個發現一列，分類（category）為
+column、pk、fk、index、trigger、unique、definition、rowcount 等，依 row group 分批寫出。
+
+SP / View 定義的版本摘要是獨立的報表區段：寫到同格式的 <檔名>.variants.<副檔名>
+（console 則另印一段），不會以假的 server 混入比對結果。
 """
 
+import argparse
 import json
 import csv
+import os
+import time
+from collections import defaultdict
+
+RESULT_FORMATS = ("json", "csv", "ndjson", "parquet")
+DEFAULT_BUFFER_SIZE = 1000
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_ROW_GROUP_SIZE = 100_000
+
+# 結構比對結果中的鍵對應的分類；其他鍵為欄位名稱
+SCHEMA_CATEGORIES = {"Primary Key": "pk", "Foreign Key": "fk", "Index": "index", "Trigger": "trigger", "Unique": "unique"}
+# 其他結果依 kind 分類；未列出的 kind（如 drift、sync）直接作為分類
+KIND_CATEGORIES = {"sp": "definition", "view": "definition", "rowcount": "rowcount"}
 
 def save_results(results: dict, output_format: str = "console", output_file: str = None):
     """
@@ -13,10 +38,18 @@ def save_results(results: dict, output_format: str = "console", output_file: str
 
     Args:
         results (dict): 分層格式為 {server: {database: {object: [differences]}}}
-        output_format (str): 'json', 'csv', 或 'console'
+        output_format (str): 'json', 'csv', 'ndjson', 'parquet', 或 'console'
         output_file (str): 輸出檔名，若為 None 則印出於 console
     """
-    if output_format == "json":
+    if output_format == "ndjson":
+        with NdjsonResultWriter(output_file) as writer:
+            writer.add_report(results)
+
+    elif output_format == "parquet":
+        with ParquetResultWriter(output_file) as writer:
+            writer.add_report(results)
+
+    elif output_format == "json":
         with open(output_file, "w", encoding="utf-8") as f:
             json.dump(results, f, indent=4, ensure_ascii=False)
 
@@ -40,3 +73,361 @@ def save_results(results: dict, output_format: str = "console", output_file: str
                     lines = diffs if isinstance(diffs, list) else [diffs]
                     for diff in lines:
                         print(f"    {diff}")
+
+def variants_path(output_file: str) -> str:
+    """
+    版本摘要的檔名：results.json -> results.variants.json
+    """
+    root, ext = os.path.splitext(output_file)
+    return f"{root}.variants{ext}"
+
+def iter_variants(variants: dict):
+    """
+    將版本摘要展開為 (object, variant, databases, diff)，每個版本一筆
+    """
+    for name, entries in variants.items():
+        for variant, entry in entries.items():
+            yield name, variant, entry["databases"], entry["diff"]
+
+def save_variants(variants: dict, output_format: str = "console", output_file: str = None):
+    """
+    儲存定義版本摘要（VariantRegistry.report()），與比對結果分開
+
+    Args:
+        variants (dict): {object: {"Variant <id>": {"databases": [...], "diff": [...]}}}
+        output_format (str): 'json', 'csv', 'ndjson', 'parquet', 或 'console'
+        output_file (str): 比對結果的檔名；版本摘要寫到 variants_path(output_file)，若為 None 則印出於 console
+    """
+    if not variants:
+        return
+    if not output_file or output_format not in RESULT_FORMATS:
+        print("\n======= Variants =======")
+        for name, variant, databases, diff in iter_variants(variants):
+            print(f"  Object: {name} {variant}")
+            print(f"    Databases ({len(databases)}): {', '.join(databases)}")
+            for line in diff:
+                print(f"    {line}")
+        return
+
+    path = variants_path(output_file)
+    if output_format == "json":
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(variants, f, indent=4, ensure_ascii=False)
+
+    elif output_format == "csv":
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Object", "Variant", "Databases", "Differences"])
+            for name, variant, databases, diff in iter_variants(variants):
+                writer.writerow([name, variant, "\n".join(databases), "\n".join(diff)])
+
+    elif output_format == "ndjson":
+        with open(path, "w", encoding="utf-8") as f:
+            for name, variant, databases, diff in iter_variants(variants):
+                record = {"object": name, "variant": variant, "databases": databases, "diff": diff}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    else:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("--format parquet requires pyarrow (pip install pyarrow)") from None
+        rows = list(iter_variants(variants))
+        schema = pa.schema([
+            ("object", pa.string()), ("variant", pa.string()),
+            ("databases", pa.list_(pa.string())), ("diff", pa.list_(pa.string())),
+        ])
+        columns = dict(zip(schema.names, map(list, zip(*rows))))
+        pq.write_table(pa.table(columns, schema=schema), path, compression="zstd")
+
+class ResultWriter:
+    """
+    收集比對結果，close 時以 save_results 一次輸出（json / csv / console）。
+    同一物件多次加入時，差異會依序併在一起；版本摘要另以 save_variants 輸出。
+    """
+
+    def __init__(self, output_format: str = "console", output_file: str = None):
+        self.output_format = output_format
+        self.output_file = output_file
+        self.results = defaultdict(lambda: defaultdict(dict))
+        self.variants = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add(self, server: str, database: str, name: str, diffs, kind: str = None):
+        """
+        加入單一物件的差異
+
+        Args:
+            diffs (list | str): 差異內容
+            kind (str): 發現的種類（如 'sp'、'view'、'rowcount'、'schema'），僅串流格式會記錄
+        """
+        objects = self.results[server][database]
+        existing = objects.get(name)
+        if isinstance(existing, list) and isinstance(diffs, list):
+            existing.extend(diffs)
+        elif isinstance(existing, dict) and isinstance(diffs, dict):
+            existing.update(diffs)
+        else:
+            objects[name] = list(diffs) if isinstance(diffs, list) else diffs
+
+    def add_results(self, server: str, db_diffs: dict, kind: str = None):
+        """
+        加入一個目標的比對結果：{database: {object: [differences]}}
+        """
+        for database, objects in db_diffs.items():
+            for name, diffs in objects.items():
+                self.add(server, database, name, diffs, kind)
+
+    def add_report(self, results: dict, kind: str = None):
+        """
+        加入完整結果：{server: {database: {object: [differences]}}}
+        """
+        for server, databases in results.items():
+            self.add_results(server, databases, kind)
+
+    def add_variants(self, variants: dict):
+        """
+        加入定義版本摘要（VariantRegistry.report()），close 時寫到獨立的版本報表
+        """
+        self.variants.update(variants)
+
+    def close(self):
+        save_results(self.results, self.output_format, self.output_file)
+        save_variants(self.variants, self.output_format, self.output_file)
+
+class NdjsonResultWriter(ResultWriter):
+    """
+    串流寫出比對結果，每行一筆發現：{"server", "database", "object", "kind", "category", "element", "message"}。
+    結構比對的巢狀結果依欄位 / PK / trigger 展開為多筆，並以 "path" 記錄原本的鍵（如 ["Trigger", "trg_x"]）；
+    原本為單一字串而非清單的差異加上 "scalar": true，read_ndjson 依此還原為原本的格式。
+    最多暫存 buffer_size 筆，超過、距上次寫出超過 flush_interval 秒、或一個目標的結果加入完成時即寫入檔案，
+    因此記憶體用量固定，且最慢的目標完成前就能看到已完成目標的結果。
+    """
+
+    def __init__(self, output_file: str, buffer_size: int = DEFAULT_BUFFER_SIZE, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.output_file = output_file
+        self.variants = {}
+        self.file = open(output_file, "w", encoding="utf-8")
+        self.buffer = []
+        self.buffer_size = max(1, buffer_size)
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+        self.records = 0
+
+    def add(self, server: str, database: str, name: str, diffs, kind: str = None):
+        for path, message, scalar in iter_leaves(diffs):
+            category, element = finding_category(name, path, kind)
+            record = {
+                "server": server, "database": database, "object": name, "kind": kind,
+                "category": category, "element": element, "message": message,
+            }
+            if path:
+                record["path"] = list(path)
+            if scalar:
+                record["scalar"] = True
+            self.buffer.append(json.dumps(record, ensure_ascii=False))
+            if len(self.buffer) >= self.buffer_size:
+                self.flush()
+        if self.buffer and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def add_results(self, server: str, db_diffs: dict, kind: str = None):
+        super().add_results(server, db_diffs, kind)
+        self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write("\n".join(self.buffer) + "\n")
+            self.records += len(self.buffer)
+            self.buffer.clear()
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+        save_variants(self.variants, "ndjson", self.output_file)
+
+def iter_leaves(diffs, path: tuple = ()):
+    """
+    將差異展開為最底層的訊息
+
+    Yields:
+        tuple: (path, message, scalar)；path 為巢狀 dict 的鍵（如 ("Trigger", "trg_x")），
+        scalar 表示訊息原本是單一字串而非清單
+    """
+    if isinstance(diffs, dict):
+        for key, value in diffs.items():
+            yield from iter_leaves(value, path + (key,))
+    elif isinstance(diffs, list):
+        for message in diffs:
+            yield path, str(message), False
+    else:
+        yield path, str(diffs), True
+
+def finding_category(name: str, path: tuple, kind: str = None) -> tuple:
+    """
+    依物件名稱、鍵的路徑與結果種類決定 (category, element)
+
+    "[ERROR]" 為 error；結構比對結果的鍵為欄位名稱或 PK/FK/Index/Trigger/Unique，
+    element 為欄位或 trigger 名稱（無則為 None）；其他結果依 kind 分類
+    """
+    if name == "[ERROR]":
+        return "error", None
+    if not path:
+        return KIND_CATEGORIES.get(kind, kind or "other"), None
+    if path[0] in SCHEMA_CATEGORIES:
+        return SCHEMA_CATEGORIES[path[0]], path[1] if len(path) > 1 else None
+    return "column", path[0]
+
+def iter_findings(name: str, diffs, kind: str = None):
+    """
+    將單一物件的差異展開為 (category, element, detail)，每個發現一筆
+
+    Args:
+        name (str): 物件名稱；"[ERROR]" 的內容分類為 error
+        diffs (list | dict | str): 差異；dict 為結構比對結果 {欄位或 PK/FK/Index/Trigger/Unique: 訊息}
+        kind (str): 結果種類
+
+    Yields:
+        tuple: (category, element, detail)，element 為欄位或 trigger 名稱（無則為 None）
+    """
+    for path, detail, _ in iter_leaves(diffs):
+        yield (*finding_category(name, path, kind), detail)
+
+class ParquetResultWriter(ResultWriter):
+    """
+    以 Parquet 欄式格式寫出比對結果，每個發現一列：
+        server, database, object, kind, category, element, detail（皆為字串欄位）
+    每累積 row_group_size 列寫出一個 row group，記憶體用量固定；需安裝 pyarrow。
+    """
+
+    def __init__(self, output_file: str, row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("--format parquet requires pyarrow (pip install pyarrow)") from None
+        self.pa = pa
+        self.output_file = output_file
+        self.variants = {}
+        self.schema = pa.schema([(column, pa.string()) for column in ("server", "database", "object", "kind", "category", "element", "detail")])
+        self.writer = pq.ParquetWriter(output_file, self.schema, compression="zstd")
+        self.columns = {column: [] for column in self.schema.names}
+        self.row_group_size = max(1, row_group_size)
+        self.rows = 0
+
+    def add(self, server: str, database: str, name: str, diffs, kind: str = None):
+        for category, element, detail in iter_findings(name, diffs, kind):
+            self.add_finding(server, database, name, kind, category, element, detail)
+
+    def add_finding(self, server, database, name, kind, category, element, detail):
+        for column, value in zip(self.schema.names, (server, database, name, kind, category, element, detail)):
+            self.columns[column].append(value)
+        if len(self.columns["detail"]) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self.columns["detail"]:
+            return
+        self.writer.write_table(self.pa.table(self.columns, schema=self.schema))
+        self.rows += len(self.columns["detail"])
+        self.columns = {column: [] for column in self.schema.names}
+
+    def close(self):
+        if self.writer is None:
+            return
+        self.flush()
+        self.writer.close()
+        self.writer = None
+        save_variants(self.variants, "parquet", self.output_file)
+
+def open_result_writer(args) -> ResultWriter:
+    """
+    依 --output / --format 建立結果輸出器；未指定 --output 時印出於 console
+    """
+    output_file = getattr(args, "output", None)
+    if not output_file:
+        return ResultWriter("console", None)
+    if args.format == "ndjson":
+        return NdjsonResultWriter(output_file)
+    if args.format == "parquet":
+        return ParquetResultWriter(output_file)
+    return ResultWriter(args.format, output_file)
+
+def read_ndjson(input_file: str) -> dict:
+    """
+    讀取 NDJSON 結果並還原為 {server: {database: {object: differences}}}（依寫入順序），
+    差異的格式（清單、單一字串或結構比對的巢狀 dict）與 JSON 輸出相同
+    """
+    results = {}
+    with open(input_file, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                container = results.setdefault(record["server"], {}).setdefault(record["database"], {})
+                *parents, leaf = [record["object"], *record.get("path", [])]
+                for key in parents:
+                    container = container.setdefault(key, {})
+                if record.get("scalar"):
+                    container[leaf] = record["message"]
+                else:
+                    container.setdefault(leaf, []).append(record["message"])
+    return results
+
+def read_variants_ndjson(input_file: str) -> dict:
+    """
+    讀取 NDJSON 版本摘要（<檔名>.variants.ndjson）並還原為 VariantRegistry.report() 的格式
+    """
+    variants = {}
+    with open(input_file, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                variants.setdefault(record["object"], {})[record["variant"]] = {
+                    "databases": record["databases"], "diff": record["diff"],
+                }
+    return variants
+
+def convert_ndjson(input_file: str, output_format: str = "console", output_file: str = None):
+    """
+    將 NDJSON 結果轉為現有的 JSON / CSV 格式或 Parquet（或印出於 console）
+    Parquet 逐筆轉換並保留 kind 與分類，不需將整份結果載入記憶體；
+    有版本摘要（<檔名>.variants.ndjson）時一併轉換
+    """
+    if output_format == "parquet" and output_file:
+        with ParquetResultWriter(output_file) as writer, open(input_file, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    writer.add_finding(
+                        record["server"], record["database"], record["object"], record.get("kind"),
+                        record["category"], record["element"], record["message"],
+                    )
+    else:
+        save_results(read_ndjson(input_file), output_format if output_file else "console", output_file)
+
+    variants_file = variants_path(input_file)
+    if os.path.exists(variants_file):
+        save_variants(read_variants_ndjson(variants_file), output_format if output_file else "console", output_file)
+
+# CLI entry point: convert an NDJSON report to the JSON / CSV layout or Parquet
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Convert an NDJSON comparison report to JSON, CSV or Parquet")
+    parser.add_argument("input", help="NDJSON report written with --format ndjson")
+    parser.add_argument("--output", required=False, help="Output filename (optional, prints to console if omitted)")
+    parser.add_argument("--format", choices=["json", "csv", "parquet"], default="json", help="Output format")
+    if args is None:
+        args = parser.parse_args()
+    convert_ndjson(args.input, args.format, args.output)
+
+if __name__ == "__main__":
+    main()
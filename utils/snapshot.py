@@ -0,0 +1,150 @@
+"""
+snapshot.py
+
+將資料庫結構與物件定義存成離線快照檔，並可從快照讀回比對，
+讓比對流程不必每次重新連線到 SQL Server。
+
+每個資料庫一個 gzip 壓縮的 JSON 檔，內容依含 schema 的物件名稱建立索引
+（不同 schema 的同名物件各自保存）：
+    {
+        "version": 2,
+        "server": ..., "database": ..., "saved_at": ...,
+        "schema": {"schema.table": {"columns": [...], "pk": [...], ...}},
+        "sp":     {"schema.sp_name": "definition"},
+        "view":   {"schema.view_name": "definition"}
+    }
+版本 1 的 sp / view 區段只有物件名稱，讀取時會要求重新建立快照。
+"""
+
+import gzip
+import json
+import os
+import re
+from collections import defaultdict
+from datetime import datetime
+
+SNAPSHOT_VERSION = 2
+SNAPSHOT_SECTIONS = ("schema", "sp", "view")
+
+def snapshot_path(snapshot_dir: str, db: dict) -> str:
+    """
+    取得資料庫對應的快照檔路徑（server / database 中的特殊字元以底線取代）
+
+    Args:
+        snapshot_dir (str): 快照資料夾
+        db (dict): 連線資訊（需含 server、database）
+
+    Returns:
+        str: 快照檔路徑
+    """
+    name = re.sub(r"[^\w.-]", "_", f"{db['server']}__{db['database']}")
+    return os.path.join(snapshot_dir, f"{name}.snapshot.json.gz")
+
+def _encode_schema(schema_info) -> dict:
+    schemas, pks, fks, indexes, trigs, uniques = schema_info
+    tables = set(schemas) | set(pks) | set(fks) | set(indexes) | set(trigs) | set(uniques)
+    return {
+        table: {
+            "columns": [list(col) for col in schemas.get(table, [])],
+            "pk": sorted(pks.get(table, set())),
+            "fk": sorted(list(fk) for fk in fks.get(table, set())),
+            "indexes": sorted(list(ix) for ix in indexes.get(table, set())),
+            "triggers": trigs.get(table, {}),
+            "unique": sorted(list(uq) for uq in uniques.get(table, set())),
+        }
+        for table in sorted(tables)
+    }
+
+def _decode_schema(data: dict):
+    schemas, pks, fks = defaultdict(list), defaultdict(set), defaultdict(set)
+    indexes, trigs, uniques = defaultdict(set), defaultdict(dict), defaultdict(set)
+    for table, info in data.items():
+        if info["columns"]:
+            schemas[table] = [tuple(col) for col in info["columns"]]
+        if info["pk"]:
+            pks[table] = set(info["pk"])
+        if info["fk"]:
+            fks[table] = {tuple(fk) for fk in info["fk"]}
+        if info["indexes"]:
+            indexes[table] = {tuple(ix) for ix in info["indexes"]}
+        if info["triggers"]:
+            trigs[table] = info["triggers"]
+        if info["unique"]:
+            uniques[table] = {tuple(uq) for uq in info["unique"]}
+    return schemas, pks, fks, indexes, trigs, uniques
+
+def _read(path: str) -> dict:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        snapshot = json.load(f)
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {snapshot.get('version')} in {path}; re-create it with --save-snapshot")
+    return snapshot
+
+def save_snapshot(snapshot_dir: str, db: dict, section: str, data):
+    """
+    將一個區段寫入資料庫的快照檔，保留檔案中其他區段。
+
+    Args:
+        snapshot_dir (str): 快照資料夾
+        db (dict): 連線資訊
+        section (str): 'schema'（fetch_schema_info 六元組）、'sp' 或 'view'（{schema.name: 定義}）
+        data: 要寫入的內容
+    """
+    if section not in SNAPSHOT_SECTIONS:
+        raise ValueError(f"Unknown snapshot section: {section}")
+    os.makedirs(snapshot_dir, exist_ok=True)
+    path = snapshot_path(snapshot_dir, db)
+
+    snapshot = {"version": SNAPSHOT_VERSION}
+    if os.path.exists(path):
+        try:
+            snapshot = _read(path)
+        except ValueError:
+            # 舊版快照不沿用其他區段，整個檔案以新版重建
+            pass
+    snapshot.update(server=db["server"], database=db["database"], saved_at=f"{datetime.now():%Y-%m-%d %H:%M:%S}")
+    snapshot[section] = _encode_schema(data) if section == "schema" else dict(sorted(data.items()))
+
+    # 先寫暫存檔再取代，避免中斷時留下損毀的快照
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+def load_snapshot(snapshot_dir: str, db: dict, section: str):
+    """
+    從快照檔讀回一個區段。
+
+    Args:
+        snapshot_dir (str): 快照資料夾
+        db (dict): 連線資訊
+        section (str): 'schema'、'sp' 或 'view'
+
+    Returns:
+        'schema' 回傳與 fetch_schema_info 相同的六元組；'sp' / 'view' 回傳 {schema.name: 定義}
+    """
+    path = snapshot_path(snapshot_dir, db)
+    snapshot = _read(path)
+    if section not in snapshot:
+        raise ValueError(f"Snapshot {path} has no '{section}' section")
+    data = snapshot[section]
+    return _decode_schema(data) if section == "schema" else data
+
+async def fetch_with_snapshot(db: dict, section: str, fetch, args):
+    """
+    依 --from-snapshot / --save-snapshot 決定從快照讀取，或連線取得後另存快照。
+
+    Args:
+        db (dict): 連線資訊
+        section (str): 'schema'、'sp' 或 'view'
+        fetch: 無參數的 coroutine function，負責連線取得資料
+        args: CLI 參數（from_snapshot / save_snapshot 為快照資料夾）
+    """
+    from_dir = getattr(args, "from_snapshot", None)
+    if from_dir:
+        return load_snapshot(from_dir, db, section)
+    data = await fetch()
+    save_dir = getattr(args, "save_snapshot", None)
+    if save_dir:
+        save_snapshot(save_dir, db, section, data)
+    return data
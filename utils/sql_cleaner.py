@@ -5,11 +5,91 @@ sql_cleaner.py
 方便比對 Stored Procedure、View、Trigger 等定義內容。
 """
 
+import gzip
+import hashlib
+import json
+import os
 import re
+import threading
+from collections import OrderedDict
+
+# 單次掃描的 T-SQL lexer：由左至右只走一遍。_CODE 以單一 regex 一次吃下到下一個註解起點為止的
+# 一般程式碼與字串常值、[識別字]、"識別字"（整段原樣保留，其中的 -- 或 /* 不會被當成註解），
+# Python 迴圈只在每個註解執行一次。
+# 區塊註解以深度計數處理巢狀，任意層數皆可，未結束的註解延伸到結尾。
+_CODE = re.compile(r"""(?:[^'"\[/-]++|'[^']*+(?:''[^']*+)*+'?|\[[^\]]*+(?:\]\][^\]]*+)*+\]?|"[^"]*+(?:""[^"]*+)*+"?|/(?!\*)|-(?!-))*+""")
+_LINE_COMMENT = re.compile(r"--[^\r\n]*")
+_COMMENT_BOUNDARY = re.compile(r"/\*|\*/")
+# 快速路徑：沒有 "識別字"，且每個 [識別字] 都不含 ' " / - 與 ]] 跳脫時，[識別字] 不影響判斷，
+# 只剩 '字串'：註解起點前（自上一個程式碼位置起）的單引號數為奇數即在字串內（'' 跳脫不影響奇偶），
+# 以 str.find / str.count 在 C 層完成，不必逐一走過常值
+_UNSAFE_BRACKET = re.compile(r"""\[[^\]'"/-]*+(?!\](?!\]))""")
+
+def _comment_end(sql_text: str, start: int) -> int:
+    if sql_text[start] == "-":
+        return _LINE_COMMENT.match(sql_text, start).end()
+    depth = 1
+    pos = start + 2
+    while depth:
+        boundary = _COMMENT_BOUNDARY.search(sql_text, pos)
+        if boundary is None:
+            return len(sql_text)
+        depth += 1 if boundary.group() == "/*" else -1
+        pos = boundary.end()
+    return pos
+
+def _scan_comments(sql_text: str) -> str:
+    pieces = []
+    pos = 0
+    length = len(sql_text)
+    while pos < length:
+        end = _CODE.match(sql_text, pos).end()
+        pieces.append(sql_text[pos:end])
+        if end >= length:
+            break
+        pos = _comment_end(sql_text, end)
+    return "".join(pieces)
+
+def _strip_comments(sql_text: str) -> str:
+    length = len(sql_text)
+    line_at = sql_text.find("--")
+    block_at = sql_text.find("/*")
+    if line_at < 0 and block_at < 0:
+        return sql_text
+    if '"' in sql_text or _UNSAFE_BRACKET.search(sql_text):
+        return _scan_comments(sql_text)
+    line_at = length if line_at < 0 else line_at
+    block_at = length if block_at < 0 else block_at
+    pieces = []
+    pos = counted = 0
+    in_literal = False
+    while True:
+        start = min(line_at, block_at)
+        if start >= length:
+            break
+        if sql_text.count("'", counted, start) % 2:
+            in_literal = not in_literal
+        counted = start
+        if in_literal:
+            resume = start + 1
+        else:
+            pieces.append(sql_text[pos:start])
+            pos = counted = resume = _comment_end(sql_text, start)
+        if line_at < resume:
+            line_at = sql_text.find("--", resume)
+            line_at = length if line_at < 0 else line_at
+        if block_at < resume:
+            block_at = sql_text.find("/*", resume)
+            block_at = length if block_at < 0 else block_at
+    if not pieces:
+        return sql_text
+    pieces.append(sql_text[pos:])
+    return "".join(pieces)
 
 def remove_sql_comments(sql_text: str) -> str:
     """
-    移除單行註解 (-- ...) 與多行註解 (/* ... */)
+    移除單行註解 (-- ...) 與多行註解 (/* ... */，可巢狀)；
+    字串常值、[識別字] 與 "識別字" 內的 -- 或 /* 不視為註解
 
     Args:
         sql_text (str): 原始 SQL 字串
@@ -19,13 +99,157 @@ def remove_sql_comments(sql_text: str) -> str:
     """
     if not sql_text:
         return sql_text
-    sql_text = re.sub(r'--.*', '', sql_text)
-    sql_text = re.sub(r'/\*.*?\*/', '', sql_text, flags=re.DOTALL)
-    return sql_text.strip()
+    return _strip_comments(sql_text).strip()
+
+def _normalize(sql_text: str) -> tuple:
+    # 先整段轉小寫再掃描（註解與常值的界定字元不受大小寫影響），切行、去空白與濾掉空行都在 C 層完成
+    return tuple(filter(None, map(str.strip, _strip_comments(sql_text.lower()).splitlines())))
+
+class NormalizationCache:
+    """
+    以原始定義內容的 SHA-1 為 key 的標準化結果快取（LRU）。
+    同一份定義（同一基準對多個目標、各租戶資料庫中相同的定義）只會清理一次；
+    總大小超過 max_bytes 時淘汰最久未使用的項目，並可選擇存檔供下次執行沿用。
+    """
+
+    CACHE_VERSION = 2
+    # 每個項目除了內容以外的估計額外成本（key、digest、tuple 與字串物件）
+    _ENTRY_OVERHEAD = 200
+    _LINE_OVERHEAD = 50
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, path: str = None):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (lines, digest, size)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(sql_text: str) -> str:
+        return hashlib.sha1(sql_text.encode("utf-8", "surrogatepass")).hexdigest()
+
+    def _entry_size(self, lines: tuple) -> int:
+        return self._ENTRY_OVERHEAD + sum(map(len, lines)) + self._LINE_OVERHEAD * len(lines)
+
+    def _store(self, key: str, lines: tuple, digest: str):
+        size = self._entry_size(lines)
+        if self.max_bytes and size > self.max_bytes:
+            return
+        self._entries[key] = (lines, digest, size)
+        self.size += size
+        while self.max_bytes and self.size > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def get(self, sql_text: str):
+        """
+        取得定義的標準化結果，未命中時清理並寫入快取
+
+        Returns:
+            tuple: (標準化後的行 tuple, 標準化內容的 SHA-1 digest)
+        """
+        key = self.key_for(sql_text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0], entry[1]
+            self.misses += 1
+
+        lines = _normalize(sql_text)
+        digest = hashlib.sha1("\n".join(lines).encode("utf-8", "surrogatepass")).hexdigest()
+        with self._lock:
+            if key not in self._entries:
+                self._store(key, lines, digest)
+        return lines, digest
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.size,
+        }
+
+    def load(self, path: str = None) -> int:
+        """
+        從 gzip JSON 檔載入快取（檔案不存在或版本不符時略過），回傳載入的項目數
+        """
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return 0
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != self.CACHE_VERSION:
+            return 0
+        with self._lock:
+            for key, (digest, lines) in data["entries"].items():
+                if key not in self._entries:
+                    self._store(key, tuple(lines), digest)
+        return len(data["entries"])
+
+    def save(self, path: str = None):
+        """
+        將快取依 LRU 順序寫入 gzip JSON 檔（先寫暫存檔再取代）
+        """
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            entries = {key: [digest, list(lines)] for key, (lines, digest, _) in self._entries.items()}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump({"version": self.CACHE_VERSION, "entries": entries}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+_cache = NormalizationCache()
+
+def get_normalization_cache() -> NormalizationCache:
+    return _cache
+
+def configure_normalization_cache(args=None) -> NormalizationCache:
+    """
+    依 CLI 參數重新建立模組層級的快取：--norm-cache-size（MB，0 表示不限制）、
+    --norm-cache-file（存檔路徑，存在時先載入）
+    """
+    global _cache
+    size_mb = getattr(args, "norm_cache_size", None)
+    max_bytes = 64 * 1024 * 1024 if size_mb is None else int(size_mb * 1024 * 1024)
+    _cache = NormalizationCache(max_bytes, getattr(args, "norm_cache_file", None))
+    loaded = _cache.load()
+    if loaded:
+        print(f"[INFO] Normalization cache: loaded {loaded} entries from {_cache.path}")
+    return _cache
+
+def close_normalization_cache():
+    """
+    輸出快取命中率，並在有設定存檔路徑時寫回
+    """
+    stats = _cache.stats()
+    print(
+        f"[INFO] Normalization cache: {stats['hits']} hits, {stats['misses']} misses "
+        f"({stats['hit_rate']:.1%} hit rate), {stats['evictions']} evicted, "
+        f"{stats['entries']} entries / {stats['bytes'] / 1024 / 1024:.1f} MB"
+    )
+    _cache.save()
 
 def clean_definition_lines(sql_text: str) -> list[str]:
     """
-    將 SQL 字串拆成逐行、去除註解與空白，轉為小寫，方便比對
+    將 SQL 字串拆成逐行、去除註解與空白，轉為小寫，方便比對（結果經由標準化快取共用）
 
     Args:
         sql_text (str): 原始 SQL 定義
@@ -33,5 +257,34 @@ def clean_definition_lines(sql_text: str) -> list[str]:
     Returns:
         list[str]: 處理後的每一行內容（小寫、去除空白與註解）
     """
-    sql_text = remove_sql_comments(sql_text)
-    return [line.strip().lower() for line in sql_text.splitlines() if line.strip()]
+    if not sql_text:
+        return []
+    return list(_cache.get(sql_text)[0])
+
+def definition_digest(sql_text: str) -> str:
+    """
+    將定義標準化（同 clean_definition_lines）後計算 digest，作為比對用的指紋。
+    與 clean_definition_lines 共用標準化快取，同一份定義對所有目標只會清理一次。
+
+    Args:
+        sql_text (str): 原始 SQL 定義
+
+    Returns:
+        str: 標準化內容的 SHA-1 hex digest
+    """
+    if not sql_text:
+        return hashlib.sha1(b"").hexdigest()
+    return _cache.get(sql_text)[1]
+
+def definitions_equal(base_text: str, target_text: str) -> bool:
+    """
+    以 digest 判斷兩份定義標準化後是否相同；只有不同時才需要再展開逐行內容做 diff
+
+    Args:
+        base_text (str): 基準定義
+        target_text (str): 目標定義
+
+    Returns:
+        bool: 標準化後是否相同
+    """
+    return base_text == target_text or definition_digest(base_text) == definition_digest(target_text)